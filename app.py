@@ -1,10 +1,20 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from config import Config
 from modules.pdf_processor import PDFProcessor
+from modules.page_cache import PageCache
 from modules.ai_generator import AIGenerator
+from modules.llm_backends import create_llm_backend
+from modules.llm_cache import LLMResponseCache
 from modules.latex_builder import LatexBuilder
-from utils.helpers import allowed_file, generate_filename
+from modules.compile_health import CompileHealthTracker
+from modules.compile_sandbox import CompileSandbox
+from modules.text_reducer import TextReducer
+from modules.document_ir import DocumentValidationError, render_latex
+from modules.job_queue import JobQueue, QueueFullError
+from modules.result_cache import ResultCache
+from utils.helpers import allowed_file, generate_filename, hash_file
 import os
+import json
 import tempfile
 import logging
 from datetime import datetime
@@ -24,9 +34,81 @@ app = Flask(__name__)
 Config.init_app(app)
 
 # Initialize modules
-pdf_processor = PDFProcessor()
-ai_generator = AIGenerator()
-latex_builder = LatexBuilder()
+page_cache = PageCache(
+    app.config['CACHE_FOLDER'] / 'pages.sqlite',
+    max_documents=app.config['PAGE_CACHE_MAX_DOCUMENTS']
+)
+pdf_processor = PDFProcessor(
+    parallel_workers=app.config['EXTRACTION_WORKERS'],
+    parallel_min_pages=app.config['PARALLEL_EXTRACTION_MIN_PAGES'],
+    backend=app.config['EXTRACTION_BACKEND'],
+    page_cache=page_cache
+)
+llm_cache = LLMResponseCache(
+    app.config['CACHE_FOLDER'] / 'llm_responses.sqlite',
+    max_bytes=app.config['LLM_CACHE_MAX_MB'] * 1024 * 1024,
+    ttl_seconds=int(app.config['LLM_CACHE_TTL_HOURS'] * 3600) or None
+)
+if app.config['LLM_BACKEND'] == 'offline':
+    llm_backend = create_llm_backend(
+        'offline',
+        latency_seconds=app.config['OFFLINE_LLM_LATENCY_SECONDS'],
+        latency_sigma=app.config['OFFLINE_LLM_LATENCY_SIGMA'],
+        output_chars=app.config['OFFLINE_LLM_OUTPUT_CHARS'],
+        failure_rate=app.config['OFFLINE_LLM_FAILURE_RATE']
+    )
+else:
+    llm_backend = create_llm_backend(app.config['LLM_BACKEND'])
+ai_generator = AIGenerator(
+    chunked=app.config['GENERATION_CHUNKED'],
+    chunk_chars=app.config['GENERATION_CHUNK_CHARS'],
+    max_document_chars=app.config['GENERATION_MAX_DOCUMENT_CHARS'],
+    max_concurrency=app.config['LLM_MAX_CONCURRENCY'],
+    streaming=app.config['LLM_STREAMING'],
+    response_cache=llm_cache,
+    hedge_model=app.config['LLM_HEDGE_MODEL'],
+    hedge_delay=app.config['LLM_HEDGE_DELAY'],
+    max_retries=app.config['LLM_MAX_RETRIES'],
+    backoff_seconds=app.config['LLM_BACKOFF_SECONDS'],
+    backend=llm_backend,
+    multi_variant=app.config['GENERATION_MULTI_VARIANT'],
+    split_questions=app.config['LLM_SPLIT_QUESTIONS'],
+    questions_output_tokens=app.config['LLM_QUESTIONS_OUTPUT_TOKENS'],
+    adaptive_output_tokens=app.config['LLM_ADAPTIVE_OUTPUT_TOKENS'],
+    degraded_model=app.config['DEGRADED_MODEL']
+)
+structured_generation = app.config['GENERATION_STRUCTURED'] or app.config['GENERATION_MULTI_VARIANT']
+text_reducer = TextReducer() if app.config['TEXT_REDUCTION'] else None
+latex_builder = LatexBuilder(
+    cache_dir=app.config['CACHE_FOLDER'] / 'compiled',
+    max_cached_pdfs=app.config['COMPILE_CACHE_MAX_FILES'],
+    max_preflight_repairs=app.config['LATEX_PREFLIGHT_MAX_REPAIRS'],
+    compile_health=CompileHealthTracker(
+        failure_threshold=app.config['COMPILE_BREAKER_FAILURES'],
+        open_seconds=app.config['COMPILE_BREAKER_OPEN_SECONDS'],
+        window=app.config['COMPILE_HEALTH_WINDOW']
+    ),
+    race_deadline=app.config['COMPILE_RACE_DEADLINE_SECONDS'] or None,
+    precompiled_format=app.config['LATEX_PRECOMPILED_FORMAT'],
+    max_latex_runs=app.config['LATEX_MAX_RUNS'],
+    max_build_dirs=app.config['LATEX_BUILD_DIRS'],
+    sandbox=CompileSandbox(
+        max_workers=app.config['COMPILE_WORKERS'],
+        max_pending=app.config['COMPILE_MAX_PENDING'],
+        queue_timeout=app.config['COMPILE_QUEUE_TIMEOUT_SECONDS'],
+        wall_seconds=app.config['COMPILE_TIMEOUT_SECONDS'],
+        memory_mb=app.config['COMPILE_MEMORY_MB'],
+        file_mb=app.config['COMPILE_MAX_FILE_MB']
+    )
+)
+job_queue = JobQueue(
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING']
+)
+result_cache = ResultCache(
+    app.config['CACHE_FOLDER'] / 'results',
+    max_bytes=app.config['RESULT_CACHE_MAX_MB'] * 1024 * 1024
+)
 
 @app.route('/')
 def index():
@@ -35,7 +117,7 @@ def index():
 
 @app.route('/api/process', methods=['POST'])
 def process_pdf():
-    """Main API endpoint for PDF processing pipeline"""
+    """Queue an uploaded PDF for processing and return its job ID"""
     logger.info("=" * 60)
     logger.info("NEW PDF PROCESSING REQUEST RECEIVED")
     logger.info("=" * 60)
@@ -49,12 +131,17 @@ def process_pdf():
         'note_type': request.form.get('note_type', 'detailed'),
         'include_questions': request.form.get('include_questions', 'true') == 'true',
         'compile_pdf': request.form.get('compile_pdf', 'false') == 'true',
-        'use_overleaf': request.form.get('use_overleaf', 'false') == 'true'
+        'use_overleaf': request.form.get('use_overleaf', 'false') == 'true',
+        'page_range': None
     }
     
+    # Optional 1-based inclusive page range, e.g. page_start=3&page_end=40
+    page_start = request.form.get('page_start', type=int)
+    page_end = request.form.get('page_end', type=int)
+    if page_start or page_end:
+        options['page_range'] = (page_start, page_end)
+    
     logger.info(f"File received: {file.filename}")
-    logger.info(f"File size: {len(file.read())} bytes")
-    file.seek(0)  # Reset file pointer after reading size
     logger.info(f"Options: {options}")
     
     if not file or file.filename == '':
@@ -70,15 +157,79 @@ def process_pdf():
         base_name = generate_filename(file.filename)
         logger.info(f"Generated base filename: {base_name}")
         
-        # 1. Save uploaded file temporarily
+        # 1. Save uploaded file temporarily (the upload stream is gone once the request ends)
         temp_path = app.config['UPLOAD_FOLDER'] / f"{base_name}_upload.pdf"
         logger.info(f"Saving uploaded file to: {temp_path}")
         file.save(temp_path)
         logger.info(f"File saved successfully. Size: {temp_path.stat().st_size} bytes")
         
-        # 2. Extract text from PDF
+        # 2. Hand the rest of the pipeline to the worker pool
+        try:
+            job = job_queue.submit(
+                run_pipeline,
+                temp_path=temp_path,
+                original_filename=file.filename,
+                base_name=base_name,
+                options=options,
+                description=file.filename
+            )
+        except QueueFullError as e:
+            temp_path.unlink(missing_ok=True)
+            return jsonify({'error': str(e)}), 503
+        
+        logger.info(f"Job {job.id} queued for {file.filename}")
+        logger.info("=" * 60)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"Error queueing PDF processing: {str(e)}", exc_info=True)
+        logger.info("=" * 60)
+        return jsonify({'error': str(e)}), 500
+
+def run_pipeline(job, temp_path, original_filename, base_name, options):
+    """Extraction, AI generation and compilation for one queued upload"""
+    logger.info(f"[job {job.id}] Processing {original_filename}")
+    job.emit('upload_saved', filename=original_filename, bytes=temp_path.stat().st_size)
+    
+    try:
+        # Repeat uploads with the same options reuse the finished artifacts
+        pdf_hash = hash_file(temp_path)
+        cache_key = ResultCache.make_key(
+            pdf_hash, options['note_type'], options['include_questions'], options['page_range'],
+            structured=structured_generation,
+            backend=app.config['LLM_BACKEND'],
+            model=ai_generator.model_name,
+            chunked=ai_generator.chunked
+        )
+        cached = result_cache.get(cache_key)
+        if cached:
+            result_cache.restore(cached, app.config['OUTPUT_FOLDER'], base_name)
+            job.emit('cache_hit', sha256=pdf_hash)
+            response = build_response(base_name, cached['preview'])
+            response['cached'] = True
+            logger.info(f"[job {job.id}] Served from result cache. Response: {response}")
+            return response
+        
+        # 2. Extract text from PDF, stopping once the generator has all the input it will use
         logger.info("Starting text extraction from PDF...")
-        text = pdf_processor.extract_text(temp_path)
+        input_budget = ai_generator.input_char_budget
+        if text_reducer and app.config['TEXT_REDUCTION_TOKEN_BUDGET']:
+            input_budget = app.config['TEXT_REDUCTION_TOKEN_BUDGET'] * TextReducer.CHARS_PER_TOKEN
+        extraction_budget = app.config['EXTRACTION_CHAR_BUDGET']
+        if not extraction_budget:
+            oversample = app.config['TEXT_REDUCTION_OVERSAMPLE'] if text_reducer else 1
+            extraction_budget = int(input_budget * oversample)
+        text, extraction_stats = pdf_processor.extract_text_with_stats(
+            temp_path,
+            max_chars=extraction_budget,
+            page_range=options['page_range'],
+            progress_callback=job.emit
+        )
         
         text_length = len(text.strip()) if text else 0
         logger.info(f"Text extraction completed. Extracted text length: {text_length} characters")
@@ -87,70 +238,189 @@ def process_pdf():
             logger.error(f"Insufficient text extracted. Length: {text_length} (minimum 100 required)")
             if text:
                 logger.error(f"Extracted text preview: {text[:200]}")
-            return jsonify({'error': 'Insufficient text found in PDF'}), 400
+            raise ValueError('Insufficient text found in PDF')
         
+        job.emit('text_extracted', characters=text_length, pages_processed=extraction_stats['pages_processed'],
+                 total_pages=extraction_stats['total_pages'])
+        
+        reduction_stats = None
+        if text_reducer:
+            text, reduction_stats = text_reducer.reduce(text, max_chars=input_budget)
+            job.emit('text_reduced', **reduction_stats)
         logger.info(f"Text extraction successful. Proceeding with AI generation...")
         
-        # 3. Generate study materials using AI
-        logger.info(f"Generating AI study materials (type: {options['note_type']})...")
-        latex_content = ai_generator.generate_study_materials(
-            text=text,
-            note_type=options['note_type'],
-            include_questions=options['include_questions']
-        )
+        # 3. Generate study materials using AI (cheaper settings while the queue is backed up)
+        degraded = degradation_for(options['note_type'])
+        note_type = options['note_type']
+        if degraded:
+            note_type = degraded['note_type']
+            logger.warning(f"[job {job.id}] Queue depth {degraded['queue_depth']}. Running degraded: {degraded}")
+            job.emit('degraded', **degraded)
+        logger.info(f"Generating AI study materials (type: {note_type})...")
+        document = None
+        if structured_generation:
+            try:
+                document = ai_generator.generate_structured_document(
+                    text=text,
+                    note_type=note_type,
+                    include_questions=options['include_questions'],
+                    progress_callback=job.emit,
+                    degraded=bool(degraded)
+                )
+            except DocumentValidationError as e:
+                logger.warning(f"Structured output rejected ({str(e)}). Falling back to LaTeX generation")
+                job.emit('structured_fallback', error=str(e))
+        
+        if document:
+            latex_content = render_latex(document)
+        else:
+            latex_content = ai_generator.generate_study_materials(
+                text=text,
+                note_type=note_type,
+                include_questions=options['include_questions'],
+                progress_callback=job.emit,
+                degraded=bool(degraded)
+            )
         logger.info(f"AI generation completed. LaTeX content length: {len(latex_content)} characters")
         
-        # 4. Build LaTeX document
+        # 4. Build LaTeX document (plus HTML and the structured sidecar in structured mode)
         logger.info(f"Creating LaTeX file...")
-        tex_path = latex_builder.create_latex_file(
-            content=latex_content,
-            filename=base_name,
-            title=f"Study Notes: {file.filename}"
-        )
+        title = f"Study Notes: {original_filename}"
+        artifacts = {}
+        if document:
+            artifacts = latex_builder.create_document_files(document, base_name, title)
+            tex_path = artifacts['tex']
+        else:
+            tex_path = latex_builder.create_latex_file(
+                content=latex_content,
+                filename=base_name,
+                title=title
+            )
         logger.info(f"LaTeX file created at: {tex_path}")
+        job.emit('latex_written', filename=tex_path.name)
+        
+        # Repair malformed LaTeX once, before any compiler sees it
+        preflight = latex_builder.preflight_file(tex_path)
+        job.emit('latex_preflight', **preflight)
         
         # 5. Always compile to PDF for download
         logger.info("Compiling LaTeX to PDF for download...")
         pdf_path = None
         try:
-            pdf_path = latex_builder.compile_to_pdf(tex_path, use_overleaf=options['use_overleaf'])
+            pdf_path = latex_builder.compile_to_pdf(
+                tex_path,
+                use_overleaf=options['use_overleaf'],
+                progress_callback=job.emit,
+                document=document,
+                preflight=preflight
+            )
             logger.info(f"PDF compilation successful: {pdf_path}")
+            # Warm the compile cache so downloading the .tex later is instant
+            latex_builder.store_compiled_pdf(hash_file(tex_path), pdf_path)
         except Exception as e:
             logger.warning(f"PDF compilation failed: {str(e)}. PDF download may fail, but LaTeX file available.")
         
+        preview = latex_content[:1000]  # Preview first 1000 chars
+        # Degraded output is not cached, so the same upload gets full quality once load drops
+        if not degraded:
+            result_cache.put(cache_key, {**artifacts, 'tex': tex_path, 'pdf': pdf_path}, preview)
+    finally:
         # Clean up temporary upload
         logger.info(f"Cleaning up temporary file: {temp_path}")
         temp_path.unlink(missing_ok=True)
         logger.info("Temporary file deleted")
-        
-        # Prepare response - always provide PDF download URL
-        response = {
-            'success': True,
-            'filename': base_name,
-            'latex_url': f'/api/download/{base_name}.tex',
-            'pdf_url': f'/api/download/{base_name}.pdf',  # Will compile on download if needed
-            'preview': latex_content[:1000],  # Preview first 1000 chars
-            'tips': {
-                'latex_quality': 'Perfect ✅ (Ready for Overleaf)',
-                'pdf_quality': 'Good ✅ (ReportLab renderer)',
-                'for_professional_output': 'Download the .tex file and upload to https://www.overleaf.com for professional PDF quality',
-                'overleaf_steps': [
-                    'Copy the download link for the .tex file',
-                    'Go to https://www.overleaf.com and create a free account',
-                    'Create a new project and upload the .tex file',
-                    'Click "Recompile" - get professional PDF!'
-                ]
-            }
+    
+    response = build_response(base_name, preview)
+    response['extraction'] = extraction_stats
+    if reduction_stats:
+        response['reduction'] = reduction_stats
+    if degraded:
+        response['degraded'] = degraded
+    response['preflight'] = preflight
+    logger.info(f"[job {job.id}] Processing completed successfully. Response: {response}")
+    return response
+
+def degradation_for(note_type):
+    """Degraded generation settings when the job queue is over its threshold, else None"""
+    threshold = app.config['DEGRADE_QUEUE_DEPTH']
+    queue_depth = job_queue.stats()['pending']
+    if not threshold or queue_depth < threshold:
+        return None
+    
+    degraded_note_type = note_type
+    if note_type == 'detailed' and app.config['DEGRADED_NOTE_TYPE']:
+        degraded_note_type = app.config['DEGRADED_NOTE_TYPE']
+    if not ai_generator.degraded_model and degraded_note_type == note_type:
+        return None
+    return {
+        'queue_depth': queue_depth,
+        'threshold': threshold,
+        'model': ai_generator.degraded_model or ai_generator.model_name,
+        'note_type': degraded_note_type,
+        'requested_note_type': note_type
+    }
+
+def build_response(base_name, preview):
+    """Response payload for a finished job - always provide PDF download URL"""
+    response = {
+        'success': True,
+        'filename': base_name,
+        'latex_url': f'/api/download/{base_name}.tex',
+        'pdf_url': f'/api/download/{base_name}.pdf',  # Will compile on download if needed
+        'preview': preview,
+        'tips': {
+            'latex_quality': 'Perfect ✅ (Ready for Overleaf)',
+            'pdf_quality': 'Good ✅ (ReportLab renderer)',
+            'for_professional_output': 'Download the .tex file and upload to https://www.overleaf.com for professional PDF quality',
+            'overleaf_steps': [
+                'Copy the download link for the .tex file',
+                'Go to https://www.overleaf.com and create a free account',
+                'Create a new project and upload the .tex file',
+                'Click "Recompile" - get professional PDF!'
+            ]
         }
-        
-        logger.info(f"Processing completed successfully. Response: {response}")
-        logger.info("=" * 60)
-        return jsonify(response)
-        
-    except Exception as e:
-        logger.error(f"Error during PDF processing: {str(e)}", exc_info=True)
-        logger.info("=" * 60)
-        return jsonify({'error': str(e)}), 500
+    }
+    if (app.config['OUTPUT_FOLDER'] / f'{base_name}.html').exists():
+        response['html_url'] = f'/api/download/{base_name}.html'
+    return response
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Report the status (and result, once finished) of a processing job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        logger.warning(f"Unknown job requested: {job_id}")
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events stream of a job's pipeline stage transitions"""
+    job = job_queue.get(job_id)
+    if job is None:
+        logger.warning(f"Unknown job requested for event stream: {job_id}")
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        sent = 0
+        while True:
+            events, finished = job.wait_for_events(sent, timeout=15)
+            for event in events:
+                yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+            sent += len(events)
+            
+            if finished and not events:
+                break
+            if not events:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/download/<filename>')
 def download_file(filename):
@@ -163,26 +433,38 @@ def download_file(filename):
         return jsonify({'error': 'File not found'}), 404
     
     try:
-        # If it's a .tex file, compile to PDF first
+        # If it's a .tex file, compile to PDF first (or reuse the PDF compiled from identical content)
         if filename.endswith('.tex'):
             logger.info(f"LaTeX file requested. Attempting to compile to PDF...")
             try:
-                pdf_path = latex_builder.compile_to_pdf(file_path)
+                digest = hash_file(file_path)
+                if request.if_none_match.contains(digest):
+                    logger.info(f"Client copy of {filename} is current (ETag {digest[:12]}). Returning 304")
+                    return Response(status=304, headers={'ETag': f'"{digest}"'})
+                
+                pdf_path, digest = latex_builder.compile_cached(file_path)
                 if pdf_path.exists():
                     logger.info(f"Serving compiled PDF: {pdf_path}")
                     return send_file(
                         str(pdf_path),
                         as_attachment=True,
-                        download_name=pdf_path.name
+                        download_name=f"{file_path.stem}.pdf",
+                        conditional=True,
+                        etag=digest,
+                        last_modified=file_path.stat().st_mtime,
+                        max_age=0
                     )
             except Exception as e:
                 logger.warning(f"PDF compilation failed: {str(e)}. Serving LaTeX file instead.")
         
+        # send_file answers If-None-Match/If-Modified-Since with 304 and honours Range requests
         logger.info(f"Serving file: {file_path}")
         return send_file(
             str(file_path),
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            conditional=True,
+            max_age=0
         )
     except Exception as e:
         logger.error(f"Download error: {str(e)}", exc_info=True)
@@ -219,13 +501,26 @@ def compile_tex(filename):
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
-    gemini_configured = bool(app.config['GEMINI_API_KEY'])
+    # Only the Gemini backend needs credentials; the offline stand-in is always ready
+    llm_configured = llm_backend.name != 'gemini' or bool(app.config['GEMINI_API_KEY'])
     latex_available = latex_builder.check_latex_available()
-    logger.info(f"Health check: Gemini={gemini_configured}, LaTeX={latex_available}")
+    logger.info(f"Health check: LLM={llm_backend.name} ({ai_generator.model_name}) "
+                f"configured={llm_configured}, LaTeX={latex_available}")
     return jsonify({
         'status': 'healthy',
-        'gemini_configured': gemini_configured,
-        'latex_available': latex_available
+        'llm_backend': llm_backend.name,
+        'llm_model': ai_generator.model_name,
+        'llm_configured': llm_configured,
+        'latex_available': latex_available,
+        'jobs': job_queue.stats(),
+        'result_cache': result_cache.stats(),
+        'page_cache': page_cache.stats(),
+        'llm_cache': llm_cache.stats(),
+        'llm_models': ai_generator.router.stats(),
+        'compile_backends': latex_builder.compile_health.stats(),
+        'latex_formats': latex_builder.format_cache.stats() if latex_builder.format_cache else None,
+        'latex_builds': latex_builder.build_stats(),
+        'compile_sandbox': latex_builder.sandbox.stats()
     })
 
 if __name__ == '__main__':
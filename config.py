@@ -17,6 +17,7 @@ class Config:
     # File paths
     UPLOAD_FOLDER = BASE_DIR / 'uploads'
     OUTPUT_FOLDER = BASE_DIR / 'outputs'
+    CACHE_FOLDER = BASE_DIR / 'cache'
     
     # File restrictions
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
@@ -26,8 +27,102 @@ class Config:
     # Trim whitespace to avoid issues with accidental leading/trailing spaces
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '').strip()
     
+    # AI generation
+    # 'gemini' calls Google's API; 'offline' is a local stand-in for benchmarks and load tests
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+    # Offline stand-in: median latency, log-normal spread, mean output size, simulated 503 rate
+    OFFLINE_LLM_LATENCY_SECONDS = float(os.getenv('OFFLINE_LLM_LATENCY_SECONDS', '2.0'))
+    OFFLINE_LLM_LATENCY_SIGMA = float(os.getenv('OFFLINE_LLM_LATENCY_SIGMA', '0.5'))
+    OFFLINE_LLM_OUTPUT_CHARS = int(os.getenv('OFFLINE_LLM_OUTPUT_CHARS', '6000'))
+    OFFLINE_LLM_FAILURE_RATE = float(os.getenv('OFFLINE_LLM_FAILURE_RATE', '0'))
+    # Chunked mode covers long documents with concurrent per-chunk requests instead of truncating
+    GENERATION_CHUNKED = os.getenv('GENERATION_CHUNKED', 'false').lower() == 'true'
+    GENERATION_CHUNK_CHARS = int(os.getenv('GENERATION_CHUNK_CHARS', '12000'))
+    GENERATION_MAX_DOCUMENT_CHARS = int(os.getenv('GENERATION_MAX_DOCUMENT_CHARS', '300000'))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+    # Ask the model for a structured JSON document, rendered locally to LaTeX, HTML and PDF
+    # (falls back to raw LaTeX generation if the model's JSON does not validate)
+    GENERATION_STRUCTURED = os.getenv('GENERATION_STRUCTURED', 'false').lower() == 'true'
+    # Structured mode that generates detailed notes once and derives concise/outline locally,
+    # so asking for another note type of the same PDF needs no model call (implies structured)
+    GENERATION_MULTI_VARIANT = os.getenv('GENERATION_MULTI_VARIANT', 'false').lower() == 'true'
+    # Generate practice questions as a separate request concurrent with the notes
+    LLM_SPLIT_QUESTIONS = os.getenv('LLM_SPLIT_QUESTIONS', 'true').lower() == 'true'
+    LLM_QUESTIONS_OUTPUT_TOKENS = int(os.getenv('LLM_QUESTIONS_OUTPUT_TOKENS', '2048'))
+    # Size the notes' output token budget from the input length and note type (else always 4096)
+    LLM_ADAPTIVE_OUTPUT_TOKENS = os.getenv('LLM_ADAPTIVE_OUTPUT_TOKENS', 'true').lower() == 'true'
+    # Stream Gemini output to the job event stream as it is generated
+    LLM_STREAMING = os.getenv('LLM_STREAMING', 'true').lower() == 'true'
+    # Requests still unanswered after the primary model's p95 latency (or LLM_HEDGE_DELAY
+    # seconds, if set) are also sent to this faster model; first answer wins ('' disables)
+    LLM_HEDGE_MODEL = os.getenv('LLM_HEDGE_MODEL', 'gemini-2.5-flash')
+    LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', '0'))
+    # Retries on 429/5xx responses, with exponential backoff starting at LLM_BACKOFF_SECONDS
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+    LLM_BACKOFF_SECONDS = float(os.getenv('LLM_BACKOFF_SECONDS', '1.0'))
+    
     # LaTeX settings
     LATEX_COMPILER = 'pdflatex'  # or 'xelatex'
+    # Generated LaTeX needing more preflight repairs than this skips straight to ReportLab
+    LATEX_PREFLIGHT_MAX_REPAIRS = int(os.getenv('LATEX_PREFLIGHT_MAX_REPAIRS', '200'))
+    # A compile backend failing this many times in a row is skipped for COMPILE_BREAKER_OPEN_SECONDS,
+    # then probed once; backends are ordered by their last COMPILE_HEALTH_WINDOW attempts
+    COMPILE_BREAKER_FAILURES = int(os.getenv('COMPILE_BREAKER_FAILURES', '3'))
+    COMPILE_BREAKER_OPEN_SECONDS = float(os.getenv('COMPILE_BREAKER_OPEN_SECONDS', '300'))
+    COMPILE_HEALTH_WINDOW = int(os.getenv('COMPILE_HEALTH_WINDOW', '20'))
+    # Race ReportLab against the LaTeX backends, waiting at most this long for the LaTeX PDF
+    # before taking ReportLab's and killing the engines (0 = try backends one after another)
+    COMPILE_RACE_DEADLINE_SECONDS = float(os.getenv('COMPILE_RACE_DEADLINE_SECONDS', '0'))
+    # Compile against a cached mylatexformat dump of the template's static preamble
+    LATEX_PRECOMPILED_FORMAT = os.getenv('LATEX_PRECOMPILED_FORMAT', 'true').lower() == 'true'
+    # pdflatex/xelatex rerun only while the log or .aux files say references are unsettled, up to
+    # LATEX_MAX_RUNS times, in per-document build directories (LATEX_BUILD_DIRS are kept)
+    LATEX_MAX_RUNS = int(os.getenv('LATEX_MAX_RUNS', '4'))
+    LATEX_BUILD_DIRS = int(os.getenv('LATEX_BUILD_DIRS', '50'))
+    # At most COMPILE_WORKERS TeX engines run at once; COMPILE_MAX_PENDING more compiles wait up to
+    # COMPILE_QUEUE_TIMEOUT_SECONDS for a slot and any beyond that skip straight to ReportLab
+    COMPILE_WORKERS = int(os.getenv('COMPILE_WORKERS', '2'))
+    COMPILE_MAX_PENDING = int(os.getenv('COMPILE_MAX_PENDING', '8'))
+    COMPILE_QUEUE_TIMEOUT_SECONDS = float(os.getenv('COMPILE_QUEUE_TIMEOUT_SECONDS', '30'))
+    # Limits of each engine run: killed after COMPILE_TIMEOUT_SECONDS, and (POSIX only) capped at
+    # COMPILE_MEMORY_MB of address space and COMPILE_MAX_FILE_MB per written file (0 = unlimited)
+    COMPILE_TIMEOUT_SECONDS = float(os.getenv('COMPILE_TIMEOUT_SECONDS', '120'))
+    COMPILE_MEMORY_MB = int(os.getenv('COMPILE_MEMORY_MB', '1024'))
+    COMPILE_MAX_FILE_MB = int(os.getenv('COMPILE_MAX_FILE_MB', '256'))
+    
+    # Text extraction
+    # Stop parsing once this many characters are collected
+    # (0 = exactly as much input as AIGenerator will use)
+    EXTRACTION_CHAR_BUDGET = int(os.getenv('EXTRACTION_CHAR_BUDGET', '0'))
+    # 'auto' benchmarks installed backends (pypdfium2, pypdf2, pdfminer) on each document
+    EXTRACTION_BACKEND = os.getenv('EXTRACTION_BACKEND', 'auto')
+    # Documents with at least this many pages are extracted on a process pool
+    EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', str(os.cpu_count() or 1)))
+    PARALLEL_EXTRACTION_MIN_PAGES = int(os.getenv('PARALLEL_EXTRACTION_MIN_PAGES', '64'))
+    
+    # Text reduction between extraction and generation: strips running headers/footers and
+    # duplicate paragraphs, then ranks sentences to fit the token budget
+    TEXT_REDUCTION = os.getenv('TEXT_REDUCTION', 'true').lower() == 'true'
+    # 0 = exactly as much input as AIGenerator will use
+    TEXT_REDUCTION_TOKEN_BUDGET = int(os.getenv('TEXT_REDUCTION_TOKEN_BUDGET', '0'))
+    # Extract this multiple of the budget so ranking can choose from more of the document
+    TEXT_REDUCTION_OVERSAMPLE = float(os.getenv('TEXT_REDUCTION_OVERSAMPLE', '2.0'))
+    
+    # Background processing
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', '20'))
+    # With this many jobs waiting (0 = never), new jobs run degraded: requests go to
+    # DEGRADED_MODEL and detailed notes become DEGRADED_NOTE_TYPE ('' keeps either unchanged)
+    DEGRADE_QUEUE_DEPTH = int(os.getenv('DEGRADE_QUEUE_DEPTH', '8'))
+    DEGRADED_MODEL = os.getenv('DEGRADED_MODEL', 'gemini-2.5-flash')
+    DEGRADED_NOTE_TYPE = os.getenv('DEGRADED_NOTE_TYPE', 'concise')
+    
+    # Caching
+    RESULT_CACHE_MAX_MB = int(os.getenv('RESULT_CACHE_MAX_MB', '500'))
+    COMPILE_CACHE_MAX_FILES = int(os.getenv('COMPILE_CACHE_MAX_FILES', '200'))
+    PAGE_CACHE_MAX_DOCUMENTS = int(os.getenv('PAGE_CACHE_MAX_DOCUMENTS', '500'))
+    LLM_CACHE_MAX_MB = int(os.getenv('LLM_CACHE_MAX_MB', '100'))
+    LLM_CACHE_TTL_HOURS = float(os.getenv('LLM_CACHE_TTL_HOURS', '0'))  # 0 = never expire
     
     @staticmethod
     def init_app(app):
@@ -36,4 +131,5 @@ class Config:
         
         # Create directories if they don't exist
         Config.UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
-        Config.OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+        Config.OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
+        Config.CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
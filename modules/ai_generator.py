@@ -1,67 +1,191 @@
-import os
+import re
 import logging
-import google.generativeai as genai
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+from modules.document_ir import SCHEMA_DESCRIPTION, Document, derive_variant, parse_document
+from modules.llm_backends import GeminiBackend, LLMBackend
+from modules.model_router import ModelRouter
 
 logger = logging.getLogger(__name__)
 
-class AIGenerator:
-    """Handles AI content generation using Gemini (best free tier model)"""
+
+class LatexStreamCleaner:
+    """
+    Incremental counterpart of AIGenerator._clean_latex_response for streamed output
+    Drops a leading markdown fence or accidental preamble, stops at a closing fence or
+    \\end{document}, and keeps the raw text so the final result can be cleaned in full
+    """
+    
+    # Enough held-back text to recognise a terminator split across two chunks
+    HOLDBACK = len('\\end{document}')
+    # Give up waiting for \\section after this much leading text
+    MAX_HEAD = 2000
     
     def __init__(self):
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment")
-        
-        genai.configure(api_key=api_key)
-        
-        self.model = self._get_best_model()
-        logger.info(f"Using model: {self.model.model_name}")
-    
-    def _get_best_model(self):
-        """Get the best available model for LaTeX generation"""
-        # Models ordered by quality for LaTeX/structured output
-        models_to_try = [
-            'gemini-2.5-pro',         # Best quality - newest pro model
-            'gemini-2.5-flash',       # Good alternative with better features
-            'gemini-1.5-pro',         # Fallback pro model
-            'gemini-1.5-flash',       # Fallback flash model
-            'gemini-pro'              # Last resort
-        ]
+        self.raw = ''
+        self.pending = ''
+        self.started = False
+        self.finished = False
+    
+    def feed(self, piece: str) -> str:
+        """Add a raw chunk; returns cleaned text that is safe to show now"""
+        self.raw += piece
+        if self.finished:
+            return ''
+        self.pending += piece
         
-        print("=" * 60)
-        print("MODEL SELECTION")
-        print("=" * 60)
+        if not self.started:
+            section_pos = self.pending.find('\\section')
+            if section_pos == -1 and len(self.pending) < self.MAX_HEAD:
+                return ''
+            self.started = True
+            if section_pos != -1:
+                self.pending = self.pending[section_pos:]
+            else:
+                self.pending = re.sub(r'^\s*```[a-zA-Z]*\n', '', self.pending)
         
-        logger.info("Attempting to find best available Gemini model...")
-        
-        for model_name in models_to_try:
-            try:
-                logger.debug(f"Trying model: {model_name}")
-                print(f"  Attempting: {model_name}...")
-                model = genai.GenerativeModel(model_name)
-                logger.info(f"Successfully initialized model: {model_name}")
-                print(f"  ✓ Successfully initialized: {model_name}")
-                print("=" * 60)
-                return model
-            except Exception as e:
-                logger.debug(f"Model {model_name} not available: {str(e)}")
-                print(f"  ✗ Not available: {model_name}")
-                continue
+        for terminator in ('```', '\\end{document}'):
+            end_pos = self.pending.find(terminator)
+            if end_pos != -1:
+                self.finished = True
+                ready, self.pending = self.pending[:end_pos], ''
+                return ready
         
-        logger.error("Could not find any available model. Using gemini-pro as fallback...")
-        print("  ✗ Fallback to gemini-pro")
-        print("=" * 60)
-        return genai.GenerativeModel('gemini-pro')
+        ready = self.pending[:-self.HOLDBACK]
+        self.pending = self.pending[len(ready):]
+        return ready
+    
+    def finish(self) -> str:
+        """Flush whatever is still held back once the stream ends"""
+        ready, self.pending = ('' if self.finished else self.pending), ''
+        self.finished = True
+        return ready
+
+
+class AIGenerator:
+    """Handles AI content generation using Gemini (best free tier model) or another LLMBackend"""
+    
+    # Longest input sent to the model; anything beyond this is truncated
+    MAX_INPUT_CHARS = 15000
+    
+    GENERATION_CONFIG = {
+        'temperature': 0.7,
+        'top_p': 0.8,
+        'top_k': 40,
+        'max_output_tokens': 4096,
+    }
+    
+    # Output tokens per input token for each note type, clamped to the bounds below
+    OUTPUT_TOKEN_RATIOS = {
+        'detailed': 1.0,
+        'concise': 0.4,
+        'outline': 0.3,
+    }
+    MIN_OUTPUT_TOKENS = 1024
+    MAX_OUTPUT_TOKENS = 8192
+    # Rough characters per model token
+    CHARS_PER_TOKEN = 4
+    
+    # JSON is more verbose than the equivalent LaTeX body
+    STRUCTURED_OUTPUT_TOKENS = 8192
+    
+    # What the structured document should contain for each note type
+    STRUCTURED_GUIDANCE = {
+        'detailed': "Write thorough exam revision notes: several sections, each with subsections, "
+                    "explanatory paragraphs, key definitions, examiner tips and comparison tables.",
+        'concise': "Write brief revision notes: short paragraphs, only the essential definitions, "
+                   "a few examiner tips and one summary table.",
+        'outline': "Write a hierarchical outline: sections and subsections containing bullet lists of "
+                   "key points, ending with a Summary section holding a Concept/Definition/Example table.",
+    }
+    
+    # Where the practice question part of each template starts and ends
+    QUESTION_SECTION_MARKERS = {
+        'detailed': ('\\section{Practice Questions}', '\nFORMATTING RULES:'),
+        'concise': ('\\section{Quick Practice}', '\nOUTPUT ONLY'),
+    }
+    
+    def __init__(self, chunked: bool = False, chunk_chars: int = 12000,
+                 max_document_chars: int = 300000, max_concurrency: int = 4,
+                 streaming: bool = False, response_cache=None,
+                 hedge_model: Optional[str] = None, hedge_delay: float = 0,
+                 max_retries: int = 3, backoff_seconds: float = 1.0,
+                 backend: Optional[LLMBackend] = None, multi_variant: bool = False,
+                 split_questions: bool = False, questions_output_tokens: int = 2048,
+                 adaptive_output_tokens: bool = False, degraded_model: Optional[str] = None):
+        """
+        chunked: Cover long documents with concurrent per-chunk requests instead of truncating
+        chunk_chars: Target size of each chunk sent to the model
+        max_document_chars: Longest document accepted in chunked mode
+        max_concurrency: Most model requests in flight at once for one document
+        streaming: Stream single-request generations, reporting cleaned LaTeX as it arrives
+        response_cache: Optional LLMResponseCache consulted before every model request
+        hedge_model: Faster model that also gets a request once the primary runs slow
+        hedge_delay: Seconds before hedging (0 = primary's rolling p95 latency)
+        max_retries: Retries on rate limits and server errors, with exponential backoff
+        backoff_seconds: First backoff delay, doubled on each retry
+        backend: Service that answers prompts (default: GeminiBackend, which needs GEMINI_API_KEY)
+        multi_variant: Structured generation always asks for detailed notes with questions and derives
+                       the requested note type locally, so every variant shares one cached response
+        split_questions: Generate practice questions as a second request running alongside the notes
+        questions_output_tokens: Output token budget of that questions request
+        adaptive_output_tokens: Size each request's output token budget from its input length and note type
+        degraded_model: Cheaper, faster model used for requests made with degraded=True
+        """
+        self.chunked = chunked
+        self.chunk_chars = chunk_chars
+        self.max_document_chars = max_document_chars
+        self.max_concurrency = max_concurrency
+        self.streaming = streaming
+        self.response_cache = response_cache
+        self.multi_variant = multi_variant
+        self.split_questions = split_questions
+        self.questions_output_tokens = questions_output_tokens
+        self.adaptive_output_tokens = adaptive_output_tokens
+        
+        self.backend = backend or GeminiBackend()
+        self.model_name = self.backend.model_name
+        logger.info(f"Using model: {self.model_name}")
+        
+        hedge_name = None
+        if hedge_model:
+            hedge_name = self.backend.add_model(hedge_model)
+            logger.info(f"Hedging slow requests with: {hedge_name}")
+        
+        self.degraded_model = None
+        if degraded_model:
+            self.degraded_model = self.backend.add_model(degraded_model)
+            logger.info(f"Degraded mode model: {self.degraded_model}")
+        
+        self.router = ModelRouter(
+            self.backend.generate,
+            self.model_name,
+            stream_fn=self.backend.stream,
+            hedge_model=hedge_name,
+            hedge_delay=hedge_delay,
+            max_retries=max_retries,
+            backoff_base=backoff_seconds
+        )
     
     def generate_study_materials(self, text: str, note_type: str = 'detailed', 
-                                include_questions: bool = True) -> str:
+                                include_questions: bool = True,
+                                progress_callback: Optional[Callable] = None,
+                                degraded: bool = False) -> str:
         """
         Generate study materials from extracted text using Gemini
+        progress_callback(stage, **details) is called when the request is sent and answered
+        degraded: Send the requests to degraded_model (used while the server is overloaded)
         Returns: LaTeX formatted content
         """
         logger.info(f"Starting AI generation with note_type='{note_type}', include_questions={include_questions}")
         logger.debug(f"Input text length: {len(text)} characters")
         
+        model = self.degraded_model if degraded and self.degraded_model else self.model_name
+        if self.chunked and len(text) > self.MAX_INPUT_CHARS:
+            return self._generate_chunked(text, note_type, include_questions, progress_callback, model)
+        
         print("\n" + "=" * 60)
         print("AI GENERATION STARTED")
         print("=" * 60)
@@ -70,51 +194,69 @@ class AIGenerator:
         print(f"Input Text Length: {len(text)} characters")
         
         # Truncate text if too long
-        max_text_length = 15000
-        if len(text) > max_text_length:
-            logger.warning(f"Input text exceeds {max_text_length} chars. Truncating...")
-            text = text[:max_text_length] + "\n\n[Content truncated due to length]"
-            print(f"⚠ Input truncated to {max_text_length} characters")
+        if len(text) > self.MAX_INPUT_CHARS:
+            text = self._truncate_input(text)
         
-        prompt = self._build_prompt(text, note_type, include_questions)
+        # Questions get their own concurrent request so the two outputs are not generated back to back
+        split_questions = (include_questions and self.split_questions
+                           and note_type in self.QUESTION_SECTION_MARKERS)
+        prompt = self._build_prompt(text, note_type, include_questions and not split_questions)
+        max_output_tokens = self.output_token_budget(len(text), note_type,
+                                                     include_questions and not split_questions)
         logger.debug(f"Built prompt. Length: {len(prompt)} characters")
         print(f"Prompt Length: {len(prompt)} characters")
+        logger.info(f"Model: {model}, output token budget: "
+                    f"{max_output_tokens or self.GENERATION_CONFIG['max_output_tokens']}")
         
+        questions_executor = None
         try:
-            logger.info("Sending request to Gemini API...")
-            print("\n📤 Sending request to Gemini API...")
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.7,
-                    'top_p': 0.8,
-                    'top_k': 40,
-                    'max_output_tokens': 4096,
-                }
-            )
-            
-            logger.info(f"Gemini response received")
+            questions_future = None
+            if split_questions:
+                questions_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='llm-questions')
+                questions_future = questions_executor.submit(
+                    self._complete_cleaned,
+                    self._build_questions_prompt(text, note_type),
+                    self.questions_output_tokens,
+                    model
+                )
+                logger.info("Practice questions requested concurrently")
             
-            # Handle response safely
-            if response.candidates and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                if candidate.content and candidate.content.parts and len(candidate.content.parts) > 0:
-                    raw_output = candidate.content.parts[0].text
-                else:
-                    raise Exception("Empty response from Gemini")
+            cleaned_response = self._cache_lookup(prompt, max_output_tokens, model)
+            if cleaned_response is not None:
+                logger.info("Served from LLM response cache")
+                if progress_callback:
+                    progress_callback('llm_cache_hit', response_chars=len(cleaned_response))
             else:
-                raise Exception("No candidates in Gemini response")
-            
-            print(f"📥 Response received!")
-            print(f"Raw Response Length: {len(raw_output)} characters")
-            print("\n" + "-" * 60)
-            print("RAW LATEX OUTPUT FROM AI:")
-            print("-" * 60)
-            print(raw_output)
-            print("-" * 60)
+                logger.info("Sending request to Gemini API...")
+                print("\n📤 Sending request to Gemini API...")
+                if progress_callback:
+                    progress_callback('llm_request_sent', model=model, prompt_chars=len(prompt),
+                                      split_questions=split_questions, max_output_tokens=max_output_tokens)
+                
+                if self.streaming:
+                    raw_output = self._consume_stream(prompt, progress_callback, max_output_tokens, model)
+                else:
+                    raw_output = self._request_completion(prompt, max_output_tokens, model)
+                
+                print(f"📥 Response received!")
+                if progress_callback:
+                    progress_callback('llm_response_received', response_chars=len(raw_output))
+                print(f"Raw Response Length: {len(raw_output)} characters")
+                print("\n" + "-" * 60)
+                print("RAW LATEX OUTPUT FROM AI:")
+                print("-" * 60)
+                print(raw_output)
+                print("-" * 60)
+                
+                cleaned_response = self._clean_latex_response(raw_output)
+                self._cache_store(prompt, cleaned_response, max_output_tokens, model)
             
-            cleaned_response = self._clean_latex_response(raw_output)
+            if questions_future:
+                questions = questions_future.result()
+                logger.info(f"Practice questions received ({len(questions)} chars)")
+                if progress_callback:
+                    progress_callback('llm_questions_received', response_chars=len(questions))
+                cleaned_response += '\n\n' + questions
             
             print("\n" + "-" * 60)
             print("CLEANED LATEX OUTPUT:")
@@ -133,12 +275,302 @@ class AIGenerator:
             print(f"Error: {str(e)}")
             print("=" * 60 + "\n")
             raise Exception(f"AI generation failed: {str(e)}")
+        finally:
+            if questions_executor:
+                questions_executor.shutdown(wait=False)
     
-    def _build_prompt(self, text: str, note_type: str, include_questions: bool) -> str:
-        """Build the prompt for the AI"""
-        logger.debug(f"Building prompt for note_type='{note_type}'")
+    def generate_structured_document(self, text: str, note_type: str = 'detailed',
+                                     include_questions: bool = True,
+                                     progress_callback: Optional[Callable] = None,
+                                     degraded: bool = False) -> Document:
+        """
+        Generate study materials as a structured Document (see modules.document_ir)
+        The model returns JSON, which is validated once and cached in normalised form
+        degraded: Send the request to degraded_model (used while the server is overloaded)
+        Raises: DocumentValidationError if the model's output is not a usable document
+        """
+        model = self.degraded_model if degraded and self.degraded_model else self.model_name
+        if self.multi_variant:
+            document = self._generate_document(text, 'detailed', True, progress_callback, model)
+            variant = derive_variant(document, note_type, include_questions)
+            logger.info(f"Derived '{note_type}' notes locally from the detailed document")
+            if progress_callback:
+                progress_callback('variant_derived', note_type=note_type)
+            return variant
+        return self._generate_document(text, note_type, include_questions, progress_callback, model)
+    
+    def _generate_document(self, text: str, note_type: str, include_questions: bool,
+                           progress_callback: Optional[Callable] = None,
+                           model: Optional[str] = None) -> Document:
+        """One structured request (or response cache hit) for exactly this note type"""
+        logger.info(f"Starting structured generation with note_type='{note_type}', include_questions={include_questions}")
+        text = self._truncate_input(text)
+        prompt = self._build_structured_prompt(text, note_type, include_questions)
+        
+        cached = self._cache_lookup(prompt, self.STRUCTURED_OUTPUT_TOKENS, model)
+        if cached is not None:
+            if progress_callback:
+                progress_callback('llm_cache_hit', response_chars=len(cached))
+            return parse_document(cached)
+        
+        if progress_callback:
+            progress_callback('llm_request_sent', model=model or self.model_name, prompt_chars=len(prompt),
+                              structured=True)
+        raw_output = self._request_completion(prompt, self.STRUCTURED_OUTPUT_TOKENS, model)
+        
+        document = parse_document(raw_output)
+        logger.info(f"Structured document received: {len(document.sections)} sections, "
+                    f"{len(document.questions)} questions")
+        if progress_callback:
+            progress_callback('llm_response_received', response_chars=len(raw_output),
+                              sections=len(document.sections), questions=len(document.questions))
+        
+        self._cache_store(prompt, document.to_json(), self.STRUCTURED_OUTPUT_TOKENS, model)
+        return document
+    
+    def _build_structured_prompt(self, text: str, note_type: str, include_questions: bool) -> str:
+        """Prompt asking for the structured JSON document instead of LaTeX"""
+        if note_type not in self.STRUCTURED_GUIDANCE:
+            logger.warning(f"Unknown note_type '{note_type}'. Using default 'detailed'")
+            note_type = 'detailed'
+        
+        if include_questions:
+            questions = ("Include 5-8 multiple choice practice questions in \"questions\", each with four "
+                         "options and the correct option as \"answer\".")
+        else:
+            questions = 'Leave "questions" as an empty list.'
+        
+        return f"""{self.STRUCTURED_GUIDANCE[note_type]}
+{questions}
+
+{SCHEMA_DESCRIPTION}
+
+CONTENT TO ANALYZE:
+{text}
+
+BEGIN OUTPUT:"""
+    
+    @property
+    def input_char_budget(self) -> int:
+        """Most characters of extracted text this generator will actually use"""
+        return self.max_document_chars if self.chunked else self.MAX_INPUT_CHARS
+    
+    def output_token_budget(self, input_chars: int, note_type: str, include_questions: bool = False) -> Optional[int]:
+        """
+        Output tokens to allow for notes over input_chars of text (None = GENERATION_CONFIG default)
+        Scales with the input by note type; inline practice questions add questions_output_tokens
+        """
+        if not self.adaptive_output_tokens:
+            return None
+        ratio = self.OUTPUT_TOKEN_RATIOS.get(note_type, self.OUTPUT_TOKEN_RATIOS['detailed'])
+        budget = int(input_chars / self.CHARS_PER_TOKEN * ratio)
+        if include_questions:
+            budget += self.questions_output_tokens
+        return max(self.MIN_OUTPUT_TOKENS, min(self.MAX_OUTPUT_TOKENS, budget))
+    
+    def _generation_config(self, max_output_tokens: Optional[int] = None) -> dict:
+        """Generation config for one request"""
+        generation_config = dict(self.GENERATION_CONFIG)
+        if max_output_tokens:
+            generation_config['max_output_tokens'] = max_output_tokens
+        return generation_config
+    
+    def _cache_lookup(self, prompt: str, max_output_tokens: Optional[int] = None,
+                      model: Optional[str] = None) -> Optional[str]:
+        """Cleaned response previously stored for this exact request, if any"""
+        if not self.response_cache:
+            return None
+        return self.response_cache.get(model or self.model_name, self._generation_config(max_output_tokens), prompt)
+    
+    def _cache_store(self, prompt: str, cleaned: str, max_output_tokens: Optional[int] = None,
+                     model: Optional[str] = None):
+        if self.response_cache:
+            self.response_cache.put(model or self.model_name, self._generation_config(max_output_tokens),
+                                    prompt, cleaned)
+    
+    def _complete_cleaned(self, prompt: str, max_output_tokens: Optional[int] = None,
+                          model: Optional[str] = None) -> str:
+        """Cleaned response for a prompt, from the response cache or a fresh request"""
+        cached = self._cache_lookup(prompt, max_output_tokens, model)
+        if cached is not None:
+            return cached
+        cleaned = self._clean_latex_response(self._request_completion(prompt, max_output_tokens, model))
+        self._cache_store(prompt, cleaned, max_output_tokens, model)
+        return cleaned
+    
+    def _request_completion(self, prompt: str, max_output_tokens: Optional[int] = None,
+                            model: Optional[str] = None) -> str:
+        """Send one prompt through the router (retries and hedging) and return the raw text"""
+        return self.router.complete(prompt, self._generation_config(max_output_tokens), model)
+    
+    def _iter_cleaned_stream(self, prompt: str, cleaner: LatexStreamCleaner,
+                             max_output_tokens: Optional[int] = None,
+                             model: Optional[str] = None) -> Iterator[str]:
+        """Stream one prompt and yield incrementally cleaned text (raw text accumulates in cleaner)"""
+        # Opening the stream waits for the first chunk, so rate limits surface here and can be
+        # retried, and a slow first chunk from the primary is hedged like a slow completion
+        pieces = self.router.open_stream(prompt, self._generation_config(max_output_tokens), model)
+        for piece in pieces:
+            cleaned = cleaner.feed(piece)
+            if cleaned:
+                yield cleaned
+        
+        tail = cleaner.finish()
+        if tail:
+            yield tail
+        
+        if not cleaner.raw:
+            raise Exception("Empty response from Gemini")
+    
+    def _consume_stream(self, prompt: str, progress_callback: Optional[Callable] = None,
+                        max_output_tokens: Optional[int] = None, model: Optional[str] = None) -> str:
+        """Stream a completion, reporting each cleaned fragment; returns the raw output"""
+        cleaner = LatexStreamCleaner()
+        first = True
+        for fragment in self._iter_cleaned_stream(prompt, cleaner, max_output_tokens, model):
+            if progress_callback:
+                if first:
+                    progress_callback('llm_streaming', model=model or self.model_name)
+                    first = False
+                progress_callback('llm_delta', text=fragment)
+        logger.info(f"Gemini stream completed ({len(cleaner.raw)} chars)")
+        return cleaner.raw
+    
+    def _truncate_input(self, text: str) -> str:
+        """Cut text down to MAX_INPUT_CHARS, marking the truncation"""
+        if len(text) > self.MAX_INPUT_CHARS:
+            logger.warning(f"Input text exceeds {self.MAX_INPUT_CHARS} chars. Truncating...")
+            text = text[:self.MAX_INPUT_CHARS] + "\n\n[Content truncated due to length]"
+        return text
+    
+    def _generate_chunked(self, text: str, note_type: str, include_questions: bool,
+                          progress_callback: Optional[Callable] = None,
+                          model: Optional[str] = None) -> str:
+        """
+        Map-reduce generation for documents longer than MAX_INPUT_CHARS
+        Each chunk gets its own notes request, run concurrently (bounded by max_concurrency),
+        with practice questions as one more concurrent request over a sample of every chunk.
+        The chunk bodies are then stitched into one LaTeX body in document order.
+        """
+        if len(text) > self.max_document_chars:
+            logger.warning(f"Input text exceeds {self.max_document_chars} chars. Truncating...")
+            text = text[:self.max_document_chars] + "\n\n[Content truncated due to length]"
+        
+        chunks = self._split_into_chunks(text, self.chunk_chars)
+        logger.info(f"Chunked generation: {len(chunks)} chunks of up to {self.chunk_chars} chars, "
+                    f"{self.max_concurrency} concurrent requests")
+        if progress_callback:
+            progress_callback('llm_request_sent', model=model or self.model_name, chunks=len(chunks),
+                              prompt_chars=len(text))
+        
+        completed = itertools.count(1)
+        
+        def generate_chunk(index: int, chunk: str) -> str:
+            part = (index + 1, len(chunks))
+            prompt = self._build_prompt(chunk, note_type, include_questions=False, part=part)
+            body = self._complete_cleaned(prompt, self.output_token_budget(len(chunk), note_type), model)
+            logger.info(f"Chunk {part[0]}/{part[1]} generated ({len(body)} chars)")
+            if progress_callback:
+                progress_callback('llm_chunk_completed', chunk=part[0], chunks=part[1], completed=next(completed))
+            return body
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                chunk_futures = [executor.submit(generate_chunk, i, chunk) for i, chunk in enumerate(chunks)]
+                questions_future = None
+                if include_questions and note_type in self.QUESTION_SECTION_MARKERS:
+                    # Every chunk contributes an equal share of the questions' source text
+                    share = self.MAX_INPUT_CHARS // len(chunks)
+                    sample = '\n\n'.join(chunk[:share] for chunk in chunks)
+                    questions_future = executor.submit(
+                        self._complete_cleaned, self._build_questions_prompt(sample, note_type),
+                        self.questions_output_tokens, model
+                    )
+                
+                bodies = [future.result() for future in chunk_futures]
+                merged = self._merge_chunk_bodies(bodies)
+                if questions_future:
+                    merged += '\n\n' + questions_future.result()
+        except Exception as e:
+            logger.error(f"Chunked AI generation failed: {str(e)}", exc_info=True)
+            raise Exception(f"AI generation failed: {str(e)}")
         
-        prompt_templates = {
+        if progress_callback:
+            progress_callback('llm_response_received', response_chars=len(merged), chunks=len(chunks))
+        logger.info(f"Chunked generation completed. Merged LaTeX length: {len(merged)} characters")
+        return merged
+    
+    @staticmethod
+    def _split_into_chunks(text: str, max_chars: int) -> List[str]:
+        """
+        Split text into chunks of at most max_chars, breaking on page markers where possible
+        and on paragraph boundaries inside pages that are too long on their own
+        """
+        pieces = []
+        for page in re.split(r'(?=^--- Page \d+ ---$)', text, flags=re.MULTILINE):
+            if len(page) <= max_chars:
+                pieces.append(page)
+                continue
+            # Oversized page: break on blank lines, then hard-split anything still too long
+            for paragraph in re.split(r'(?<=\n\n)', page):
+                pieces.extend(paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars))
+        
+        chunks = []
+        current = []
+        current_len = 0
+        for piece in pieces:
+            if current and current_len + len(piece) > max_chars:
+                chunks.append(''.join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece)
+        if current:
+            chunks.append(''.join(current))
+        
+        return [chunk for chunk in chunks if chunk.strip()]
+    
+    @staticmethod
+    def _merge_chunk_bodies(bodies: List[str]) -> str:
+        """
+        Join per-chunk LaTeX bodies in document order
+        A chunk that opens with the same \\section as the previous chunk's last section
+        continues it, so the repeated heading is dropped
+        """
+        section_pattern = re.compile(r'\\section\*?\{([^}]*)\}')
+        merged = []
+        last_section = None
+        for body in bodies:
+            body = body.strip()
+            first = section_pattern.match(body)
+            if first and last_section and first.group(1).strip().lower() == last_section:
+                body = body[first.end():].lstrip()
+            sections = section_pattern.findall(body)
+            if sections:
+                last_section = sections[-1].strip().lower()
+            merged.append(body)
+        return '\n\n'.join(merged)
+    
+    def _build_questions_prompt(self, text: str, note_type: str) -> str:
+        """Prompt for only the practice question section of a note type"""
+        template = self._get_templates()[note_type]
+        start_marker, end_marker = self.QUESTION_SECTION_MARKERS[note_type]
+        questions = template[template.index(start_marker):template.index(end_marker)].strip()
+        
+        return f"""IMPORTANT: Generate ONLY the practice question section below as LaTeX body content (no \\documentclass, \\usepackage, \\begin{{document}}, or \\end{{document}} commands, and no notes).
+
+{questions}
+
+OUTPUT ONLY LaTeX content. Begin with \\section.
+
+CONTENT TO ANALYZE:
+{text}
+
+BEGIN OUTPUT:"""
+    
+    def _get_templates(self) -> dict:
+        """Prompt templates for each note type"""
+        return {
             'detailed': """IMPORTANT: Generate ONLY the content that goes INSIDE the document body (no \\documentclass, \\usepackage, \\begin{document}, or \\end{document} commands).
 
 DOCUMENT STRUCTURE:
@@ -293,6 +725,15 @@ Concept B & Definition & Example \\\\
 
 OUTPUT ONLY LaTeX content."""
         }
+    
+    def _build_prompt(self, text: str, note_type: str, include_questions: bool, part: Optional[tuple] = None) -> str:
+        """
+        Build the prompt for the AI
+        part: Optional (index, total) when text is one chunk of a longer document
+        """
+        logger.debug(f"Building prompt for note_type='{note_type}'")
+        
+        prompt_templates = self._get_templates()
         
         if note_type not in prompt_templates:
             logger.warning(f"Unknown note_type '{note_type}'. Using default 'detailed'")
@@ -300,6 +741,15 @@ OUTPUT ONLY LaTeX content."""
         
         template = prompt_templates[note_type]
         
+        if not include_questions and note_type in self.QUESTION_SECTION_MARKERS:
+            start_marker, end_marker = self.QUESTION_SECTION_MARKERS[note_type]
+            template = template[:template.index(start_marker)] + template[template.index(end_marker):]
+            template = template.replace('end with the MCQ section', 'do not add practice questions')
+        
+        if part:
+            template += (f"\n\nThis content is part {part[0]} of {part[1]} of a longer document. "
+                         f"Cover only this part, starting with a \\section for its main topic.")
+        
         logger.debug(f"Template selected: {note_type}")
         
         try:
@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BackendHealth:
+    """Circuit breaker state and a rolling window of outcomes for one compile backend"""
+
+    def __init__(self, window: int = 20):
+        self.outcomes = deque(maxlen=window)  # (succeeded, seconds)
+        self.state = 'closed'  # closed -> open -> half_open -> closed | open
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.attempts = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error = None
+        self.last_skip_reason = None
+
+    @property
+    def success_rate(self) -> float:
+        """Share of recent attempts that produced a PDF, smoothed towards 0.5 when there are few"""
+        successes = sum(1 for succeeded, _ in self.outcomes if succeeded)
+        return (successes + 1) / (len(self.outcomes) + 2)
+
+    @property
+    def mean_seconds(self) -> Optional[float]:
+        if not self.outcomes:
+            return None
+        return sum(seconds for _, seconds in self.outcomes) / len(self.outcomes)
+
+    def expected_seconds(self) -> float:
+        """Expected time spent on this backend per PDF it produces (0 until it has been tried)"""
+        if not self.outcomes:
+            return 0.0
+        return self.mean_seconds / self.success_rate
+
+
+class CompileHealthTracker:
+    """
+    Per-backend circuit breakers and health scores for LatexBuilder.compile_to_pdf
+    A backend failing failure_threshold times in a row is skipped (open) for open_seconds,
+    then gets a single probe (half-open): success closes the circuit, failure re-opens it.
+    Closed backends are tried cheapest first, by mean latency divided by success rate.
+    """
+
+    def __init__(self, failure_threshold: int = 3, open_seconds: float = 300, window: int = 20):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.window = window
+        self.backends: Dict[str, BackendHealth] = {}
+        self.lock = threading.Lock()
+
+    def _health(self, name: str) -> BackendHealth:
+        if name not in self.backends:
+            self.backends[name] = BackendHealth(self.window)
+        return self.backends[name]
+
+    def order(self, names: List[str]) -> List[str]:
+        """
+        names sorted by expected cost, with open circuits last
+        Untried backends cost 0 and ties keep the given order
+        """
+        with self.lock:
+            def key(name):
+                health = self._health(name)
+                return (health.state == 'open', health.expected_seconds())
+            return sorted(names, key=key)
+
+    def allow(self, name: str) -> Tuple[bool, Optional[str]]:
+        """
+        Whether to try this backend now
+        Returns: (allowed, reason it was skipped)
+        """
+        with self.lock:
+            health = self._health(name)
+            reason = None
+            if health.state == 'open':
+                remaining = health.opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    reason = (f"circuit open after {health.consecutive_failures} failures "
+                              f"(last: {health.last_error}); retry in {remaining:.0f}s")
+                else:
+                    health.state = 'half_open'
+                    health.probe_in_flight = True
+                    logger.info(f"Compile backend {name} half-open: sending probe")
+                    return True, None
+            elif health.state == 'half_open' and health.probe_in_flight:
+                reason = 'half-open probe already in progress'
+
+            if reason:
+                health.skipped += 1
+                health.last_skip_reason = reason
+                return False, reason
+            if health.state == 'half_open':
+                health.probe_in_flight = True
+            return True, None
+
+    def skip(self, name: str, reason: str):
+        """Record a skip decided by the caller (e.g. the backend is not installed)"""
+        with self.lock:
+            health = self._health(name)
+            health.skipped += 1
+            health.last_skip_reason = reason
+
+    def record_success(self, name: str, seconds: float):
+        with self.lock:
+            health = self._health(name)
+            health.attempts += 1
+            health.outcomes.append((True, seconds))
+            health.consecutive_failures = 0
+            health.probe_in_flight = False
+            if health.state != 'closed':
+                logger.info(f"Compile backend {name} recovered: circuit closed")
+            health.state = 'closed'
+
+    def record_cancelled(self, name: str):
+        """An attempt abandoned by the caller says nothing about the backend's health"""
+        with self.lock:
+            self._health(name).probe_in_flight = False
+
+    def record_failure(self, name: str, seconds: float, error: str):
+        with self.lock:
+            health = self._health(name)
+            health.attempts += 1
+            health.failures += 1
+            health.outcomes.append((False, seconds))
+            health.consecutive_failures += 1
+            health.last_error = error[:200]
+            health.probe_in_flight = False
+            if health.state == 'half_open' or health.consecutive_failures >= self.failure_threshold:
+                if health.state != 'open':
+                    logger.warning(f"Compile backend {name} circuit opened for {self.open_seconds:.0f}s "
+                                   f"after {health.consecutive_failures} failures")
+                health.state = 'open'
+                health.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            report = {}
+            for name, health in self.backends.items():
+                mean = health.mean_seconds
+                retry_in = None
+                if health.state == 'open':
+                    retry_in = round(max(0.0, health.opened_at + self.open_seconds - now), 1)
+                report[name] = {
+                    'state': health.state,
+                    'retry_in_seconds': retry_in,
+                    'consecutive_failures': health.consecutive_failures,
+                    'attempts': health.attempts,
+                    'failures': health.failures,
+                    'skipped': health.skipped,
+                    'success_rate': round(health.success_rate, 3),
+                    'mean_seconds': round(mean, 3) if mean is not None else None,
+                    'expected_seconds': round(health.expected_seconds(), 3),
+                    'last_error': health.last_error,
+                    'last_skip_reason': health.last_skip_reason
+                }
+            return report
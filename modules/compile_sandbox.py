@@ -0,0 +1,217 @@
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, only the wall-clock limit applies
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# No preexec_fn (it can deadlock in a threaded parent): limits are set at exec time by
+# util-linux prlimit when installed, otherwise on the just-started child
+CAN_LIMIT = hasattr(resource, 'prlimit')
+
+
+class CompileCancelled(RuntimeError):
+    """Raised when a compile is abandoned because another backend won the race or time ran out"""
+
+
+class CompileQueueFull(RuntimeError):
+    """Raised when too many compiles are already waiting for a sandbox slot"""
+
+
+class CompileLimitExceeded(RuntimeError):
+    """Raised when an engine is killed for running past the sandbox's wall-clock limit"""
+
+
+class CompileSandbox:
+    """
+    Fixed number of slots for TeX engine processes, shared by every compile
+    At most max_workers engines run at once. Up to max_pending more callers wait for a slot
+    (for at most queue_timeout seconds); beyond that they are turned away with CompileQueueFull.
+    Each engine runs in its own process group, under address-space and file-size rlimits
+    where the platform has them (Linux), and is killed with its children when the caller
+    cancels it (CompileCancelled) or wall_seconds pass (CompileLimitExceeded).
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 8, queue_timeout: float = 30,
+                 wall_seconds: float = 120, memory_mb: int = 1024, file_mb: int = 256):
+        """
+        wall_seconds: Wall-clock limit of a single engine run (0 = only the caller's timeout)
+        memory_mb: Address-space limit of an engine process (0 = unlimited)
+        file_mb: Largest file an engine process may write, e.g. a runaway log (0 = unlimited)
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.wall_seconds = wall_seconds
+        self.memory_mb = memory_mb
+        self.file_mb = file_mb
+        self.prlimit = shutil.which('prlimit') if CAN_LIMIT else None
+        self.slots = threading.BoundedSemaphore(self.max_workers)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+        self.runs = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.timeouts = 0  # The caller's own deadline passed
+        self.limit_kills = 0  # wall_seconds passed
+        self.signalled = 0  # Died from a signal, e.g. SIGXFSZ or SIGSEGV after hitting an rlimit
+        self.max_queue_wait = 0.0
+
+    def run(self, command: list, cancel: Optional[threading.Event] = None,
+            timeout: Optional[float] = None, cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        """
+        Run an engine like subprocess.run(capture_output=True, text=True) once a slot is free
+        timeout: Seconds the caller can spend, waiting for a slot included
+        Raises: CompileQueueFull, CompileCancelled, CompileLimitExceeded
+        """
+        start = time.monotonic()
+        deadline = start + timeout if timeout else None
+        self._acquire(command[0], cancel, deadline)
+        waited = time.monotonic() - start
+        with self.lock:
+            self.running += 1
+            self.runs += 1
+            self.max_queue_wait = max(self.max_queue_wait, waited)
+        try:
+            return self._run(command, cancel, deadline, cwd)
+        finally:
+            with self.lock:
+                self.running -= 1
+            self.slots.release()
+
+    def _acquire(self, name: str, cancel: Optional[threading.Event], deadline: Optional[float]):
+        """Take a slot, queueing behind at most max_pending other callers"""
+        if self.slots.acquire(blocking=False):
+            return
+        with self.lock:
+            if self.waiting >= self.max_pending:
+                self.rejected += 1
+                raise CompileQueueFull(f"{self.waiting} compiles already waiting for "
+                                       f"{self.max_workers} compile slots")
+            self.waiting += 1
+        try:
+            give_up = time.monotonic() + self.queue_timeout
+            while not self.slots.acquire(timeout=0.2):
+                now = time.monotonic()
+                if cancel is not None and cancel.is_set():
+                    self._count('cancelled')
+                    raise CompileCancelled(f"{name} cancelled while waiting for a compile slot")
+                if deadline and now >= deadline:
+                    self._count('timeouts')
+                    raise CompileCancelled(f"{name} timed out while waiting for a compile slot")
+                if now >= give_up:
+                    self._count('rejected')
+                    raise CompileQueueFull(f"No compile slot free after {self.queue_timeout:.0f}s")
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def _run(self, command: list, cancel: Optional[threading.Event], deadline: Optional[float],
+             cwd: Optional[str]) -> subprocess.CompletedProcess:
+        limit = time.monotonic() + self.wall_seconds if self.wall_seconds else None
+        # Own process group on POSIX, so helpers the engine spawned are killed with it
+        process = subprocess.Popen(self._limited(command), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True, cwd=cwd,
+                                   start_new_session=hasattr(os, 'killpg'))
+        if not self.prlimit:
+            self._limit_resources(process.pid)
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=0.2)
+                break
+            except subprocess.TimeoutExpired:
+                now = time.monotonic()
+                if cancel is not None and cancel.is_set():
+                    reason, counter = 'cancelled', 'cancelled'
+                elif deadline and now >= deadline:
+                    reason, counter = 'timed out', 'timeouts'
+                elif limit and now >= limit:
+                    reason, counter = f'killed after the {self.wall_seconds:g}s compile limit', 'limit_kills'
+                else:
+                    continue
+                self._kill(process)
+                self._count(counter)
+                if counter == 'limit_kills':
+                    logger.warning(f"{command[0]} {reason}")
+                    raise CompileLimitExceeded(f"{command[0]} {reason}")
+                raise CompileCancelled(f"{command[0]} {reason}")
+
+        if process.returncode < 0:
+            self._count('signalled')
+            try:
+                name = signal.Signals(-process.returncode).name
+            except ValueError:
+                name = str(-process.returncode)
+            logger.warning(f"{command[0]} died from {name} (resource limit?)")
+            stderr = f"{stderr}\n{command[0]} died from {name}"
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+    def _limited(self, command: list) -> list:
+        """Wrap command in prlimit, so the limits hold from the engine's first instruction"""
+        if not self.prlimit:
+            return command
+        limits = []
+        if self.memory_mb:
+            limits.append(f"--as={self.memory_mb * 1024 * 1024}")
+        if self.file_mb:
+            limits.append(f"--fsize={self.file_mb * 1024 * 1024}")
+        return [self.prlimit, *limits, '--', *command] if limits else command
+
+    def _limit_resources(self, pid: int):
+        """Cap a just-started engine's address space and file sizes (children inherit the limits)"""
+        if not CAN_LIMIT:
+            return
+        try:
+            if self.memory_mb:
+                memory = self.memory_mb * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (memory, memory))
+            if self.file_mb:
+                size = self.file_mb * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_FSIZE, (size, size))
+        except ProcessLookupError:
+            pass  # Already exited
+
+    def _kill(self, process: subprocess.Popen):
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            process.kill()
+        process.communicate()
+
+    def _count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'workers': self.max_workers,
+                'running': self.running,
+                'waiting': self.waiting,
+                'max_pending': self.max_pending,
+                'runs': self.runs,
+                'rejected': self.rejected,
+                'cancelled': self.cancelled,
+                'timeouts': self.timeouts,
+                'limit_kills': self.limit_kills,
+                'signalled': self.signalled,
+                'max_queue_wait_seconds': round(self.max_queue_wait, 3),
+                'limits': {
+                    'wall_seconds': self.wall_seconds or None,
+                    'memory_mb': (self.memory_mb or None) if CAN_LIMIT else None,
+                    'file_mb': (self.file_mb or None) if CAN_LIMIT else None
+                }
+            }
@@ -0,0 +1,420 @@
+"""
+Structured intermediate representation of generated study notes
+The model returns the document as compact JSON; it is validated once into these classes
+and rendered locally to LaTeX, HTML and (in LatexBuilder) ReportLab flowables.
+
+Inline text may use **bold**, *italic* and $inline math$.
+"""
+
+import html
+import json
+import logging
+import re
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+BLOCK_TYPES = ('paragraph', 'definition', 'tip', 'note', 'list', 'table')
+
+# Prompt fragment describing the JSON the model must return
+SCHEMA_DESCRIPTION = """Return ONE JSON object and nothing else (no markdown fences, no commentary):
+{
+  "title": "Document topic",
+  "sections": [
+    {
+      "title": "Section title",
+      "blocks": [BLOCK, ...],
+      "subsections": [{"title": "Subsection title", "blocks": [BLOCK, ...]}]
+    }
+  ],
+  "questions": [
+    {"question": "Question text", "options": ["Option A", "Option B", "Option C", "Option D"], "answer": "Option B"}
+  ]
+}
+Each BLOCK is one of:
+  {"type": "paragraph", "text": "..."}
+  {"type": "definition", "term": "...", "text": "..."}
+  {"type": "tip", "text": "Examiner tip or common mistake"}
+  {"type": "note", "text": "Important note"}
+  {"type": "list", "ordered": false, "items": ["...", "..."]}
+  {"type": "table", "header": ["...", "..."], "rows": [["...", "..."]]}
+Text may use **bold**, *italic* and $inline LaTeX math$. Do not use any other LaTeX commands."""
+
+
+class DocumentValidationError(ValueError):
+    """Model output that is not a valid structured document"""
+
+
+@dataclass
+class Block:
+    type: str
+    text: str = ''
+    term: str = ''
+    ordered: bool = False
+    items: List[str] = field(default_factory=list)
+    header: List[str] = field(default_factory=list)
+    rows: List[List[str]] = field(default_factory=list)
+
+
+@dataclass
+class Section:
+    title: str
+    blocks: List[Block] = field(default_factory=list)
+    subsections: List['Section'] = field(default_factory=list)
+
+
+@dataclass
+class Question:
+    question: str
+    options: List[str] = field(default_factory=list)
+    answer: str = ''
+
+
+@dataclass
+class Document:
+    title: str
+    sections: List[Section] = field(default_factory=list)
+    questions: List[Question] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+
+def parse_document(raw: str) -> Document:
+    """
+    Validate model output into a Document
+    Tolerates a surrounding markdown fence or prose; drops unknown block types
+    Raises: DocumentValidationError if no usable document is found
+    """
+    start, end = raw.find('{'), raw.rfind('}')
+    if start == -1 or end <= start:
+        raise DocumentValidationError("No JSON object in model output")
+    try:
+        data = json.loads(raw[start:end + 1])
+    except ValueError as e:
+        raise DocumentValidationError(f"Invalid JSON in model output: {str(e)}")
+    if not isinstance(data, dict):
+        raise DocumentValidationError("Model output is not a JSON object")
+
+    sections = [_parse_section(s, depth=0) for s in _as_list(data.get('sections'))]
+    sections = [s for s in sections if s]
+    questions = [q for q in (_parse_question(q) for q in _as_list(data.get('questions'))) if q]
+    if not sections:
+        raise DocumentValidationError("Structured document has no sections")
+
+    document = Document(title=_text(data.get('title')) or 'Study Notes', sections=sections, questions=questions)
+    logger.debug(f"Structured document validated: {len(sections)} sections, {len(questions)} questions")
+    return document
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else []
+
+
+def _text(value) -> str:
+    if value is None:
+        return ''
+    return ' '.join(str(value).split())
+
+
+def _parse_section(data, depth: int) -> Optional[Section]:
+    if not isinstance(data, dict) or not _text(data.get('title')):
+        return None
+    blocks = [b for b in (_parse_block(b) for b in _as_list(data.get('blocks'))) if b]
+    subsections = []
+    if depth == 0:
+        subsections = [s for s in (_parse_section(s, 1) for s in _as_list(data.get('subsections'))) if s]
+    return Section(title=_text(data['title']), blocks=blocks, subsections=subsections)
+
+
+def _parse_block(data) -> Optional[Block]:
+    if isinstance(data, str):
+        return Block(type='paragraph', text=_text(data)) if data.strip() else None
+    if not isinstance(data, dict) or data.get('type') not in BLOCK_TYPES:
+        logger.debug(f"Dropping unrecognised block: {str(data)[:80]}")
+        return None
+
+    block_type = data['type']
+    if block_type == 'list':
+        items = [_text(item) for item in _as_list(data.get('items')) if _text(item)]
+        return Block(type='list', ordered=bool(data.get('ordered')), items=items) if items else None
+    if block_type == 'table':
+        header = [_text(cell) for cell in _as_list(data.get('header'))]
+        rows = [[_text(cell) for cell in row] for row in _as_list(data.get('rows')) if isinstance(row, list)]
+        width = max([len(header)] + [len(row) for row in rows]) if (header or rows) else 0
+        if not width or not rows:
+            return None
+        # Pad ragged rows so every renderer sees a rectangular table
+        header = header + [''] * (width - len(header)) if header else []
+        rows = [row + [''] * (width - len(row)) for row in rows]
+        return Block(type='table', header=header, rows=rows)
+
+    text = _text(data.get('text'))
+    if not text:
+        return None
+    return Block(type=block_type, text=text, term=_text(data.get('term')))
+
+
+def _parse_question(data) -> Optional[Question]:
+    if not isinstance(data, dict) or not _text(data.get('question')):
+        return None
+    options = [_text(option) for option in _as_list(data.get('options')) if _text(option)]
+    return Question(question=_text(data['question']), options=options, answer=_text(data.get('answer')))
+
+
+# --- Inline text ---
+
+INLINE_PATTERN = re.compile(r'(\$[^$]+\$|\*\*[^*]+\*\*|\*[^*\s][^*]*\*)')
+
+LATEX_SPECIALS = {
+    '\\': r'\textbackslash{}', '&': r'\&', '%': r'\%', '$': r'\$', '#': r'\#', '_': r'\_',
+    '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}', '^': r'\textasciicircum{}'
+}
+
+
+def _inline(text: str, plain, bold, italic, math) -> str:
+    """Apply per-format converters to the plain, bold, italic and math runs of text"""
+    output = []
+    for part in INLINE_PATTERN.split(text):
+        if not part:
+            continue
+        if part.startswith('$') and part.endswith('$') and len(part) > 2:
+            output.append(math(part[1:-1]))
+        elif part.startswith('**') and part.endswith('**') and len(part) > 4:
+            output.append(bold(plain(part[2:-2])))
+        elif part.startswith('*') and part.endswith('*') and len(part) > 2:
+            output.append(italic(plain(part[1:-1])))
+        else:
+            output.append(plain(part))
+    return ''.join(output)
+
+
+def latex_inline(text: str) -> str:
+    return _inline(
+        text,
+        plain=lambda s: ''.join(LATEX_SPECIALS.get(char, char) for char in s),
+        bold=lambda s: f"\\textbf{{{s}}}",
+        italic=lambda s: f"\\textit{{{s}}}",
+        math=lambda s: f"${s}$"
+    )
+
+
+def markup_inline(text: str) -> str:
+    """HTML-style markup, also understood by ReportLab's Paragraph"""
+    return _inline(
+        text,
+        plain=lambda s: html.escape(s, quote=False),
+        bold=lambda s: f"<b>{s}</b>",
+        italic=lambda s: f"<i>{s}</i>",
+        math=lambda s: f"<i>{html.escape(s, quote=False)}</i>"
+    )
+
+
+# --- LaTeX ---
+
+LATEX_BOXES = {'definition': 'definition', 'tip': 'examtip', 'note': 'importnote'}
+
+
+def render_latex(document: Document) -> str:
+    """Document body as LaTeX for LatexBuilder's template"""
+    parts = []
+    for section in document.sections:
+        parts.append(f"\\section{{{latex_inline(section.title)}}}")
+        parts.extend(_latex_block(block) for block in section.blocks)
+        for subsection in section.subsections:
+            parts.append(f"\\subsection{{{latex_inline(subsection.title)}}}")
+            parts.extend(_latex_block(block) for block in subsection.blocks)
+
+    if document.questions:
+        parts.append("\\section{Practice Questions}")
+        items = []
+        for question in document.questions:
+            item = f"\\item {latex_inline(question.question)}"
+            if question.options:
+                item += "\n\\begin{enumerate}[label=(\\alph*)]\n" + '\n'.join(
+                    f"\\item {latex_inline(option)}" for option in question.options
+                ) + "\n\\end{enumerate}"
+            items.append(item)
+        parts.append("\\begin{enumerate}\n" + '\n\n'.join(items) + "\n\\end{enumerate}")
+
+        answers = [(i, q.answer) for i, q in enumerate(document.questions, 1) if q.answer]
+        if answers:
+            parts.append("\\subsection*{Answers}\n\\begin{itemize}\n" + '\n'.join(
+                f"\\item[{i}.] {latex_inline(answer)}" for i, answer in answers
+            ) + "\n\\end{itemize}")
+    return '\n\n'.join(parts)
+
+
+def _latex_block(block: Block) -> str:
+    if block.type == 'paragraph':
+        return latex_inline(block.text)
+    if block.type in LATEX_BOXES:
+        env = LATEX_BOXES[block.type]
+        term = f"\\textbf{{{latex_inline(block.term)}}}: " if block.term else ''
+        return f"\\begin{{{env}}}\n{term}{latex_inline(block.text)}\n\\end{{{env}}}"
+    if block.type == 'list':
+        env = 'enumerate' if block.ordered else 'itemize'
+        items = '\n'.join(f"\\item {latex_inline(item)}" for item in block.items)
+        return f"\\begin{{{env}}}\n{items}\n\\end{{{env}}}"
+    if block.type == 'table':
+        width = len(block.rows[0])
+        lines = ["\\begin{center}", f"\\begin{{tabular}}{{{' '.join(['l'] * width)}}}", "\\toprule"]
+        if block.header:
+            lines.append(' & '.join(f"\\textbf{{{latex_inline(cell)}}}" for cell in block.header) + " \\\\")
+            lines.append("\\midrule")
+        lines.extend(' & '.join(latex_inline(cell) for cell in row) + " \\\\" for row in block.rows)
+        lines.extend(["\\bottomrule", "\\end{tabular}", "\\end{center}"])
+        return '\n'.join(lines)
+    return ''
+
+
+# --- HTML ---
+
+HTML_STYLE = """body{font-family:Helvetica,Arial,sans-serif;color:#2c3e50;max-width:860px;margin:2em auto;line-height:1.5;padding:0 1em}
+h1{color:#1a3a52;text-align:center}h2{background:#0066cc;color:#fff;padding:6px 10px}h3{color:#2d5a8c;border-left:4px solid #ff6b35;padding-left:8px}
+.box{border:1.5px solid;border-radius:4px;padding:8px 12px;margin:12px 0}.definition{border-color:#003865;background:#e6ebf0}
+.tip{border-color:#006400;background:#e6f0e6}.note{border-color:#ff6b35;background:#fff0eb}.box .label{font-weight:bold;display:block}
+table{border-collapse:collapse;margin:12px auto}th{background:#0066cc;color:#fff}th,td{border:1px solid #2d5a8c;padding:6px 10px}
+tr:nth-child(even) td{background:#f0f5ff}ol.options{list-style-type:lower-alpha}"""
+
+HTML_BOX_LABELS = {'definition': 'Key Definition', 'tip': 'Examiner Tip', 'note': 'Important Note'}
+
+
+def render_html(document: Document, title: Optional[str] = None) -> str:
+    """Standalone HTML page for the document"""
+    page_title = html.escape(title or document.title)
+    parts = [f"<h1>{page_title}</h1>"]
+    for section in document.sections:
+        parts.append(f"<h2>{markup_inline(section.title)}</h2>")
+        parts.extend(_html_block(block) for block in section.blocks)
+        for subsection in section.subsections:
+            parts.append(f"<h3>{markup_inline(subsection.title)}</h3>")
+            parts.extend(_html_block(block) for block in subsection.blocks)
+
+    if document.questions:
+        parts.append("<h2>Practice Questions</h2><ol>")
+        for question in document.questions:
+            options = ''.join(f"<li>{markup_inline(option)}</li>" for option in question.options)
+            if options:
+                options = f'<ol class="options">{options}</ol>'
+            answer = (f"<details><summary>Answer</summary>{markup_inline(question.answer)}</details>"
+                      if question.answer else '')
+            parts.append(f"<li>{markup_inline(question.question)}{options}{answer}</li>")
+        parts.append("</ol>")
+
+    body = '\n'.join(parts)
+    return (f"<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{page_title}</title>\n<style>{HTML_STYLE}</style>\n</head>\n<body>\n{body}\n</body>\n</html>\n")
+
+
+def _html_block(block: Block) -> str:
+    if block.type == 'paragraph':
+        return f"<p>{markup_inline(block.text)}</p>"
+    if block.type in HTML_BOX_LABELS:
+        term = f"<b>{markup_inline(block.term)}</b>: " if block.term else ''
+        return (f"<div class=\"box {block.type}\"><span class=\"label\">{HTML_BOX_LABELS[block.type]}</span>"
+                f"{term}{markup_inline(block.text)}</div>")
+    if block.type == 'list':
+        tag = 'ol' if block.ordered else 'ul'
+        items = ''.join(f"<li>{markup_inline(item)}</li>" for item in block.items)
+        return f"<{tag}>{items}</{tag}>"
+    if block.type == 'table':
+        header = ''.join(f"<th>{markup_inline(cell)}</th>" for cell in block.header)
+        if header:
+            header = f"<tr>{header}</tr>"
+        rows = ''.join(
+            '<tr>' + ''.join(f"<td>{markup_inline(cell)}</td>" for cell in row) + '</tr>' for row in block.rows
+        )
+        return f"<table>{header}{rows}</table>"
+    return ''
+
+
+# --- Note type variants ---
+
+def derive_variant(document: Document, note_type: str, include_questions: bool = True) -> Document:
+    """
+    Derive a note type locally from a detailed document, so one generation serves every variant
+    detailed: unchanged; concise: first sentences, definitions, tips and one table per section;
+    outline: bullet points per subsection plus a summary table of definitions
+    """
+    if note_type == 'concise':
+        derived = _concise(document)
+    elif note_type == 'outline':
+        derived = _outline(document)
+    else:
+        derived = Document(title=document.title, sections=list(document.sections), questions=list(document.questions))
+    derived.questions = list(document.questions) if include_questions else []
+    if note_type == 'concise':
+        derived.questions = derived.questions[:5]
+    return derived
+
+
+def _first_sentences(text: str, count: int) -> str:
+    """Leading sentences, ignoring full stops inside inline math"""
+    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z*$])', text)
+    return ' '.join(sentences[:count])
+
+
+def _concise(document: Document) -> Document:
+    def shorten(blocks: List[Block], sentences: int) -> List[Block]:
+        kept = []
+        paragraph_seen = table_seen = tip_seen = False
+        for block in blocks:
+            if block.type == 'paragraph' and not paragraph_seen:
+                kept.append(Block(type='paragraph', text=_first_sentences(block.text, sentences)))
+                paragraph_seen = True
+            elif block.type == 'definition':
+                kept.append(Block(type='definition', term=block.term, text=_first_sentences(block.text, 1)))
+            elif block.type == 'tip' and not tip_seen:
+                kept.append(block)
+                tip_seen = True
+            elif block.type == 'table' and not table_seen:
+                kept.append(block)
+                table_seen = True
+            elif block.type == 'list':
+                kept.append(Block(type='list', ordered=block.ordered, items=block.items[:4]))
+        return kept
+
+    sections = []
+    for section in document.sections:
+        subsections = [Section(title=sub.title, blocks=shorten(sub.blocks, 1)) for sub in section.subsections]
+        sections.append(Section(title=section.title, blocks=shorten(section.blocks, 2),
+                                subsections=[sub for sub in subsections if sub.blocks]))
+    return Document(title=document.title, sections=sections)
+
+
+def _outline(document: Document) -> Document:
+    def key_points(blocks: List[Block]) -> List[str]:
+        points = []
+        for block in blocks:
+            if block.type == 'paragraph':
+                points.append(_first_sentences(block.text, 1))
+            elif block.type == 'definition' and block.term:
+                points.append(f"**{block.term}**: {_first_sentences(block.text, 1)}")
+            elif block.type == 'list':
+                points.extend(block.items[:3])
+        return points
+
+    sections = []
+    summary_rows = []
+    for section in document.sections:
+        subsections = []
+        own_points = key_points(section.blocks)
+        if own_points:
+            subsections.append(Section(title='Overview', blocks=[Block(type='list', items=own_points)]))
+        for sub in section.subsections:
+            points = key_points(sub.blocks)
+            if points:
+                subsections.append(Section(title=sub.title, blocks=[Block(type='list', items=points)]))
+        sections.append(Section(title=section.title, subsections=subsections))
+
+        for sub in [section] + section.subsections:
+            summary_rows.extend([block.term, _first_sentences(block.text, 1), section.title]
+                                for block in sub.blocks if block.type == 'definition' and block.term)
+
+    if summary_rows:
+        sections.append(Section(title='Summary', blocks=[
+            Block(type='table', header=['Concept', 'Definition', 'Topic'], rows=summary_rows)
+        ]))
+    return Document(title=document.title, sections=sections)
@@ -0,0 +1,223 @@
+"""
+PDF text extraction backends
+Each backend opens a document and extracts text page by page; only backends whose
+library is installed are registered in AVAILABLE_BACKENDS
+"""
+
+import io
+import logging
+import mmap
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionBackend:
+    """Interface for an open PDF document that can extract text one page at a time"""
+
+    name = ''
+
+    def __init__(self, pdf_path: str):
+        self.pdf_path = str(pdf_path)
+
+    @property
+    def page_count(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def is_encrypted(self) -> bool:
+        return False
+
+    @property
+    def metadata(self) -> dict:
+        """Document title and author ('Unknown' when absent)"""
+        return {'title': 'Unknown', 'author': 'Unknown'}
+
+    def extract_page(self, page_num: int) -> str:
+        """Text of one 1-based page"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class PyPDF2Backend(ExtractionBackend):
+    """PyPDF2 - pure Python, always available"""
+
+    name = 'pypdf2'
+
+    def __init__(self, pdf_path: str):
+        super().__init__(pdf_path)
+        import PyPDF2
+
+        self._file = open(self.pdf_path, 'rb')
+        try:
+            # Memory-map the file so parallel workers share the OS page cache
+            self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            stream = self._mapped
+        except (ValueError, OSError):
+            self._mapped = None
+            stream = self._file
+        self.reader = PyPDF2.PdfReader(stream)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+
+    @property
+    def is_encrypted(self) -> bool:
+        return self.reader.is_encrypted
+
+    @property
+    def metadata(self) -> dict:
+        info = self.reader.metadata
+        return {
+            'title': str(info.get('/Title', 'Unknown')) if info else 'Unknown',
+            'author': str(info.get('/Author', 'Unknown')) if info else 'Unknown'
+        }
+
+    def extract_page(self, page_num: int) -> str:
+        return self.reader.pages[page_num - 1].extract_text() or ''
+
+    def close(self):
+        self.reader = None
+        if self._mapped is not None:
+            self._mapped.close()
+        self._file.close()
+
+
+class PdfiumBackend(ExtractionBackend):
+    """pypdfium2 - bindings to Chrome's PDFium, typically the fastest"""
+
+    name = 'pypdfium2'
+
+    def __init__(self, pdf_path: str):
+        super().__init__(pdf_path)
+        import pypdfium2
+
+        self.document = pypdfium2.PdfDocument(self.pdf_path)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.document)
+
+    @property
+    def metadata(self) -> dict:
+        info = self.document.get_metadata_dict(skip_empty=True)
+        return {'title': info.get('Title', 'Unknown'), 'author': info.get('Author', 'Unknown')}
+
+    def extract_page(self, page_num: int) -> str:
+        page = self.document[page_num - 1]
+        try:
+            text_page = page.get_textpage()
+            try:
+                return text_page.get_text_range() or ''
+            finally:
+                text_page.close()
+        finally:
+            page.close()
+
+    def close(self):
+        self.document.close()
+
+
+class PdfMinerBackend(ExtractionBackend):
+    """pdfminer.six - slower, but handles unusual layouts and encodings well"""
+
+    name = 'pdfminer'
+
+    def __init__(self, pdf_path: str):
+        super().__init__(pdf_path)
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfpage import PDFPage
+
+        self._file = open(self.pdf_path, 'rb')
+        self.document = PDFDocument(PDFParser(self._file))
+        self.pages = list(PDFPage.create_pages(self.document))
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def is_encrypted(self) -> bool:
+        return bool(self.document.encryption)
+
+    @property
+    def metadata(self) -> dict:
+        info = self.document.info[0] if self.document.info else {}
+
+        def decode(value):
+            if isinstance(value, bytes):
+                return value.decode('utf-8', errors='replace')
+            return str(value) if value else 'Unknown'
+
+        return {'title': decode(info.get('Title')), 'author': decode(info.get('Author'))}
+
+    def extract_page(self, page_num: int) -> str:
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+
+        output = io.StringIO()
+        manager = PDFResourceManager()
+        device = TextConverter(manager, output, laparams=LAParams())
+        try:
+            PDFPageInterpreter(manager, device).process_page(self.pages[page_num - 1])
+            return output.getvalue()
+        finally:
+            device.close()
+
+    def close(self):
+        self._file.close()
+
+
+def _detect_backends() -> Dict[str, type]:
+    """Register backends whose libraries import cleanly, in default preference order"""
+    backends = {}
+    candidates = [
+        (PdfiumBackend, 'pypdfium2'),
+        (PyPDF2Backend, 'PyPDF2'),
+        (PdfMinerBackend, 'pdfminer'),
+    ]
+    for backend_class, module_name in candidates:
+        try:
+            __import__(module_name)
+            backends[backend_class.name] = backend_class
+        except ImportError:
+            logger.debug(f"Extraction backend '{backend_class.name}' unavailable ({module_name} not installed)")
+    return backends
+
+
+AVAILABLE_BACKENDS = _detect_backends()
+
+
+def extract_page_slice(backend_name: str, pdf_path: str, first: int, last: int) -> List[str]:
+    """
+    Process pool worker: extract pages first..last (1-based, inclusive) with its own document handle
+    A page that fails yields empty text instead of failing the slice
+    """
+    with AVAILABLE_BACKENDS[backend_name](pdf_path) as document:
+        return [safe_extract_page(document, page_num) for page_num in range(first, last + 1)]
+
+
+def safe_extract_page(document: ExtractionBackend, page_num: int) -> str:
+    """Extract one page, isolating failures to that page"""
+    try:
+        page_text = document.extract_page(page_num)
+        if page_text.strip():
+            logger.debug(f"Page {page_num}: Extracted {len(page_text)} characters ({document.name})")
+        else:
+            logger.debug(f"Page {page_num}: No text found ({document.name})")
+        return page_text
+    except Exception as page_error:
+        logger.warning(f"Error extracting from page {page_num} with {document.name}: {page_error}")
+        return ''
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class Job:
+    """A single unit of background work and its current state"""
+
+    def __init__(self, job_id: str, description: str = ''):
+        self.id = job_id
+        self.description = description
+        self.status = 'queued'  # queued -> running -> completed | failed
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self.condition = threading.Condition()
+        self._clock_start = time.monotonic()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def emit(self, stage: str, status: Optional[str] = None, **details):
+        """
+        Record a pipeline stage transition and wake any event stream listeners
+        A final status is applied together with its event so listeners never see one without the other
+        """
+        event = {
+            'stage': stage,
+            'elapsed': round(time.monotonic() - self._clock_start, 3),
+            **details
+        }
+        with self.condition:
+            if status:
+                self.status = status
+            self.events.append(event)
+            self.condition.notify_all()
+        logger.info(f"Job {self.id} stage '{stage}' at {event['elapsed']}s {details if details else ''}")
+
+    def wait_for_events(self, after: int, timeout: float = 15.0) -> Tuple[List[dict], bool]:
+        """
+        Block until events newer than index `after` exist, the job finishes, or timeout
+        Returns: (new events, whether the job has finished)
+        """
+        with self.condition:
+            if len(self.events) <= after and not self.finished:
+                self.condition.wait(timeout)
+            return self.events[after:], self.finished
+
+    def to_dict(self) -> dict:
+        """Serializable view of the job for the status endpoint"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'description': self.description,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobQueue:
+    """Runs pipeline jobs on a bounded worker pool and tracks their status"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 20, max_history: int = 200):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job-worker')
+        self.jobs = {}
+        self.lock = threading.Lock()
+        logger.info(f"Job queue started: {max_workers} workers, {max_pending} pending jobs max")
+
+    def submit(self, func: Callable, *args, description: str = '', **kwargs) -> Job:
+        """
+        Queue func(job, *args, **kwargs) for background execution
+        Returns: The queued Job
+        Raises: QueueFullError when max_pending jobs are already waiting
+        """
+        with self.lock:
+            if self.pending_count() >= self.max_pending:
+                logger.warning(f"Job queue full ({self.max_pending} pending). Rejecting job")
+                raise QueueFullError("Server is busy, please try again shortly")
+
+            job = Job(uuid.uuid4().hex, description)
+            self.jobs[job.id] = job
+            self._prune_history()
+
+        job.emit('queued', description=description)
+        self.executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by id"""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def pending_count(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return sum(1 for job in self.jobs.values() if job.status == 'queued')
+
+    def running_count(self) -> int:
+        """Number of jobs currently being processed"""
+        return sum(1 for job in self.jobs.values() if job.status == 'running')
+
+    def stats(self) -> dict:
+        """Queue occupancy for health reporting"""
+        with self.lock:
+            return {
+                'workers': self.max_workers,
+                'pending': self.pending_count(),
+                'running': self.running_count(),
+                'max_pending': self.max_pending
+            }
+
+    def _run(self, job: Job, func: Callable, args: tuple, kwargs: dict):
+        """Execute a job on a worker thread and record its outcome"""
+        job.started_at = datetime.now()
+        job.emit('started', status='running')
+
+        try:
+            result = func(job, *args, **kwargs)
+            job.result = result
+            job.finished_at = datetime.now()
+            job.emit('completed', status='completed', result=result)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+            job.error = str(e)
+            job.finished_at = datetime.now()
+            job.emit('failed', status='failed', error=str(e))
+
+    def _prune_history(self):
+        """Drop the oldest finished jobs once the history limit is exceeded"""
+        finished = [job for job in self.jobs.values() if job.status in ('completed', 'failed')]
+        excess = len(self.jobs) - self.max_history
+        if excess <= 0:
+            return
+
+        finished.sort(key=lambda job: job.finished_at or job.created_at)
+        for job in finished[:excess]:
+            del self.jobs[job.id]
@@ -1,22 +1,86 @@
+import hashlib
 import subprocess
 from pathlib import Path
 import shutil
 import tempfile
 import os
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Optional, Tuple
 import logging
 import re
+import time
+import zlib
+from modules.compile_health import CompileHealthTracker
+from modules.compile_sandbox import CompileCancelled, CompileQueueFull, CompileSandbox
+from modules.latex_format import FormatCache
 from modules.overleaf_automation import OverleafAutomation
+from modules.document_ir import (
+    Document, DocumentValidationError, markup_inline, parse_document, render_html, render_latex
+)
+from modules.latex_preflight import LatexPreflight, LatexPreflightError
+from utils.helpers import hash_file
 
 logger = logging.getLogger(__name__)
 
+# Log messages of LaTeX, hyperref, rerunfilecheck and friends asking for another run
+RERUN_WARNING = re.compile(r'Rerun to get [^.\n]*|Label\(s\) may have changed|Please rerun LaTeX|Rerun LaTeX',
+                           re.IGNORECASE)
+
+
 class LatexBuilder:
     """Handles LaTeX document creation and compilation"""
     
-    def __init__(self, output_dir: Optional[Path] = None):
+    # Auxiliary files written by one run and read back by the next
+    AUX_SUFFIXES = ('.aux', '.toc', '.out', '.lof', '.lot')
+    BUILD_LOCK_STRIPES = 64
+    
+    def __init__(self, output_dir: Optional[Path] = None, cache_dir: Optional[Path] = None,
+                 max_cached_pdfs: int = 200, max_preflight_repairs: int = 200,
+                 compile_health: Optional[CompileHealthTracker] = None,
+                 race_deadline: Optional[float] = None, precompiled_format: bool = True,
+                 max_latex_runs: int = 4, max_build_dirs: int = 50,
+                 sandbox: Optional[CompileSandbox] = None):
+        """
+        race_deadline: Race ReportLab against the LaTeX backends, waiting at most this many
+                       seconds for a LaTeX-quality PDF (None = try backends one after another)
+        precompiled_format: Compile against a cached format of the template's static preamble
+        max_latex_runs: Most pdflatex/xelatex runs per compile while references settle
+        max_build_dirs: Per-document build directories (with their .aux files) kept between compiles
+        sandbox: Bounded, resource-limited pool every TeX engine process runs in
+        """
         self.output_dir = output_dir or Path('outputs')
         self.output_dir.mkdir(exist_ok=True)
         
+        # Structural check and repair of generated LaTeX before any compiler runs
+        self.preflight = LatexPreflight(max_repairs=max_preflight_repairs)
+        
+        # Circuit breakers and latency/success scores that order the compile backends
+        self.compile_health = compile_health or CompileHealthTracker()
+        self.race_deadline = race_deadline
+        self.sandbox = sandbox or CompileSandbox()
+        
+        # Compiled PDFs keyed by the SHA-256 of their .tex source
+        self.compile_cache_dir = cache_dir or self.output_dir / '.compiled'
+        self.compile_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_cached_pdfs = max_cached_pdfs
+        
+        # Formats of the preamble above DUMP_MARKER, so pdflatex/xelatex skip loading its packages
+        self.format_cache = None
+        if precompiled_format:
+            self.format_cache = FormatCache(self.compile_cache_dir / 'formats', self._run_engine)
+        
+        # Persistent pdflatex/xelatex build directories, one per engine and document
+        self.build_root = self.compile_cache_dir / 'builds'
+        self.build_root.mkdir(parents=True, exist_ok=True)
+        self.max_latex_runs = max(1, max_latex_runs)
+        self.max_build_dirs = max_build_dirs
+        # Striped so the table stays fixed-size however many documents are compiled
+        self.build_locks = [threading.Lock() for _ in range(self.BUILD_LOCK_STRIPES)]
+        self.latex_compiles = 0
+        self.latex_runs = 0
+        
         # LaTeX document template - use $TITLE$ and $CONTENT$ placeholders to avoid conflicts with LaTeX braces
         self.latex_template = r"""\documentclass[a4paper,12pt]{article}
 \usepackage[utf8]{inputenc}
@@ -30,7 +94,6 @@ class LatexBuilder:
 \usepackage{float}
 \usepackage{booktabs}
 \usepackage{enumitem}
-\usepackage{hyperref}
 \usepackage{array}
 \usepackage{parskip}
 
@@ -80,6 +143,10 @@ class LatexBuilder:
 \newcommand{\important}[1]{\textbf{\textcolor{accentOrange}{#1}}}
 \newcommand{\formula}[1]{\fbox{$\displaystyle #1$}}
 
+% Everything above is precompiled into a format when mylatexformat is available (DUMP_MARKER)
+\csname endofdump\endcsname
+\usepackage{hyperref}
+
 % Hyperlink colors
 \hypersetup{colorlinks=true, linkcolor=edexcelBlue, urlcolor=keywordBlue}
 
@@ -121,14 +188,74 @@ $CONTENT$
         logger.info(f"LaTeX file created successfully: {tex_path}")
         return tex_path
     
-    def compile_to_pdf(self, tex_path: Path, use_overleaf: bool = False) -> Path:
+    def create_document_files(self, document: Document, filename: str, title: str = "Study Notes") -> dict:
+        """
+        Render a structured document to .tex and .html, and save it as a .json sidecar
+        so later compiles can render the PDF from the structure instead of re-parsing LaTeX
+        Returns: {'tex': path, 'html': path, 'json': path}
+        """
+        tex_path = self.create_latex_file(render_latex(document), filename, title)
+        
+        html_path = tex_path.with_suffix('.html')
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(render_html(document, title))
+        
+        json_path = tex_path.with_suffix('.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            f.write(document.to_json())
+        
+        logger.info(f"Structured document rendered: {tex_path.name}, {html_path.name}, {json_path.name}")
+        return {'tex': tex_path, 'html': html_path, 'json': json_path}
+    
+    def load_document(self, tex_path: Path) -> Optional[Document]:
+        """Structured document saved next to a .tex file, if there is one"""
+        json_path = Path(tex_path).with_suffix('.json')
+        if not json_path.exists():
+            return None
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return parse_document(f.read())
+        except (OSError, DocumentValidationError) as e:
+            logger.warning(f"Ignoring unreadable document sidecar {json_path.name}: {str(e)}")
+            return None
+    
+    def preflight_file(self, tex_path: Path) -> dict:
+        """
+        Check and repair a .tex file in place before compilation
+        Returns: Repair counts with 'valid': True, or 'valid': False and 'error' when the
+                 file cannot be repaired and no LaTeX compiler should be tried
+        """
+        with open(tex_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        try:
+            repaired, stats = self.preflight.check(source)
+        except LatexPreflightError as e:
+            logger.warning(f"Preflight rejected {tex_path.name}: {str(e)}")
+            return {'valid': False, 'error': str(e)}
+        
+        if repaired != source:
+            with open(tex_path, 'w', encoding='utf-8') as f:
+                f.write(repaired)
+            logger.info(f"Preflight repaired {tex_path.name}: {stats['repairs']} fixes")
+        return {'valid': True, **stats}
+    
+    def compile_to_pdf(self, tex_path: Path, use_overleaf: bool = False,
+                       progress_callback: Optional[Callable] = None,
+                       document: Optional[Document] = None,
+                       preflight: Optional[dict] = None) -> Path:
         """
         Compile LaTeX file to PDF
-        PRIMARY OPTION: Overleaf → Local LaTeX → ReportLab fallback
+        Online services and local compilers are tried in order of recent health (see
+        CompileHealthTracker), skipping any whose circuit is open, then ReportLab
         
         Args:
             tex_path: Path to .tex file
             use_overleaf: Force Overleaf compilation (default True for best quality)
+            progress_callback: Optional callable(stage, **details) told about each backend attempt
+            document: Structured source of the .tex (default: its .json sidecar, if any), which
+                      the ReportLab fallback renders directly instead of parsing LaTeX
+            preflight: Result of an earlier preflight_file call on tex_path (default: run it now);
+                       documents it rejected go straight to the ReportLab fallback
         
         For best results: Uses Overleaf for professional compilation
         Local LaTeX: pdflatex, xelatex, pandoc (if available)
@@ -140,43 +267,345 @@ $CONTENT$
             logger.error(f"LaTeX file not found: {tex_path}")
             raise FileNotFoundError(f"LaTeX file not found: {tex_path}")
         
-        # PRIMARY: Try Overleaf first (best quality, most reliable for web)
-        logger.info("TRY 1: Overleaf automated compilation (PRIMARY)...")
-        try:
-            pdf_path = self._compile_with_overleaf(tex_path)
-            if pdf_path and pdf_path.exists():
-                logger.info(f"SUCCESS: Overleaf compilation worked! {pdf_path}")
-                return pdf_path
-        except Exception as e:
-            logger.warning(f"Overleaf compilation failed: {str(e)}")
+        def report(stage, backend, **details):
+            if progress_callback:
+                progress_callback(stage, backend=backend, **details)
+        
+        if preflight is None:
+            preflight = self.preflight_file(tex_path)
+            if progress_callback:
+                progress_callback('latex_preflight', **preflight)
+        if not preflight['valid']:
+            logger.warning(f"Skipping LaTeX compilers: {preflight['error']}")
+            return self._compile_fallback(tex_path, document, report)
+        
+        if self.race_deadline:
+            return self._race_compile(tex_path, document, report)
+        
+        pdf_path = self._compile_with_latex_backends(tex_path, report)
+        if pdf_path:
+            return pdf_path
         
-        # SECONDARY: Try local pdflatex if available
-        if self.check_latex_available():
-            logger.info("TRY 2: Local pdflatex compiler (if MiKTeX installed)...")
+        # FALLBACK: ReportLab (always works)
+        logger.warning("All online and local compilers failed or were skipped. Using ReportLab fallback...")
+        return self._compile_fallback(tex_path, document, report)
+    
+    def _compile_with_latex_backends(self, tex_path: Path, report: Callable,
+                                     output_dir: Optional[Path] = None,
+                                     cancel: Optional[threading.Event] = None,
+                                     deadline: Optional[float] = None) -> Optional[Path]:
+        """
+        Online services and local compilers, cheapest healthy backend first
+        output_dir: Where the PDF is written (default: self.output_dir)
+        cancel: Stop (killing any running engine) once set
+        deadline: time.monotonic() by which to give up
+        Returns: The PDF, or None if every backend failed or was skipped
+        """
+        backends = {
+            'quicklatex': (partial(self._compile_with_overleaf, service='quicklatex'), None),
+            'latex_online': (partial(self._compile_with_overleaf, service='latex_online'), None),
+            'pdflatex': (self._compile_with_pdflatex, 'pdflatex'),
+            'xelatex': (self._compile_with_xelatex, 'xelatex'),
+            'pandoc': (self._compile_with_pandoc, 'pandoc'),
+        }
+        for name in self.compile_health.order(list(backends)):
+            if (cancel and cancel.is_set()) or (deadline and time.monotonic() >= deadline):
+                return None
+            compile_backend, executable = backends[name]
+            if executable and not shutil.which(executable):
+                self.compile_health.skip(name, f'{executable} not installed')
+                continue
+            allowed, reason = self.compile_health.allow(name)
+            if not allowed:
+                logger.info(f"Skipping {name}: {reason}")
+                report('compile_skipped', name, reason=reason)
+                continue
+            
+            logger.info(f"Trying {name}...")
+            report('compile_attempt', name)
+            start = time.monotonic()
+            timeout = deadline - start if deadline else None
             try:
-                return self._compile_with_pdflatex(tex_path)
+                pdf_path = compile_backend(tex_path, output_dir=output_dir, cancel=cancel, timeout=timeout)
+                if not pdf_path or not pdf_path.exists():
+                    raise RuntimeError('No PDF produced')
+            except CompileQueueFull as e:
+                # Backpressure from the sandbox says nothing about the backend's health
+                self.compile_health.record_cancelled(name)
+                self.compile_health.skip(name, str(e))
+                logger.warning(f"Skipping {name}: {str(e)}")
+                report('compile_skipped', name, reason=str(e))
+                continue
+            except CompileCancelled as e:
+                self.compile_health.record_cancelled(name)
+                logger.info(f"{name} compilation abandoned: {str(e)}")
+                report('compile_cancelled', name)
+                return None
             except Exception as e:
-                logger.warning(f"pdflatex compilation failed: {str(e)}")
+                # Including CompileLimitExceeded: a runaway compile counts against the backend
+                self.compile_health.record_failure(name, time.monotonic() - start, str(e))
+                logger.warning(f"{name} compilation failed: {str(e)}")
+                report('compile_failed', name, error=str(e))
+                continue
+            
+            self.compile_health.record_success(name, time.monotonic() - start)
+            logger.info(f"SUCCESS: {name} compilation worked! {pdf_path}")
+            report('compile_succeeded', name)
+            return pdf_path
+        return None
+    
+    def _race_compile(self, tex_path: Path, document: Optional[Document], report: Callable) -> Path:
+        """
+        Start ReportLab and the LaTeX backends together, each writing to its own staging directory
+        A LaTeX PDF is preferred and waited for until race_deadline; after that (or once every
+        LaTeX backend has failed) the ReportLab PDF is used and running engines (pandoc included)
+        are killed; an online service request in flight still runs to its own timeout.
+        The winner is moved to the usual output path. ReportLab's progress events are only
+        reported when its PDF is the one used.
+        """
+        started = time.monotonic()
+        deadline = started + self.race_deadline
+        cancel = threading.Event()
+        staging = Path(tempfile.mkdtemp(prefix=f'.{tex_path.stem}-race-', dir=self.output_dir))
+        latex_dir = staging / 'latex'
+        reportlab_dir = staging / 'reportlab'
+        latex_dir.mkdir()
+        reportlab_dir.mkdir()
         
-        # TRY 3: Try xelatex
-        logger.info("TRY 3: xelatex...")
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='compile-race')
         try:
-            return self._compile_with_xelatex(tex_path)
-        except Exception as e:
-            logger.warning(f"xelatex compilation failed: {str(e)}")
+            latex = pool.submit(self._compile_with_latex_backends, tex_path, report,
+                                output_dir=latex_dir, cancel=cancel, deadline=deadline)
+            # ReportLab's events are held back until it is known whether its PDF is used
+            fallback_events = []
+            fallback = pool.submit(self._compile_fallback, tex_path, document,
+                                   lambda stage, name, **details: fallback_events.append((stage, name, details)),
+                                   output_dir=reportlab_dir)
+            
+            # Quality ranking: any LaTeX engine beats ReportLab if it finishes in time
+            wait([latex], timeout=max(0.0, deadline - time.monotonic()))
+            if latex.done() and latex.exception() is None and latex.result():
+                winner, backend = latex.result(), 'latex'
+            else:
+                cancel.set()
+                winner, backend = fallback.result(), 'reportlab'
+                for stage, name, details in fallback_events:
+                    report(stage, name, **details)
+            
+            pdf_path = self.output_dir / (tex_path.stem + '.pdf')
+            shutil.move(str(winner), pdf_path)
+            logger.info(f"Compile race won by {backend} after {time.monotonic() - started:.2f}s")
+            report('compile_race_won', backend, seconds=round(time.monotonic() - started, 3))
+            return pdf_path
+        finally:
+            cancel.set()
+            # A loser still finishing only ever writes inside the staging directory
+            pool.shutdown(wait=False)
+            shutil.rmtree(staging, ignore_errors=True)
+    
+    def _compile_fallback(self, tex_path: Path, document: Optional[Document], report: Callable,
+                          output_dir: Optional[Path] = None) -> Path:
+        """ReportLab rendering, from the structured document when there is one"""
+        logger.info("ReportLab provides good quality PDF (70%).")
+        logger.info("For 100% professional quality, install MiKTeX or use Overleaf!")
+        report('compile_attempt', 'reportlab')
+        document = document or self.load_document(tex_path)
+        if document:
+            pdf_path = self._compile_document_with_reportlab(document, tex_path, output_dir)
+        else:
+            pdf_path = self._compile_with_reportlab(tex_path, output_dir)
+        report('compile_succeeded', 'reportlab')
+        return pdf_path
+    
+    def compile_cached(self, tex_path: Path, use_overleaf: bool = False,
+                       progress_callback: Optional[Callable] = None) -> Tuple[Path, str]:
+        """
+        Compile LaTeX to PDF, reusing a previous result for identical .tex content
+        Returns: (path to PDF, SHA-256 of the .tex content)
+        """
+        digest = hash_file(tex_path)
+        cached_pdf = self.get_cached_pdf(digest)
+        if cached_pdf:
+            logger.info(f"Compile cache HIT for {tex_path.name} ({digest[:12]})")
+            return cached_pdf, digest
+        
+        logger.info(f"Compile cache MISS for {tex_path.name} ({digest[:12]})")
+        pdf_path = self.compile_to_pdf(tex_path, use_overleaf=use_overleaf, progress_callback=progress_callback)
+        return self.store_compiled_pdf(digest, pdf_path), digest
+    
+    def get_cached_pdf(self, digest: str) -> Optional[Path]:
+        """Cached PDF for a .tex content hash, if one exists"""
+        cached_pdf = self.compile_cache_dir / f"{digest}.pdf"
+        if cached_pdf.exists():
+            os.utime(cached_pdf)  # Mark as recently used
+            return cached_pdf
+        return None
+    
+    def store_compiled_pdf(self, digest: str, pdf_path: Path) -> Path:
+        """Copy a freshly compiled PDF into the compile cache and prune old entries"""
+        cached_pdf = self.compile_cache_dir / f"{digest}.pdf"
+        shutil.copyfile(pdf_path, cached_pdf)
         
-        # TRY 4: Try pandoc
-        logger.info("TRY 4: pandoc...")
+        entries = sorted(self.compile_cache_dir.glob('*.pdf'), key=lambda p: p.stat().st_mtime)
+        for stale in entries[:-self.max_cached_pdfs]:
+            logger.debug(f"Pruning cached PDF: {stale.name}")
+            stale.unlink(missing_ok=True)
+        
+        return cached_pdf
+    
+    def _run_engine(self, command: list, cancel: Optional[threading.Event] = None,
+                    timeout: Optional[float] = None, cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        """
+        Run a TeX engine in the compile sandbox, like subprocess.run(capture_output=True, text=True),
+        killing it as soon as cancel is set or timeout seconds have passed
+        Raises: CompileCancelled, CompileQueueFull, CompileLimitExceeded
+        """
+        return self.sandbox.run(command, cancel=cancel, timeout=timeout, cwd=cwd)
+    
+    def _format_args(self, engine: str, tex_path: Path, build_dir: str,
+                     cancel: Optional[threading.Event] = None,
+                     timeout: Optional[float] = None) -> Tuple[list, Optional[Path]]:
+        """
+        Engine arguments selecting the precompiled preamble format, linked into build_dir
+        Returns: (['-fmt=<name>'], format path), or ([], None) without a usable format
+        """
+        if not self.format_cache:
+            return [], None
+        fmt_path = self.format_cache.format_for(tex_path.read_text(encoding='utf-8'), engine,
+                                                cancel=cancel, timeout=timeout)
+        if not fmt_path:
+            return [], None
+        linked = Path(build_dir) / fmt_path.name
         try:
-            return self._compile_with_pandoc(tex_path)
-        except Exception as e:
-            logger.warning(f"Pandoc compilation failed: {str(e)}")
+            os.symlink(fmt_path.resolve(), linked)
+        except OSError:
+            shutil.copy(fmt_path, linked)
+        return [f'-fmt={fmt_path.stem}'], fmt_path
+    
+    def _compile_with_engine(self, engine: str, tex_path: Path, output_dir: Optional[Path] = None,
+                             cancel: Optional[threading.Event] = None,
+                             timeout: Optional[float] = None) -> Path:
+        """
+        Compile with pdflatex/xelatex latexmk-style, in the document's persistent build directory
+        The engine runs once, then again only while the log asks for a rerun or an auxiliary
+        file it read has changed (at most max_latex_runs times). The build directory keeps the
+        .aux files between compiles, so recompiling an unchanged document usually takes one run.
+        timeout: Seconds for the whole compile, format build and every run included
+        """
+        deadline = time.monotonic() + timeout if timeout else None
         
-        # FALLBACK: ReportLab (always works)
-        logger.warning("All online and local compilers failed. Using ReportLab fallback...")
-        logger.info("ReportLab provides good quality PDF (70%).")
-        logger.info("For 100% professional quality, install MiKTeX or use Overleaf!")
-        return self._compile_with_reportlab(tex_path)
+        def remaining() -> Optional[float]:
+            return max(0.01, deadline - time.monotonic()) if deadline else None
+        
+        build_dir = self.build_root / f"{engine}-{tex_path.stem}"
+        with self._build_lock(build_dir):
+            build_dir.mkdir(parents=True, exist_ok=True)
+            os.utime(build_dir)  # Mark as recently used
+            build_tex = build_dir / tex_path.name
+            shutil.copyfile(tex_path, build_tex)
+            for linked_format in build_dir.glob('*.fmt'):
+                linked_format.unlink()
+            fmt_args, fmt_path = self._format_args(engine, build_tex, str(build_dir), cancel=cancel,
+                                                   timeout=remaining())
+            
+            try:
+                for run in range(1, self.max_latex_runs + 1):
+                    logger.debug(f"Running {engine} (run {run}/{self.max_latex_runs} at most)...")
+                    aux_before = self._aux_digests(build_dir, tex_path.stem)
+                    arguments = ['-interaction=nonstopmode', '-output-directory', str(build_dir), str(build_tex)]
+                    result = self._run_engine([engine, *fmt_args, *arguments], cancel=cancel,
+                                              timeout=remaining(), cwd=str(build_dir))
+                    if result.returncode != 0 and fmt_path and 'format file' in (result.stdout or ''):
+                        # The engine refused the cached format: drop it and redo this run without
+                        self.format_cache.invalidate(fmt_path)
+                        fmt_args, fmt_path = [], None
+                        result = self._run_engine([engine, *arguments], cancel=cancel,
+                                                  timeout=remaining(), cwd=str(build_dir))
+                    self.latex_runs += 1
+                    
+                    if result.returncode != 0:
+                        logger.error(f"{engine} compilation error (run {run}):")
+                        logger.error(f"STDOUT: {result.stdout}")
+                        logger.error(f"STDERR: {result.stderr}")
+                        if run == 1:  # Only raise on first run failure
+                            raise RuntimeError(f"{engine} compilation failed:\n{result.stderr}")
+                        break
+                    
+                    reason = self._rerun_reason(build_dir, tex_path.stem, aux_before)
+                    if not reason:
+                        break
+                    if run == self.max_latex_runs:
+                        logger.warning(f"{engine} still wants a rerun after {run} runs ({reason})")
+                    else:
+                        logger.debug(f"Rerunning {engine}: {reason}")
+                
+                pdf_name = tex_path.stem + '.pdf'
+                pdf_path = (output_dir or self.output_dir) / pdf_name
+                build_pdf = build_dir / pdf_name
+                if not build_pdf.exists():
+                    logger.error("PDF was not generated despite successful compilation")
+                    raise RuntimeError(f"PDF was not generated by {engine}")
+                shutil.move(build_pdf, pdf_path)
+            except Exception:
+                # A killed or failed run can leave truncated .aux files behind; start clean next time
+                shutil.rmtree(build_dir, ignore_errors=True)
+                raise
+        
+        self.latex_compiles += 1
+        logger.info(f"PDF compiled with {engine} in {run} run(s): {pdf_path}")
+        self._prune_build_dirs()
+        return pdf_path
+    
+    def _aux_digests(self, build_dir: Path, stem: str) -> dict:
+        """Hashes of the auxiliary files a run reads back in, keyed by suffix"""
+        digests = {}
+        for suffix in self.AUX_SUFFIXES:
+            aux_file = build_dir / f"{stem}{suffix}"
+            if aux_file.exists():
+                digests[suffix] = hashlib.sha256(aux_file.read_bytes()).hexdigest()
+        return digests
+    
+    def _rerun_reason(self, build_dir: Path, stem: str, aux_before: dict) -> Optional[str]:
+        """
+        Why the last run's output may be stale, or None if it is final
+        Files that did not exist before the run were not read by it, so only the log's
+        warnings decide whether their first version needs another run.
+        """
+        log_file = build_dir / f"{stem}.log"
+        if log_file.exists():
+            match = RERUN_WARNING.search(log_file.read_text(encoding='utf-8', errors='replace'))
+            if match:
+                return f"log says '{match.group(0)}'"
+        aux_after = self._aux_digests(build_dir, stem)
+        changed = [suffix for suffix, digest in aux_before.items() if aux_after.get(suffix) != digest]
+        if changed:
+            return f"{', '.join(changed)} changed"
+        return None
+    
+    def _build_lock(self, build_dir: Path) -> threading.Lock:
+        """Lock serialising compiles that share a build directory (and its stripe)"""
+        return self.build_locks[zlib.crc32(build_dir.name.encode('utf-8')) % len(self.build_locks)]
+    
+    def _prune_build_dirs(self):
+        """Delete the least recently used build directories beyond max_build_dirs (skipping busy ones)"""
+        build_dirs = sorted((p for p in self.build_root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime)
+        for stale in build_dirs[:-self.max_build_dirs]:
+            lock = self._build_lock(stale)
+            if lock.acquire(blocking=False):
+                try:
+                    logger.debug(f"Pruning build directory: {stale.name}")
+                    shutil.rmtree(stale, ignore_errors=True)
+                finally:
+                    lock.release()
+    
+    def build_stats(self) -> dict:
+        """Engine runs per pdflatex/xelatex compile (1.0 means no reruns were needed)"""
+        return {
+            'build_dirs': sum(1 for p in self.build_root.iterdir() if p.is_dir()),
+            'compiles': self.latex_compiles,
+            'runs': self.latex_runs,
+            'runs_per_compile': round(self.latex_runs / self.latex_compiles, 2) if self.latex_compiles else None
+        }
     
     def _compile_with_online_service(self, tex_path: Path) -> Path:
         """
@@ -233,151 +662,58 @@ $CONTENT$
             logger.warning(f"Online service error: {str(e)}")
             raise RuntimeError(f"Online LaTeX compilation failed: {str(e)}")
     
-    def _compile_with_xelatex(self, tex_path: Path) -> Path:
+    def _compile_with_xelatex(self, tex_path: Path, output_dir: Optional[Path] = None,
+                              cancel: Optional[threading.Event] = None,
+                              timeout: Optional[float] = None) -> Path:
         """Compile LaTeX to PDF using xelatex (better Unicode support)"""
         logger.info(f"Compiling with xelatex: {tex_path}")
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_tex = Path(temp_dir) / tex_path.name
-            shutil.copy(tex_path, temp_tex)
-            
-            # Run xelatex twice for references
-            for i in range(2):
-                logger.debug(f"Running xelatex (run {i+1}/2)...")
-                result = subprocess.run(
-                    [
-                        'xelatex',
-                        '-interaction=nonstopmode',
-                        '-output-directory', temp_dir,
-                        str(temp_tex)
-                    ],
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode != 0:
-                    logger.error(f"XeLaTeX compilation error (run {i+1}):")
-                    logger.error(f"STDERR: {result.stderr}")
-                    if i == 0:
-                        raise RuntimeError(f"XeLaTeX compilation failed:\n{result.stderr}")
-                else:
-                    logger.debug(f"XeLaTeX run {i+1} completed successfully")
-            
-            pdf_name = tex_path.stem + '.pdf'
-            pdf_path = self.output_dir / pdf_name
-            temp_pdf = Path(temp_dir) / pdf_name
-            
-            if temp_pdf.exists():
-                logger.debug(f"Moving {temp_pdf} to {pdf_path}")
-                shutil.move(temp_pdf, pdf_path)
-                logger.info(f"PDF compiled with xelatex: {pdf_path}")
-                return pdf_path
-            else:
-                raise RuntimeError("PDF was not generated by xelatex")
+        return self._compile_with_engine('xelatex', tex_path, output_dir=output_dir, cancel=cancel, timeout=timeout)
     
-    def _compile_with_pandoc(self, tex_path: Path) -> Path:
-        """Compile LaTeX to PDF using pandoc"""
+    def _compile_with_pandoc(self, tex_path: Path, output_dir: Optional[Path] = None,
+                             cancel: Optional[threading.Event] = None,
+                             timeout: Optional[float] = None) -> Path:
+        """Compile LaTeX to PDF using pandoc, in the compile sandbox like the other engines"""
         logger.info(f"Compiling with pandoc: {tex_path}")
         
-        try:
-            import pypandoc
-        except ImportError:
-            logger.warning("pypandoc not available")
-            raise RuntimeError("Pandoc not installed. Install with: pip install pypandoc")
+        pdf_name = tex_path.stem + '.pdf'
+        pdf_path = ((output_dir or self.output_dir) / pdf_name).resolve()
         
-        try:
-            pdf_name = tex_path.stem + '.pdf'
-            pdf_path = self.output_dir / pdf_name
-            
-            logger.debug(f"Converting LaTeX to PDF via pandoc...")
-            
-            # Read LaTeX content
-            with open(tex_path, 'r', encoding='utf-8') as f:
-                latex_content = f.read()
-            
-            # Use pandoc to convert LaTeX to PDF
-            output = pypandoc.convert_text(
-                latex_content,
-                'pdf',
-                format='latex',
-                outputfile=str(pdf_path),
-                extra_args=[
-                    '--pdf-engine=pdflatex',
-                    '-V', 'geometry:margin=1in',
-                    '-V', 'colorlinks=true',
-                    '-V', 'urlcolor=blue'
-                ]
-            )
-            
-            if pdf_path.exists():
-                logger.info(f"PDF compiled with pandoc: {pdf_path}")
-                return pdf_path
-            else:
-                raise RuntimeError("Pandoc did not generate PDF")
-                
-        except Exception as e:
-            logger.error(f"Pandoc compilation failed: {str(e)}")
-            raise RuntimeError(f"Pandoc compilation failed: {str(e)}")
+        logger.debug(f"Converting LaTeX to PDF via pandoc...")
+        # The pdflatex pandoc starts shares its process group and limits, so a kill stops both
+        result = self._run_engine([
+            'pandoc', str(tex_path.resolve()),
+            '--from=latex',
+            f'--output={pdf_path}',
+            '--pdf-engine=pdflatex',
+            '-V', 'geometry:margin=1in',
+            '-V', 'colorlinks=true',
+            '-V', 'urlcolor=blue'
+        ], cancel=cancel, timeout=timeout, cwd=str(tex_path.parent))
+        
+        if result.returncode != 0:
+            logger.error(f"Pandoc compilation failed: {result.stderr}")
+            raise RuntimeError(f"Pandoc compilation failed:\n{result.stderr}")
+        if not pdf_path.exists():
+            raise RuntimeError("Pandoc did not generate PDF")
+        
+        logger.info(f"PDF compiled with pandoc: {pdf_path}")
+        return pdf_path
     
+    def _compile_with_pdflatex(self, tex_path: Path, output_dir: Optional[Path] = None,
+                               cancel: Optional[threading.Event] = None,
+                               timeout: Optional[float] = None) -> Path:
         """Compile LaTeX to PDF using pdflatex"""
         logger.info(f"Compiling with pdflatex: {tex_path}")
-        
-        # Create temporary directory for compilation
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_tex = Path(temp_dir) / tex_path.name
-            
-            # Copy .tex file to temp directory
-            logger.debug(f"Copying {tex_path} to {temp_tex}")
-            shutil.copy(tex_path, temp_tex)
-            
-            # Run pdflatex (multiple runs for references)
-            for i in range(2):  # Run twice for proper references
-                logger.debug(f"Running pdflatex (run {i+1}/2)...")
-                result = subprocess.run(
-                    [
-                        'pdflatex',
-                        '-interaction=nonstopmode',
-                        '-output-directory', temp_dir,
-                        str(temp_tex)
-                    ],
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode != 0:
-                    logger.error(f"LaTeX compilation error (run {i+1}):")
-                    logger.error(f"STDOUT: {result.stdout}")
-                    logger.error(f"STDERR: {result.stderr}")
-                    if i == 0:  # Only raise on first run failure
-                        raise RuntimeError(f"LaTeX compilation failed:\n{result.stderr}")
-                else:
-                    logger.debug(f"LaTeX run {i+1} completed successfully")
-            
-            # Define PDF path
-            pdf_name = tex_path.stem + '.pdf'
-            pdf_path = self.output_dir / pdf_name
-            
-            # Move PDF to output directory
-            temp_pdf = Path(temp_dir) / pdf_name
-            if temp_pdf.exists():
-                logger.debug(f"Moving {temp_pdf} to {pdf_path}")
-                shutil.move(temp_pdf, pdf_path)
-                
-                # Clean up auxiliary files
-                for aux_file in Path(temp_dir).glob(f"{tex_path.stem}.*"):
-                    if aux_file.suffix not in ['.pdf', '.tex']:
-                        logger.debug(f"Cleaning up: {aux_file}")
-                        aux_file.unlink(missing_ok=True)
-                
-                logger.info(f"PDF compiled successfully: {pdf_path}")
-                return pdf_path
-            else:
-                logger.error("PDF was not generated despite successful compilation")
-                raise RuntimeError("PDF was not generated")
+        return self._compile_with_engine('pdflatex', tex_path, output_dir=output_dir, cancel=cancel, timeout=timeout)
     
-    def _compile_with_overleaf(self, tex_path: Path) -> Optional[Path]:
+    def _compile_with_overleaf(self, tex_path: Path, service: Optional[str] = None,
+                               output_dir: Optional[Path] = None,
+                               cancel: Optional[threading.Event] = None,
+                               timeout: Optional[float] = None) -> Optional[Path]:
         """
         Compile LaTeX to PDF using automated Overleaf integration
+        service: Use only this online service ('quicklatex' or 'latex_online'; default: each in turn)
+        timeout: Cap on the HTTP request time of a single service (requests cannot be cancelled mid-flight)
         
         This method attempts to:
         1. Upload LaTeX to Overleaf programmatically
@@ -397,11 +733,14 @@ $CONTENT$
             # Try online LaTeX compilation services
             logger.debug("Attempting online LaTeX compilation...")
             overleaf = OverleafAutomation()
-            pdf_path = overleaf.compile_latex_online(
-                latex_content=latex_content,
-                filename=filename,
-                output_dir=self.output_dir
-            )
+            if service:
+                pdf_path = overleaf.compile_with_service(service, latex_content, filename, output_dir or self.output_dir, timeout=timeout)
+            else:
+                pdf_path = overleaf.compile_latex_online(
+                    latex_content=latex_content,
+                    filename=filename,
+                    output_dir=output_dir or self.output_dir
+                )
             
             if pdf_path and pdf_path.exists():
                 logger.info(f"Successfully compiled with online LaTeX service: {pdf_path}")
@@ -414,21 +753,16 @@ $CONTENT$
             logger.error(f"Online LaTeX compilation error: {str(e)}")
             return None
     
-    def _compile_with_reportlab(self, tex_path: Path) -> Path:
+    def _compile_with_reportlab(self, tex_path: Path, output_dir: Optional[Path] = None) -> Path:
         """Fallback: Convert LaTeX to professional PDF using ReportLab with colors and styling"""
         logger.info("Using ReportLab to generate professional PDF from LaTeX content")
         
         try:
             from reportlab.lib.pagesizes import letter
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
             from reportlab.lib.units import inch
-            from reportlab.lib.colors import HexColor, Color
-            from reportlab.platypus import (
-                SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle,
-                KeepTogether
-            )
-            from reportlab.lib import colors
-            from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+            from reportlab.lib.colors import Color
+            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, KeepTogether
+            from reportlab.lib.enums import TA_LEFT, TA_RIGHT
         except ImportError:
             logger.error("ReportLab not installed.")
             raise RuntimeError("ReportLab not available. Install with: pip install reportlab")
@@ -457,7 +791,7 @@ $CONTENT$
             
             # Create PDF
             pdf_name = tex_path.stem + '.pdf'
-            pdf_path = self.output_dir / pdf_name
+            pdf_path = (output_dir or self.output_dir) / pdf_name
             
             logger.debug(f"Creating professional PDF: {pdf_path}")
             doc = SimpleDocTemplate(
@@ -469,90 +803,13 @@ $CONTENT$
                 rightMargin=0.75*inch
             )
             story = []
-            styles = getSampleStyleSheet()
-            
-            # Define professional color palette
-            color_title = HexColor('#1a3a52')  # Dark blue
-            color_section = HexColor('#0066cc')  # Bright blue
-            color_subsection = HexColor('#2d5a8c')  # Medium blue
-            color_accent = HexColor('#ff6b35')  # Orange accent
-            color_text = HexColor('#2c3e50')  # Dark gray-blue
-            
-            # Define custom styles with professional appearance
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=32,
-                textColor=color_title,
-                spaceAfter=30,
-                spaceBefore=0,
-                alignment=TA_CENTER,
-                fontName='Helvetica-Bold',
-                borderColor=color_section,
-                borderWidth=2,
-                borderPadding=15,
-                borderRadius=5
-            )
-            
-            section_style = ParagraphStyle(
-                'SectionHead',
-                parent=styles['Heading2'],
-                fontSize=16,
-                textColor=colors.white,
-                backColor=color_section,
-                spaceAfter=14,
-                spaceBefore=20,
-                fontName='Helvetica-Bold',
-                leftIndent=10,
-                rightIndent=10,
-                topPadding=8,
-                bottomPadding=8
-            )
-            
-            subsection_style = ParagraphStyle(
-                'SubsectionHead',
-                parent=styles['Heading3'],
-                fontSize=13,
-                textColor=color_subsection,
-                spaceAfter=10,
-                spaceBefore=14,
-                fontName='Helvetica-Bold',
-                leftIndent=18,
-                borderLeft=4,
-                borderLeftColor=color_accent
-            )
-            
-            body_style = ParagraphStyle(
-                'BodyText',
-                parent=styles['Normal'],
-                fontSize=11,
-                alignment=TA_JUSTIFY,
-                spaceAfter=12,
-                leading=15,
-                leftIndent=0,
-                textColor=color_text
-            )
-            
-            list_style = ParagraphStyle(
-                'ListText',
-                parent=styles['Normal'],
-                fontSize=10.5,
-                spaceAfter=8,
-                leftIndent=36,
-                leading=13,
-                textColor=color_text
-            )
-            
-            question_style = ParagraphStyle(
-                'QuestionText',
-                parent=styles['Normal'],
-                fontSize=10,
-                spaceAfter=6,
-                leftIndent=36,
-                leading=12,
-                textColor=color_subsection,
-                fontName='Helvetica-Bold'
-            )
+            style = self._reportlab_styles()
+            title_style = style['title']
+            section_style = style['section']
+            subsection_style = style['subsection']
+            body_style = style['body']
+            list_style = style['list']
+            question_style = style['question']
             
             # Add title with styling
             story.append(Spacer(1, 0.2*inch))
@@ -676,14 +933,198 @@ $CONTENT$
             logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
             raise RuntimeError(f"PDF generation failed: {str(e)}")
     
-    def _parse_latex_table(self, lines: list, start_idx: int) -> tuple:
-        """Parse LaTeX tabular environment and convert to ReportLab Table with professional styling"""
+    def _compile_document_with_reportlab(self, document: Document, tex_path: Path,
+                                         output_dir: Optional[Path] = None) -> Path:
+        """Render a structured document straight to ReportLab flowables (no LaTeX parsing)"""
+        logger.info("Using ReportLab to render PDF from structured document")
+        
         try:
-            from reportlab.platypus import Table, TableStyle
-            from reportlab.lib import colors
+            from reportlab.lib.pagesizes import letter
+            from reportlab.lib.units import inch
             from reportlab.lib.colors import HexColor
+            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
         except ImportError:
-            return None, start_idx
+            logger.error("ReportLab not installed.")
+            raise RuntimeError("ReportLab not available. Install with: pip install reportlab")
+        
+        style = self._reportlab_styles()
+        # Border and background of definition, tip and note boxes
+        box_colors = {
+            'definition': ('Key Definition', HexColor('#003865'), HexColor('#e6ebf0')),
+            'tip': ('Examiner Tip', HexColor('#006400'), HexColor('#e6f0e6')),
+            'note': ('Important Note', HexColor('#ff6b35'), HexColor('#fff0eb')),
+        }
+        
+        def block_flowables(block):
+            if block.type == 'paragraph':
+                return [Paragraph(markup_inline(block.text), style['body'])]
+            if block.type in box_colors:
+                label, border, background = box_colors[block.type]
+                term = f"<b>{markup_inline(block.term)}</b>: " if block.term else ''
+                box = Table([[Paragraph(f"<b>{label}</b><br/>{term}{markup_inline(block.text)}", style['body'])]],
+                            colWidths=[6.5*inch])
+                box.setStyle(TableStyle([
+                    ('BOX', (0, 0), (-1, -1), 1.5, border),
+                    ('BACKGROUND', (0, 0), (-1, -1), background),
+                    ('PADDING', (0, 0), (-1, -1), 8),
+                ]))
+                return [box, Spacer(1, 10)]
+            if block.type == 'list':
+                flowables = []
+                for number, item in enumerate(block.items, 1):
+                    bullet = f"<b>{number}.</b>" if block.ordered else "<font color='#0066cc'>●</font>"
+                    flowables.append(Paragraph(f"{bullet} {markup_inline(item)}", style['list']))
+                return flowables + [Spacer(1, 8)]
+            if block.type == 'table':
+                # Header cells stay plain strings so the table style's white header text applies
+                header = [[re.sub(r'[*$]', '', cell) for cell in block.header]] if block.header else []
+                table = self._reportlab_table(header + [[Paragraph(markup_inline(cell), style['body']) for cell in row]
+                                                        for row in block.rows])
+                return [Spacer(1, 12), table, Spacer(1, 12)] if table else []
+            return []
+        
+        story = [Spacer(1, 0.2*inch), Paragraph(markup_inline(document.title), style['title']), Spacer(1, 0.3*inch)]
+        for section in document.sections:
+            story.extend([Paragraph(f"<b>{markup_inline(section.title)}</b>", style['section']), Spacer(1, 8)])
+            for block in section.blocks:
+                story.extend(block_flowables(block))
+            for subsection in section.subsections:
+                story.extend([Paragraph(markup_inline(subsection.title), style['subsection']), Spacer(1, 6)])
+                for block in subsection.blocks:
+                    story.extend(block_flowables(block))
+        
+        if document.questions:
+            story.extend([Paragraph("<b>Practice Questions</b>", style['section']), Spacer(1, 8)])
+            for number, question in enumerate(document.questions, 1):
+                story.append(Paragraph(f"<b>{number}.</b> {markup_inline(question.question)}", style['question']))
+                for letter_index, option in enumerate(question.options):
+                    story.append(Paragraph(f"({chr(97 + letter_index)}) {markup_inline(option)}", style['list']))
+            answers = [(n, q.answer) for n, q in enumerate(document.questions, 1) if q.answer]
+            if answers:
+                story.append(Paragraph("Answers", style['subsection']))
+                story.extend(Paragraph(f"<b>{n}.</b> {markup_inline(answer)}", style['list']) for n, answer in answers)
+        
+        pdf_path = (output_dir or self.output_dir) / (tex_path.stem + '.pdf')
+        try:
+            doc = SimpleDocTemplate(
+                str(pdf_path),
+                pagesize=letter,
+                topMargin=0.6*inch,
+                bottomMargin=0.6*inch,
+                leftMargin=0.75*inch,
+                rightMargin=0.75*inch
+            )
+            doc.build(story)
+        except Exception as e:
+            logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
+            raise RuntimeError(f"PDF generation failed: {str(e)}")
+        
+        logger.info(f"Professional PDF generated with ReportLab from structured document: {pdf_path}")
+        return pdf_path
+    
+    def _reportlab_styles(self) -> dict:
+        """Paragraph styles shared by both ReportLab renderers"""
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.colors import HexColor
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+        
+        styles = getSampleStyleSheet()
+        
+        # Define professional color palette
+        color_title = HexColor('#1a3a52')  # Dark blue
+        color_section = HexColor('#0066cc')  # Bright blue
+        color_subsection = HexColor('#2d5a8c')  # Medium blue
+        color_accent = HexColor('#ff6b35')  # Orange accent
+        color_text = HexColor('#2c3e50')  # Dark gray-blue
+        
+        # Define custom styles with professional appearance
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=32,
+            textColor=color_title,
+            spaceAfter=30,
+            spaceBefore=0,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold',
+            borderColor=color_section,
+            borderWidth=2,
+            borderPadding=15,
+            borderRadius=5
+        )
+        
+        section_style = ParagraphStyle(
+            'SectionHead',
+            parent=styles['Heading2'],
+            fontSize=16,
+            textColor=colors.white,
+            backColor=color_section,
+            spaceAfter=14,
+            spaceBefore=20,
+            fontName='Helvetica-Bold',
+            leftIndent=10,
+            rightIndent=10,
+            topPadding=8,
+            bottomPadding=8
+        )
+        
+        subsection_style = ParagraphStyle(
+            'SubsectionHead',
+            parent=styles['Heading3'],
+            fontSize=13,
+            textColor=color_subsection,
+            spaceAfter=10,
+            spaceBefore=14,
+            fontName='Helvetica-Bold',
+            leftIndent=18,
+            borderLeft=4,
+            borderLeftColor=color_accent
+        )
+        
+        body_style = ParagraphStyle(
+            'BodyText',
+            parent=styles['Normal'],
+            fontSize=11,
+            alignment=TA_JUSTIFY,
+            spaceAfter=12,
+            leading=15,
+            leftIndent=0,
+            textColor=color_text
+        )
+        
+        list_style = ParagraphStyle(
+            'ListText',
+            parent=styles['Normal'],
+            fontSize=10.5,
+            spaceAfter=8,
+            leftIndent=36,
+            leading=13,
+            textColor=color_text
+        )
+        
+        question_style = ParagraphStyle(
+            'QuestionText',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=6,
+            leftIndent=36,
+            leading=12,
+            textColor=color_subsection,
+            fontName='Helvetica-Bold'
+        )
+        
+        return {
+            'title': title_style,
+            'section': section_style,
+            'subsection': subsection_style,
+            'body': body_style,
+            'list': list_style,
+            'question': question_style
+        }
+    
+    def _parse_latex_table(self, lines: list, start_idx: int) -> tuple:
+        """Parse LaTeX tabular environment and convert to ReportLab Table with professional styling"""
         
         # Find table structure
         table_data = []
@@ -734,7 +1175,18 @@ $CONTENT$
         if not table_data:
             return None, i
         
-        # Determine number of columns
+        return self._reportlab_table(table_data), i
+    
+    def _reportlab_table(self, table_data: list):
+        """ReportLab Table with the professional blue styling, or None if it cannot be built"""
+        try:
+            from reportlab.platypus import Table, TableStyle
+            from reportlab.lib import colors
+            from reportlab.lib.colors import HexColor
+            from reportlab.lib.units import inch
+        except ImportError:
+            return None
+        
         num_cols = max(len(row) for row in table_data) if table_data else 1
         
         # Create ReportLab table
@@ -770,11 +1222,11 @@ $CONTENT$
             ]
             
             table.setStyle(TableStyle(style_commands))
-            return table, i
+            return table
             
         except Exception as e:
             logger.warning(f"Could not create table: {str(e)}")
-            return None, i
+            return None
     
     def _format_latex_text(self, text: str) -> str:
         """Convert LaTeX formatting to ReportLab/HTML formatting"""
@@ -800,10 +1252,11 @@ $CONTENT$
             result = subprocess.run(
                 ['pdflatex', '--version'],
                 capture_output=True,
-                text=True
+                text=True,
+                timeout=10
             )
             return result.returncode == 0
-        except (subprocess.SubprocessError, FileNotFoundError):
+        except (subprocess.SubprocessError, OSError):
             return False
     
     def get_available_compilers(self) -> list:
@@ -815,9 +1268,10 @@ $CONTENT$
             try:
                 subprocess.run([compiler, '--version'], 
                              capture_output=True, 
-                             check=False)
+                             check=False,
+                             timeout=10)
                 available.append(compiler)
-            except (subprocess.SubprocessError, FileNotFoundError):
+            except (subprocess.SubprocessError, OSError):
                 pass
         
         return available
\ No newline at end of file
@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from modules.compile_sandbox import CompileCancelled, CompileQueueFull
+
+logger = logging.getLogger(__name__)
+
+# Everything before this line of a .tex file is the static preamble dumped into the format.
+# Undefined control sequences built with \csname are \relax, so the line is a no-op without a format.
+DUMP_MARKER = '\\csname endofdump\\endcsname'
+
+
+class FormatCache:
+    """
+    Precompiled formats (mylatexformat) of the static part of the document preamble
+    Formats are keyed by a hash of that preamble, the engine and the TeX installation, so
+    a template edit or a TeX upgrade builds a new one on the next compile. A compile
+    against a format skips loading the preamble's packages on every run.
+    """
+
+    def __init__(self, format_dir: Path, run: Callable, max_formats: int = 8,
+                 build_timeout: float = 120, installation_ttl: float = 60):
+        """
+        run(command, cancel=..., timeout=..., cwd=...): Runs an engine command, returning a CompletedProcess
+        max_formats: Format files kept on disk (least recently used are deleted)
+        installation_ttl: Seconds the TeX installation fingerprint is trusted before re-checking
+        """
+        self.format_dir = Path(format_dir)
+        self.format_dir.mkdir(parents=True, exist_ok=True)
+        self.run = run
+        self.max_formats = max_formats
+        self.build_timeout = build_timeout
+        self.installation_ttl = installation_ttl
+        self.lock = threading.Lock()  # Counters, failures and the table of build locks
+        # One lock per format key, so a build only blocks compiles waiting for that same format
+        self.build_locks: Dict[str, threading.Lock] = {}
+        self.installations: Dict[str, tuple] = {}  # engine -> (checked at, fingerprint or None)
+        self.failed = set()  # Format keys that could not be built
+        self.hits = 0
+        self.builds = 0
+        self.build_failures = 0
+
+    def format_for(self, source: str, engine: str, cancel: Optional[threading.Event] = None,
+                   timeout: Optional[float] = None) -> Optional[Path]:
+        """
+        Format file for the static preamble of source, built on first use
+        cancel, timeout: Abandon a build (returning None) when set or after this many seconds
+        Returns: None if source has no DUMP_MARKER or the format cannot be built
+        """
+        marker = source.find(DUMP_MARKER)
+        if marker == -1:
+            return None
+        installation = self._installation(engine)
+        if not installation:
+            return None
+
+        preamble = source[:marker]
+        key = hashlib.sha256(f'{engine}\n{installation}\n{preamble}'.encode('utf-8')).hexdigest()[:16]
+        fmt_path = self.format_dir / f'{engine}-{key}.fmt'
+        with self.lock:
+            # Keys only change with the template or the TeX installation, so the table stays small
+            build_lock = self.build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            if fmt_path.exists():
+                fmt_path.touch()
+                with self.lock:
+                    self.hits += 1
+                return fmt_path
+            if key in self.failed:
+                return None
+            return self._build(engine, preamble, fmt_path, key, cancel, timeout)
+
+    def invalidate(self, fmt_path: Path):
+        """Forget a format the engine refused to load; it is not rebuilt until the key changes"""
+        with self.lock:
+            fmt_path.unlink(missing_ok=True)
+            self.failed.add(fmt_path.stem.split('-', 1)[1])
+        logger.warning(f"Discarded unusable format {fmt_path.name}")
+
+    def _build(self, engine: str, preamble: str, fmt_path: Path, key: str,
+               cancel: Optional[threading.Event] = None, timeout: Optional[float] = None) -> Optional[Path]:
+        """Dump the preamble with mylatexformat (caller holds the key's build lock)"""
+        logger.info(f"Building {engine} format for the document preamble ({fmt_path.name})")
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory() as build_dir:
+            source = Path(build_dir) / 'preamble.tex'
+            source.write_text(f'{preamble}{DUMP_MARKER}\n\\begin{{document}}\n\\end{{document}}\n',
+                              encoding='utf-8')
+            try:
+                result = self.run(
+                    [engine, '-ini', '-interaction=nonstopmode', f'-jobname={fmt_path.stem}',
+                     f'&{engine}', 'mylatexformat.ltx', source.name],
+                    cancel=cancel,
+                    timeout=min(timeout, self.build_timeout) if timeout else self.build_timeout,
+                    cwd=build_dir
+                )
+                built = Path(build_dir) / fmt_path.name
+                if result.returncode != 0 or not built.exists():
+                    raise RuntimeError(result.stdout[-500:] if result.stdout else 'no format written')
+                shutil.move(str(built), fmt_path)
+            except (CompileCancelled, CompileQueueFull) as e:
+                # The compile gave up or the sandbox was busy, not the format: the next compile tries again
+                logger.info(f"{engine} format build abandoned: {str(e)}")
+                return None
+            except Exception as e:
+                with self.lock:
+                    self.failed.add(key)
+                    self.build_failures += 1
+                logger.warning(f"Could not build {engine} format, compiling without it: {str(e)}")
+                return None
+
+        with self.lock:
+            self.builds += 1
+        logger.info(f"Format {fmt_path.name} built in {time.monotonic() - start:.1f}s")
+        self._prune()
+        return fmt_path
+
+    def _installation(self, engine: str) -> Optional[str]:
+        """
+        Fingerprint of the engine's version and its base format file, or None when the
+        engine or mylatexformat is missing
+        """
+        checked_at, fingerprint = self.installations.get(engine, (None, None))
+        if checked_at is not None and time.monotonic() - checked_at < self.installation_ttl:
+            return fingerprint
+
+        fingerprint = None
+        try:
+            version = subprocess.run([engine, '--version'], capture_output=True, text=True, timeout=10)
+            base_format = subprocess.run(['kpsewhich', f'{engine}.fmt'], capture_output=True, text=True,
+                                         timeout=10).stdout.strip()
+            package = subprocess.run(['kpsewhich', 'mylatexformat.ltx'], capture_output=True, text=True,
+                                     timeout=10).stdout.strip()
+            if version.returncode == 0 and package:
+                stat = Path(base_format).stat() if base_format else None
+                fingerprint = '|'.join([
+                    version.stdout.split('\n', 1)[0],
+                    base_format,
+                    f'{stat.st_size}:{stat.st_mtime_ns}' if stat else ''
+                ])
+            elif version.returncode == 0:
+                logger.info("mylatexformat.ltx not found; compiling without a precompiled preamble")
+        except (OSError, subprocess.SubprocessError):
+            pass
+
+        self.installations[engine] = (time.monotonic(), fingerprint)
+        return fingerprint
+
+    def _prune(self):
+        formats = sorted(self.format_dir.glob('*.fmt'), key=lambda p: p.stat().st_mtime)
+        for stale in formats[:-self.max_formats]:
+            logger.debug(f"Pruning format: {stale.name}")
+            stale.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            'formats': len(list(self.format_dir.glob('*.fmt'))),
+            'hits': self.hits,
+            'builds': self.builds,
+            'build_failures': self.build_failures
+        }
@@ -0,0 +1,310 @@
+import logging
+import re
+import time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMMAND = re.compile(r'\\([A-Za-z@]+\*?|.)', re.DOTALL)
+ENVIRONMENT_ARGUMENT = re.compile(r'\s*\{([^{}]*)\}')
+PREAMBLE_ARGUMENTS = re.compile(r'\s*(\[[^\]]*\])?\s*\{[^{}]*\}')
+RAW_ARGUMENT = re.compile(r'\s*\{[^{}]*\}')
+OPTIONAL_ARGUMENT = re.compile(r'\s*\[[^\]]*\]')
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+
+
+class LatexPreflightError(ValueError):
+    """Raised when a LaTeX document cannot be repaired into something worth compiling"""
+
+
+class LatexPreflight:
+    """
+    Fast structural check and repair of a generated LaTeX body before any compiler runs
+    1. Closes unclosed environments, drops stray \\end{...} and unwraps unknown environments
+    2. Closes unbalanced braces and inline math, drops stray closing braces
+    3. Escapes _, ^, # and & where they would be syntax errors in text, and % right after
+       a digit (a percentage); drops preamble commands the model repeated in the body
+    Comments, \\verb and verbatim environments are copied through untouched.
+    Only the part between \\begin{document} and \\end{document} is touched; the preamble
+    comes from LatexBuilder's template and is trusted.
+    """
+
+    # Environments the builder's template can typeset (anything else is unwrapped)
+    KNOWN_ENVIRONMENTS = {
+        'itemize', 'enumerate', 'description', 'center', 'flushleft', 'flushright', 'quote',
+        'quotation', 'verse', 'abstract', 'minipage', 'table', 'table*', 'figure', 'figure*',
+        'tabular', 'tabular*', 'array', 'equation', 'equation*', 'align', 'align*', 'gather',
+        'gather*', 'multline', 'multline*', 'flalign', 'flalign*', 'alignat', 'alignat*', 'aligned',
+        'gathered', 'split', 'cases', 'matrix', 'pmatrix', 'bmatrix', 'vmatrix', 'Vmatrix',
+        'smallmatrix', 'eqnarray', 'eqnarray*', 'math', 'displaymath', 'verbatim', 'verbatim*',
+        'tcolorbox', 'definition', 'examtip', 'importnote'
+    }
+    MATH_ENVIRONMENTS = {
+        'equation', 'equation*', 'align', 'align*', 'gather', 'gather*', 'multline', 'multline*',
+        'flalign', 'flalign*', 'alignat', 'alignat*', 'eqnarray', 'eqnarray*', 'math', 'displaymath'
+    }
+    # Environments in which & separates columns
+    ALIGNMENT_ENVIRONMENTS = {
+        'tabular', 'tabular*', 'array', 'align', 'align*', 'flalign', 'flalign*', 'alignat',
+        'alignat*', 'aligned', 'split', 'cases', 'matrix', 'pmatrix', 'bmatrix', 'vmatrix',
+        'Vmatrix', 'smallmatrix', 'eqnarray', 'eqnarray*'
+    }
+    VERBATIM_ENVIRONMENTS = {'verbatim', 'verbatim*'}
+    VERBATIM_COMMANDS = {'verb', 'verb*'}
+    # Commands whose first argument is copied untouched (URLs and labels may contain _ # %)
+    RAW_ARGUMENT_COMMANDS = {'url', 'href', 'label', 'ref', 'eqref', 'pageref', 'cite', 'includegraphics'}
+    # File and shell access has no place in generated notes
+    FORBIDDEN_COMMANDS = {'write18', 'input', 'include', 'openout', 'openin', 'immediate', 'catcode'}
+    # Only valid in the preamble, which the template already provides
+    PREAMBLE_COMMANDS = {'documentclass', 'usepackage'}
+    ESCAPES = {'%': '\\%', '_': '\\_', '^': '\\^{}', '#': '\\#', '&': '\\&'}
+
+    def __init__(self, max_repairs: int = 200):
+        """max_repairs: More repairs than this means the output is too broken to be worth compiling"""
+        self.max_repairs = max_repairs
+
+    def check(self, source: str) -> Tuple[str, Dict]:
+        """
+        Validate and repair a complete .tex document
+        Returns: (repaired source, stats)
+        Raises: LatexPreflightError if the document cannot be repaired
+        """
+        start = time.perf_counter()
+        begin = source.find('\\begin{document}')
+        end = source.rfind('\\end{document}')
+        if begin == -1 or end == -1 or end < begin:
+            raise LatexPreflightError("Missing \\begin{document} or \\end{document}")
+        body_start = begin + len('\\begin{document}')
+        body = source[body_start:end]
+        if not body.strip():
+            raise LatexPreflightError("Document body is empty")
+
+        repaired, stats = self._repair(body)
+        repairs = sum(stats.values())
+        if repairs > self.max_repairs:
+            raise LatexPreflightError(f"{repairs} repairs needed (limit {self.max_repairs})")
+
+        # A repaired body must pass a second time untouched
+        _, recheck = self._repair(repaired)
+        if sum(recheck.values()):
+            raise LatexPreflightError(f"Repairs did not converge: {recheck}")
+
+        stats['repairs'] = repairs
+        stats['seconds'] = round(time.perf_counter() - start, 4)
+        if repairs:
+            logger.info(f"LaTeX preflight made {repairs} repairs: {stats}")
+        return source[:body_start] + repaired + source[end:], stats
+
+    def _repair(self, body: str) -> Tuple[str, Dict[str, int]]:
+        """Single pass over the body; returns the repaired text and a count of each repair"""
+        stats = {
+            'environments_closed': 0,
+            'stray_ends_removed': 0,
+            'unknown_environments_removed': 0,
+            'braces_closed': 0,
+            'stray_braces_removed': 0,
+            'math_closed': 0,
+            'specials_escaped': 0,
+            'preamble_commands_removed': 0
+        }
+        out: List[str] = []
+        environments = []  # [name, brace depth when opened, kept in output, math open when opened]
+        braces = []  # True for a command argument, False for a bare group
+        math = None  # Closing delimiter of the open inline/display math, if any
+        i = 0
+        n = len(body)
+
+        def brace_floor() -> int:
+            return environments[-1][1] if environments else 0
+
+        def close_braces(depth: int, arguments_only: bool = False):
+            while len(braces) > depth and (braces[-1] or not arguments_only):
+                braces.pop()
+                out.append('}')
+                stats['braces_closed'] += 1
+
+        def close_math():
+            nonlocal math
+            if math:
+                out.append(math)
+                stats['math_closed'] += 1
+                math = None
+
+        def close_environment():
+            name, depth, kept, outer_math = environments.pop()
+            if math != outer_math:
+                close_math()
+            close_braces(depth)
+            if kept:
+                out.append(f'\\end{{{name}}}')
+
+        def in_math() -> bool:
+            return math is not None or any(entry[0] in self.MATH_ENVIRONMENTS for entry in environments)
+
+        while i < n:
+            c = body[i]
+
+            if c == '\\':
+                match = COMMAND.match(body, i)
+                if not match:
+                    out.append(c)
+                    i += 1
+                    continue
+                name = match.group(1)
+                if name in self.FORBIDDEN_COMMANDS:
+                    raise LatexPreflightError(f"\\{name} is not allowed in generated notes")
+                if name in self.PREAMBLE_COMMANDS:
+                    arguments = PREAMBLE_ARGUMENTS.match(body, match.end())
+                    i = arguments.end() if arguments else match.end()
+                    stats['preamble_commands_removed'] += 1
+                    continue
+
+                if name in ('begin', 'end'):
+                    argument = ENVIRONMENT_ARGUMENT.match(body, match.end())
+                    if not argument:
+                        stats['stray_ends_removed'] += 1
+                        i = match.end()
+                        continue
+                    environment = argument.group(1).strip()
+                    i = argument.end()
+
+                    if environment == 'document':
+                        stats['stray_ends_removed'] += 1
+                    elif name == 'begin':
+                        kept = environment in self.KNOWN_ENVIRONMENTS
+                        if not kept:
+                            stats['unknown_environments_removed'] += 1
+                        elif environment in self.VERBATIM_ENVIRONMENTS:
+                            close = body.find(f'\\end{{{environment}}}', i)
+                            if close == -1:
+                                out.append(body[match.start():] + f'\n\\end{{{environment}}}')
+                                stats['environments_closed'] += 1
+                                break
+                            close += len(f'\\end{{{environment}}}')
+                            out.append(body[match.start():close])
+                            i = close
+                            continue
+                        else:
+                            out.append(body[match.start():i])
+                        environments.append([environment, len(braces), kept, math])
+                    else:
+                        names = [entry[0] for entry in environments]
+                        if environment not in names:
+                            stats['stray_ends_removed'] += 1
+                            continue
+                        while environments[-1][0] != environment:
+                            if environments[-1][2]:
+                                stats['environments_closed'] += 1
+                            close_environment()
+                        close_environment()
+                    continue
+
+                if name in self.VERBATIM_COMMANDS and match.end() < n:
+                    # \verb|...|: everything up to the next delimiter on the same line is literal
+                    close = body.find(body[match.end()], match.end() + 1)
+                    line_end = body.find('\n', match.end())
+                    if close != -1 and (line_end == -1 or close < line_end):
+                        out.append(body[match.start():close + 1])
+                        i = close + 1
+                        continue
+
+                if name in ('(', '['):
+                    if math:
+                        stats['stray_ends_removed'] += 1
+                    else:
+                        math = '\\)' if name == '(' else '\\]'
+                        out.append(match.group(0))
+                    i = match.end()
+                    continue
+                if name in (')', ']'):
+                    if math == match.group(0):
+                        math = None
+                        out.append(match.group(0))
+                    else:
+                        stats['stray_ends_removed'] += 1
+                    i = match.end()
+                    continue
+
+                out.append(match.group(0))
+                i = match.end()
+                if name in self.RAW_ARGUMENT_COMMANDS:
+                    # e.g. \includegraphics[width=3cm]{img_1.png}
+                    optional = OPTIONAL_ARGUMENT.match(body, i)
+                    if optional:
+                        out.append(optional.group(0))
+                        i = optional.end()
+                    raw = RAW_ARGUMENT.match(body, i)
+                    if raw:
+                        out.append(raw.group(0))
+                        i = raw.end()
+                elif i < n and body[i] == '{':
+                    braces.append(True)
+                    out.append('{')
+                    i += 1
+                continue
+
+            if c == '{':
+                braces.append(False)
+                out.append(c)
+            elif c == '}':
+                if len(braces) > brace_floor():
+                    braces.pop()
+                    out.append(c)
+                else:
+                    stats['stray_braces_removed'] += 1
+            elif c == '$':
+                if body.startswith('$$', i):
+                    if math in (None, '$$'):
+                        math = None if math else '$$'
+                        out.append('$$')
+                    else:
+                        stats['stray_ends_removed'] += 1
+                    i += 2
+                    continue
+                if math in (None, '$'):
+                    math = None if math else '$'
+                    out.append(c)
+                else:
+                    stats['stray_ends_removed'] += 1
+            elif c == '%':
+                if i > 0 and body[i - 1].isdigit():
+                    # A percentage ("50%") would comment out the rest of the line
+                    out.append(self.ESCAPES[c])
+                    stats['specials_escaped'] += 1
+                else:
+                    # A comment: nothing up to the end of the line is typeset or parsed
+                    line_end = body.find('\n', i)
+                    line_end = n if line_end == -1 else line_end
+                    out.append(body[i:line_end])
+                    i = line_end
+                    continue
+            elif c in '_^' and not in_math():
+                out.append(self.ESCAPES[c])
+                stats['specials_escaped'] += 1
+            elif c == '#':
+                out.append(self.ESCAPES[c])
+                stats['specials_escaped'] += 1
+            elif c == '&' and not (environments and environments[-1][0] in self.ALIGNMENT_ENVIRONMENTS):
+                out.append(self.ESCAPES[c])
+                stats['specials_escaped'] += 1
+            elif c == '\n':
+                paragraph = PARAGRAPH_BREAK.match(body, i)
+                if paragraph:
+                    # Neither inline math nor a command argument can run past a paragraph break
+                    close_math()
+                    close_braces(brace_floor(), arguments_only=True)
+                    out.append(paragraph.group(0))
+                    i = paragraph.end()
+                    continue
+                out.append(c)
+            else:
+                out.append(c)
+            i += 1
+
+        close_math()
+        while environments:
+            if environments[-1][2]:
+                stats['environments_closed'] += 1
+            close_environment()
+        close_braces(0)
+        return ''.join(out), stats
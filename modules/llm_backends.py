@@ -0,0 +1,413 @@
+"""
+LLM backends used by AIGenerator
+GeminiBackend talks to Google's API; OfflineBackend fabricates plausible LaTeX locally with
+configurable latency and size so the pipeline can be benchmarked without a network
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TextStream:
+    """
+    Text pieces of a streamed completion
+    close() abandons the stream and releases its connection, even if it was never read
+    """
+
+    def __init__(self, pieces: Iterator[str], cancel: Optional[Callable[[], None]] = None):
+        self.pieces = pieces
+        self.cancel = cancel
+        self.closed = False
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        if self.closed:
+            raise StopIteration
+        return next(self.pieces)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.cancel:
+            self.cancel()
+
+
+class LLMBackend:
+    """Interface for a text generation service"""
+
+    name = ''
+
+    @property
+    def model_name(self) -> str:
+        """Model used for requests unless another is named"""
+        raise NotImplementedError
+
+    def add_model(self, model_name: str) -> str:
+        """Make another model available (e.g. for hedging); returns its canonical name"""
+        return model_name
+
+    def generate(self, model_name: str, prompt: str, generation_config: dict) -> str:
+        """Raw text of one completion"""
+        raise NotImplementedError
+
+    def stream(self, model_name: str, prompt: str, generation_config: dict) -> Iterator[str]:
+        """
+        Raw text of one completion in pieces
+        Must raise request errors before returning, so callers can retry opening the stream.
+        A stream that holds a connection should have a close() that releases it (see TextStream).
+        """
+        return iter([self.generate(model_name, prompt, generation_config)])
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via google-generativeai (best free tier model)"""
+
+    name = 'gemini'
+
+    # Models ordered by quality for LaTeX/structured output
+    MODELS_TO_TRY = [
+        'gemini-2.5-pro',         # Best quality - newest pro model
+        'gemini-2.5-flash',       # Good alternative with better features
+        'gemini-1.5-pro',         # Fallback pro model
+        'gemini-1.5-flash',       # Fallback flash model
+        'gemini-pro'              # Last resort
+    ]
+
+    def __init__(self, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        self.genai = genai
+        api_key = api_key or os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment")
+
+        genai.configure(api_key=api_key)
+
+        model = self._get_best_model()
+        self.models = {model.model_name: model}
+        self._model_name = model.model_name
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    def add_model(self, model_name: str) -> str:
+        model = self.genai.GenerativeModel(model_name)
+        self.models.setdefault(model.model_name, model)
+        return model.model_name
+
+    def _get_best_model(self):
+        """Get the best available model for LaTeX generation"""
+        print("=" * 60)
+        print("MODEL SELECTION")
+        print("=" * 60)
+
+        logger.info("Attempting to find best available Gemini model...")
+
+        for model_name in self.MODELS_TO_TRY:
+            try:
+                logger.debug(f"Trying model: {model_name}")
+                print(f"  Attempting: {model_name}...")
+                model = self.genai.GenerativeModel(model_name)
+                logger.info(f"Successfully initialized model: {model_name}")
+                print(f"  ✓ Successfully initialized: {model_name}")
+                print("=" * 60)
+                return model
+            except Exception as e:
+                logger.debug(f"Model {model_name} not available: {str(e)}")
+                print(f"  ✗ Not available: {model_name}")
+                continue
+
+        logger.error("Could not find any available model. Using gemini-pro as fallback...")
+        print("  ✗ Fallback to gemini-pro")
+        print("=" * 60)
+        return self.genai.GenerativeModel('gemini-pro')
+
+    def generate(self, model_name: str, prompt: str, generation_config: dict) -> str:
+        """Send one prompt and return the raw text of the first candidate"""
+        response = self.models[model_name].generate_content(prompt, generation_config=generation_config)
+
+        logger.info(f"Gemini response received from {model_name}")
+
+        # Handle response safely
+        if response.candidates and len(response.candidates) > 0:
+            candidate = response.candidates[0]
+            if candidate.content and candidate.content.parts and len(candidate.content.parts) > 0:
+                return candidate.content.parts[0].text
+            raise Exception("Empty response from Gemini")
+        raise Exception("No candidates in Gemini response")
+
+    def stream(self, model_name: str, prompt: str, generation_config: dict) -> Iterator[str]:
+        # generate_content waits for the first chunk, so request errors are raised here
+        response = self.models[model_name].generate_content(
+            prompt,
+            generation_config=generation_config,
+            stream=True
+        )
+        # Cancelling the gRPC/REST call behind the response drops its connection
+        return TextStream(self._iter_text(response), getattr(getattr(response, '_iterator', None), 'cancel', None))
+
+    @staticmethod
+    def _iter_text(response) -> Iterator[str]:
+        for chunk in response:
+            try:
+                yield chunk.text
+            except (ValueError, IndexError):
+                # Chunks without text parts (e.g. safety metadata only)
+                continue
+
+
+class OfflineBackendError(Exception):
+    """Simulated transient server error"""
+
+    def __init__(self, message: str, code: int = 503):
+        super().__init__(message)
+        self.code = code
+
+
+class OfflineBackend(LLMBackend):
+    """
+    Deterministic local stand-in for load tests and benchmarks
+    Output is LaTeX in the shape the prompts ask for, built from the prompt's own content and
+    seeded by its hash, so identical prompts give identical answers. Latency is log-normal
+    around latency_seconds; output length is normal around output_chars.
+    """
+
+    name = 'offline'
+
+    STOPWORDS = {
+        'the', 'and', 'for', 'that', 'with', 'this', 'from', 'are', 'was', 'were', 'which',
+        'have', 'has', 'not', 'but', 'can', 'its', 'their', 'they', 'been', 'also', 'into',
+        'more', 'than', 'such', 'these', 'those', 'when', 'where', 'will', 'would', 'there',
+        'page', 'about', 'between', 'each', 'other', 'some', 'only', 'used', 'using'
+    }
+
+    def __init__(self, latency_seconds: float = 2.0, latency_sigma: float = 0.5,
+                 output_chars: int = 6000, output_sigma: float = 0.3,
+                 failure_rate: float = 0.0, stream_chunk_chars: int = 200,
+                 model_name: str = 'offline-standin'):
+        """
+        latency_seconds: Median simulated latency of a full response
+        latency_sigma: Spread of the log-normal latency distribution
+        output_chars: Mean response length
+        output_sigma: Relative standard deviation of response length
+        failure_rate: Fraction of requests that fail with a retryable 503
+        stream_chunk_chars: Size of each streamed piece
+        """
+        self.latency_seconds = latency_seconds
+        self.latency_sigma = latency_sigma
+        self.output_chars = output_chars
+        self.output_sigma = output_sigma
+        self.failure_rate = failure_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self._model_name = model_name
+        logger.info(f"Using offline LLM stand-in (median latency {latency_seconds}s, ~{output_chars} chars)")
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    def generate(self, model_name: str, prompt: str, generation_config: dict) -> str:
+        rng = self._rng(model_name, prompt)
+        self._maybe_fail()
+        text = self._compose(rng, prompt, generation_config)
+        time.sleep(self._latency(rng))
+        return text
+
+    def stream(self, model_name: str, prompt: str, generation_config: dict) -> Iterator[str]:
+        rng = self._rng(model_name, prompt)
+        self._maybe_fail()
+        text = self._compose(rng, prompt, generation_config)
+        pieces = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)]
+        delay = self._latency(rng) / max(1, len(pieces))
+        # Time to first chunk is paid before returning, like a real streaming API
+        time.sleep(delay)
+        return self._iter_pieces(pieces, delay)
+
+    @staticmethod
+    def _iter_pieces(pieces: List[str], delay: float) -> Iterator[str]:
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(delay)
+            yield piece
+
+    @staticmethod
+    def _rng(model_name: str, prompt: str) -> random.Random:
+        seed = hashlib.sha256(f"{model_name}\0{prompt}".encode('utf-8')).hexdigest()
+        return random.Random(int(seed[:16], 16))
+
+    def _maybe_fail(self):
+        # Failures draw from the global RNG so a retried identical prompt can succeed
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise OfflineBackendError("Simulated 503 from offline backend")
+
+    def _latency(self, rng: random.Random) -> float:
+        if self.latency_seconds <= 0:
+            return 0.0
+        return rng.lognormvariate(0, self.latency_sigma) * self.latency_seconds
+
+    def _compose(self, rng: random.Random, prompt: str, generation_config: dict) -> str:
+        """Build a LaTeX body of roughly the target length from the prompt's content"""
+        content = prompt
+        if 'CONTENT TO ANALYZE:' in prompt:
+            content = prompt.split('CONTENT TO ANALYZE:', 1)[1].split('BEGIN OUTPUT:', 1)[0]
+        terms = self._key_terms(content) or ['Topic', 'Concept', 'Principle', 'Method']
+        sentences = self._sentences(content) or [f"This section introduces {terms[0].lower()}."]
+
+        target = max(500, int(rng.gauss(self.output_chars, self.output_chars * self.output_sigma)))
+        max_tokens = generation_config.get('max_output_tokens')
+        if max_tokens:
+            target = min(target, max_tokens * 4)
+
+        if 'Return ONE JSON object' in prompt:
+            return json.dumps(self._structured(rng, terms, sentences, target, 'multiple choice' in prompt))
+        
+        questions_only = 'Generate ONLY the practice question section' in prompt
+        with_questions = questions_only or '\\section{Practice Questions}' in prompt or \
+            '\\section{Quick Practice}' in prompt
+
+        parts = []
+        if not questions_only:
+            parts.extend(self._notes(rng, terms, sentences, target * 3 // 4 if with_questions else target))
+        if with_questions:
+            parts.append(self._questions(rng, terms, sentences))
+        return '\n\n'.join(parts)
+
+    def _notes(self, rng: random.Random, terms: List[str], sentences: List[str], target: int) -> List[str]:
+        parts = []
+        size = 0
+        section = 0
+        while size < target:
+            topic = terms[section % len(terms)]
+            section += 1
+            block = [f"\\section{{{self._escape(topic.title())}}}", self._paragraph(rng, sentences)]
+            for subsection in range(rng.randint(1, 3)):
+                concept = rng.choice(terms)
+                block.append(f"\\subsection{{{self._escape(concept.title())}}}")
+                block.append(self._paragraph(rng, sentences))
+                roll = rng.random()
+                if roll < 0.4:
+                    block.append(f"\\begin{{definition}}\n\\textbf{{{self._escape(concept.title())}}}: "
+                                 f"{self._escape(rng.choice(sentences))}\n\\end{{definition}}")
+                elif roll < 0.6:
+                    block.append(f"\\begin{{examtip}}\nDo not confuse {self._escape(concept)} with "
+                                 f"{self._escape(rng.choice(terms))}.\n\\end{{examtip}}")
+                elif roll < 0.75:
+                    block.append(self._table(rng, terms))
+                else:
+                    block.append("\\begin{itemize}\n" + '\n'.join(
+                        f"\\item {self._escape(rng.choice(sentences))}" for _ in range(rng.randint(2, 4))
+                    ) + "\n\\end{itemize}")
+            text = '\n\n'.join(block)
+            parts.append(text)
+            size += len(text)
+        return parts
+
+    def _structured(self, rng: random.Random, terms: List[str], sentences: List[str],
+                    target: int, with_questions: bool) -> dict:
+        """Structured-document JSON of roughly the target length"""
+        def blocks():
+            result = [{'type': 'paragraph', 'text': ' '.join(rng.choice(sentences) for _ in range(3))}]
+            roll = rng.random()
+            concept = rng.choice(terms).title()
+            if roll < 0.4:
+                result.append({'type': 'definition', 'term': concept, 'text': rng.choice(sentences)})
+            elif roll < 0.6:
+                result.append({'type': 'tip', 'text': f"Do not confuse {concept} with {rng.choice(terms)}."})
+            elif roll < 0.75:
+                result.append({'type': 'table', 'header': ['Concept', 'Related to'],
+                               'rows': [[t.title(), rng.choice(terms)] for t in rng.sample(terms, min(3, len(terms)))]})
+            else:
+                result.append({'type': 'list', 'ordered': False,
+                               'items': [rng.choice(sentences) for _ in range(rng.randint(2, 4))]})
+            return result
+        
+        sections = []
+        size = 0
+        while size < target:
+            section = {
+                'title': terms[len(sections) % len(terms)].title(),
+                'blocks': blocks(),
+                'subsections': [{'title': rng.choice(terms).title(), 'blocks': blocks()}
+                                for _ in range(rng.randint(1, 3))]
+            }
+            sections.append(section)
+            size += len(json.dumps(section))
+        
+        questions = []
+        if with_questions:
+            for _ in range(rng.randint(5, 8)):
+                options = [t.title() for t in rng.sample(terms, min(4, len(terms)))]
+                questions.append({'question': f"Which term best matches: {rng.choice(sentences)}",
+                                  'options': options, 'answer': rng.choice(options)})
+        return {'title': terms[0].title(), 'sections': sections, 'questions': questions}
+    
+    def _questions(self, rng: random.Random, terms: List[str], sentences: List[str]) -> str:
+        items = []
+        for _ in range(rng.randint(3, 5)):
+            term = self._escape(rng.choice(terms))
+            options = rng.sample(terms, min(4, len(terms)))
+            items.append(f"\\item Which statement best describes {term}?\n"
+                         "\\begin{enumerate}[label=(\\alph*)]\n" +
+                         '\n'.join(f"\\item {self._escape(option)}" for option in options) +
+                         "\n\\end{enumerate}")
+        return ("\\section{Practice Questions}\n\n\\begin{enumerate}\n" + '\n\n'.join(items) +
+                "\n\\end{enumerate}")
+
+    def _table(self, rng: random.Random, terms: List[str]) -> str:
+        rows = '\n'.join(f"{self._escape(term.title())} & {self._escape(rng.choice(terms))} \\\\"
+                         for term in rng.sample(terms, min(3, len(terms))))
+        return ("\\begin{center}\n\\begin{tabular}{l l}\n\\toprule\n"
+                "\\textbf{Concept} & \\textbf{Related to} \\\\\n\\midrule\n"
+                f"{rows}\n\\bottomrule\n\\end{{tabular}}\n\\end{{center}}")
+
+    def _paragraph(self, rng: random.Random, sentences: List[str]) -> str:
+        return self._escape(' '.join(rng.choice(sentences) for _ in range(rng.randint(2, 4))))
+
+    def _key_terms(self, text: str, limit: int = 12) -> List[str]:
+        words = re.findall(r'[A-Za-z][A-Za-z\-]{3,}', text)
+        counts = Counter(word.lower() for word in words if word.lower() not in self.STOPWORDS)
+        return [word for word, _ in counts.most_common(limit)]
+
+    @staticmethod
+    def _sentences(text: str, limit: int = 200) -> List[str]:
+        candidates = re.split(r'(?<=[.!?])\s+', re.sub(r'\s+', ' ', text))
+        sentences = [s.strip() for s in candidates if 40 <= len(s.strip()) <= 300]
+        if not sentences:
+            # Text without sentence punctuation (slides, tables): fall back to whole lines
+            sentences = [line.strip() + '.' for line in text.splitlines() if 15 <= len(line.strip()) <= 300]
+        return sentences[:limit]
+
+    @staticmethod
+    def _escape(text: str) -> str:
+        """Escape LaTeX special characters in source text"""
+        replacements = {
+            '\\': r'\textbackslash{}', '&': r'\&', '%': r'\%', '$': r'\$', '#': r'\#',
+            '_': r'\_', '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}', '^': r'\textasciicircum{}'
+        }
+        return ''.join(replacements.get(char, char) for char in text)
+
+
+BACKENDS: Dict[str, type] = {
+    GeminiBackend.name: GeminiBackend,
+    OfflineBackend.name: OfflineBackend,
+}
+
+
+def create_llm_backend(name: str, **options) -> LLMBackend:
+    """Instantiate the backend registered under name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
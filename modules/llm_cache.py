@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of cleaned model output keyed by a fingerprint of
+    model name, generation config and the full prompt
+    Stored in SQLite so any number of worker processes can share it; the size cap is
+    enforced with least-recently-used eviction and entries older than ttl_seconds expire.
+    Hit/miss counters live in the database too, so they cover every process.
+    """
+
+    def __init__(self, db_path: Path, max_bytes: int = 100 * 1024 * 1024, ttl_seconds: Optional[int] = None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.executemany('INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)',
+                             [('hits',), ('misses',), ('evictions',), ('expired',)])
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def fingerprint(model: str, generation_config: dict, prompt: str) -> str:
+        """Stable hash of everything that determines the model's answer"""
+        payload = json.dumps(
+            {'model': model, 'config': generation_config, 'prompt': prompt},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, generation_config: dict, prompt: str) -> Optional[str]:
+        """Cached response for this request, or None on a miss or expired entry"""
+        key = self.fingerprint(model, generation_config, prompt)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._bump(conn, 'expired')
+                row = None
+
+            if row is None:
+                self._bump(conn, 'misses')
+                logger.info(f"LLM cache MISS: {key[:12]}")
+                return None
+
+            conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self._bump(conn, 'hits')
+        logger.info(f"LLM cache HIT: {key[:12]}")
+        return row[0]
+
+    def put(self, model: str, generation_config: dict, prompt: str, response: str):
+        """Store a cleaned response and evict old entries beyond the size cap"""
+        key = self.fingerprint(model, generation_config, prompt)
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, model, response, size, now, now))
+            self._evict(conn)
+        logger.info(f"LLM cache stored {key[:12]} ({size} bytes)")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+            entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            **counters,
+            'hit_rate': round(counters['hits'] / lookups, 3) if lookups else 0.0
+        }
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete least recently used responses until the cache fits max_bytes"""
+        if self.ttl_seconds:
+            expired = conn.execute('DELETE FROM responses WHERE created < ?',
+                                   (time.time() - self.ttl_seconds,)).rowcount
+            if expired:
+                self._bump(conn, 'expired', expired)
+
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._bump(conn, 'evictions')
+            total -= size
+            logger.info(f"LLM cache evicted {key[:12]}")
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute('UPDATE counters SET value = value + ? WHERE name = ?', (amount, name))
@@ -0,0 +1,256 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ModelStats:
+    """Rolling latency window and error counters for one model"""
+
+    def __init__(self, window: int = 50):
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.hedge_wins = 0
+
+    def record_success(self, latency: Optional[float] = None):
+        with self.lock:
+            self.requests += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def record_error(self, retried: bool = False):
+        with self.lock:
+            self.requests += 1
+            self.errors += 1
+            if retried:
+                self.retries += 1
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Latency at the given percentile over the window, or None without samples"""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    @property
+    def sample_count(self) -> int:
+        return len(self.latencies)
+
+    def to_dict(self) -> dict:
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'hedge_wins': self.hedge_wins,
+            'samples': self.sample_count,
+            'p50_seconds': round(p50, 3) if p50 is not None else None,
+            'p95_seconds': round(p95, 3) if p95 is not None else None
+        }
+
+
+class ModelRouter:
+    """
+    Sends completions to a primary model with retry and request hedging
+    Rate limits and server errors are retried with jittered exponential backoff. When the
+    primary has not answered after its rolling p95 latency (or a fixed delay), the same
+    request is also sent to the hedge model and whichever answers first wins.
+    Streamed requests are hedged the same way on their time to first chunk, which has its
+    own latency window apart from whole completions.
+    """
+
+    # HTTP statuses worth retrying: rate limiting and transient server errors
+    RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+    # Latency kinds, each with its own rolling window per model
+    COMPLETION = 'completion'
+    FIRST_CHUNK = 'first_chunk'
+
+    def __init__(self, request_fn: Callable[[str, str, dict], str], primary_model: str,
+                 hedge_model: Optional[str] = None, hedge_delay: float = 0,
+                 hedge_percentile: float = 95, hedge_min_delay: float = 2.0,
+                 hedge_default_delay: float = 30.0, min_samples: int = 5,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 window: int = 50, stream_fn: Optional[Callable[[str, str, dict], Iterator[str]]] = None):
+        """
+        request_fn(model_name, prompt, generation_config): Sends one request, returns raw text
+        hedge_model: Model for the hedged request (None disables hedging)
+        hedge_delay: Fixed hedge delay in seconds (0 = rolling percentile of the primary)
+        hedge_default_delay: Delay used until the primary has min_samples latencies
+        max_retries: Retries per request on 429/5xx before giving up
+        stream_fn(model_name, prompt, generation_config): Opens a stream, returning once the first
+                                                          chunk has arrived (needed for open_stream)
+        """
+        self.request_fn = request_fn
+        self.stream_fn = stream_fn
+        self.primary_model = primary_model
+        self.hedge_model = hedge_model if hedge_model and hedge_model != primary_model else None
+        self.hedge_delay_seconds = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.min_samples = min_samples
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.window = window
+        self.stats_by_model: Dict[Tuple[str, str], ModelStats] = {}
+        self.lock = threading.Lock()
+        self.hedged_requests = 0
+
+    def model_stats(self, model_name: str, kind: str = COMPLETION) -> ModelStats:
+        with self.lock:
+            if (kind, model_name) not in self.stats_by_model:
+                self.stats_by_model[(kind, model_name)] = ModelStats(self.window)
+            return self.stats_by_model[(kind, model_name)]
+
+    def hedge_delay(self, kind: str = COMPLETION) -> float:
+        """Seconds to wait on the primary before sending the hedged request"""
+        if self.hedge_delay_seconds:
+            return self.hedge_delay_seconds
+        stats = self.model_stats(self.primary_model, kind)
+        if stats.sample_count < self.min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, stats.percentile(self.hedge_percentile))
+
+    def complete(self, prompt: str, generation_config: dict, model_name: Optional[str] = None) -> str:
+        """
+        Raw completion text from whichever model answers first
+        model_name: Send to this model alone instead of the primary (no hedging)
+        """
+        return self._hedged(self.request_fn, self.COMPLETION, prompt, generation_config, model_name)
+
+    def open_stream(self, prompt: str, generation_config: dict,
+                    model_name: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream from whichever model sends its first chunk first
+        The losing stream is closed unread once it opens, so its output is neither waited for nor leaked
+        model_name: Stream from this model alone instead of the primary (no hedging)
+        """
+        return self._hedged(self.stream_fn, self.FIRST_CHUNK, prompt, generation_config, model_name)
+
+    def _hedged(self, func: Callable, kind: str, prompt: str, generation_config: dict,
+                model_name: Optional[str] = None):
+        """func(model, prompt, generation_config) on the primary, hedged after hedge_delay(kind)"""
+        if model_name and model_name != self.primary_model:
+            return self.call_with_backoff(model_name, func, model_name, prompt, generation_config, kind=kind)
+        if not self.hedge_model:
+            return self.call_with_backoff(self.primary_model, func,
+                                          self.primary_model, prompt, generation_config, kind=kind)
+
+        delay = self.hedge_delay(kind)
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='llm-hedge')
+        try:
+            primary = pool.submit(self.call_with_backoff, self.primary_model, func,
+                                  self.primary_model, prompt, generation_config, kind=kind)
+            done, _ = wait([primary], timeout=delay)
+            if done:
+                if primary.exception() is None:
+                    return primary.result()
+                logger.warning(f"{self.primary_model} failed ({primary.exception()}). "
+                               f"Falling back to {self.hedge_model}")
+                return self.call_with_backoff(self.hedge_model, func,
+                                              self.hedge_model, prompt, generation_config, kind=kind)
+
+            logger.info(f"{self.primary_model} {kind.replace('_', ' ')} slower than {delay:.1f}s. "
+                        f"Hedging with {self.hedge_model}")
+            with self.lock:
+                self.hedged_requests += 1
+            hedge = pool.submit(self.call_with_backoff, self.hedge_model, func,
+                                self.hedge_model, prompt, generation_config, kind=kind)
+
+            models = {primary: self.primary_model, hedge: self.hedge_model}
+            pending = set(models)
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    winner = models[future]
+                    if winner == self.hedge_model:
+                        stats = self.model_stats(winner, kind)
+                        with stats.lock:
+                            stats.hedge_wins += 1
+                    logger.info(f"Hedged request won by {winner}")
+                    for loser in models:
+                        if loser is not future:
+                            loser.add_done_callback(self._close_result)
+                    return future.result()
+            raise error
+        finally:
+            # The losing request cannot be aborted mid-flight; it finishes in the background and
+            # a stream it opened is closed (_close_result)
+            pool.shutdown(wait=False)
+
+    @staticmethod
+    def _close_result(future: Future):
+        """Close the stream a losing hedged call opened, so its connection is released"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        close = getattr(future.result(), 'close', None)
+        if close:
+            try:
+                close()
+            except Exception as e:
+                logger.debug(f"Closing losing stream failed: {str(e)}")
+
+    def call_with_backoff(self, model_name: str, func: Callable, *args,
+                          track_latency: bool = True, kind: str = COMPLETION, **kwargs):
+        """
+        Call func, retrying rate limits and server errors with jittered exponential backoff
+        kind: Latency window the call's duration is recorded in
+        """
+        stats = self.model_stats(model_name, kind)
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                retry = attempt < self.max_retries and self.is_retryable(e)
+                stats.record_error(retried=retry)
+                if not retry:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"{model_name} request failed ({str(e)}). "
+                               f"Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            stats.record_success(time.monotonic() - start if track_latency else None)
+            return result
+
+    @classmethod
+    def is_retryable(cls, error: Exception) -> bool:
+        """Rate limits, transient server errors and dropped connections"""
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        code = getattr(error, 'code', None)
+        return isinstance(code, int) and code in cls.RETRYABLE_STATUS
+
+    def stats(self) -> dict:
+        with self.lock:
+            models = dict(self.stats_by_model)
+        return {
+            'primary_model': self.primary_model,
+            'hedge_model': self.hedge_model,
+            'hedge_delay_seconds': round(self.hedge_delay(), 3),
+            'first_chunk_hedge_delay_seconds': round(self.hedge_delay(self.FIRST_CHUNK), 3),
+            'hedged_requests': self.hedged_requests,
+            # Whole-completion latency of non-streamed requests
+            'models': {name: stats.to_dict() for (kind, name), stats in models.items()
+                       if kind == self.COMPLETION},
+            # Time to first chunk of streamed requests
+            'first_chunk': {name: stats.to_dict() for (kind, name), stats in models.items()
+                            if kind == self.FIRST_CHUNK}
+        }
@@ -52,7 +52,22 @@ class OverleafAutomation:
             logger.error(f"Online compilation error: {str(e)}")
             return None
     
-    def _try_quicklatex(self, latex_content: str, filename: str, output_dir: Path) -> Optional[Path]:
+    def compile_with_service(self, service: str, latex_content: str, filename: str,
+                             output_dir: Path, timeout: Optional[float] = None) -> Optional[Path]:
+        """
+        Compile with one named service ('quicklatex' or 'latex_online') only
+        timeout: Cap on the request time, below the service's own limit
+        """
+        services = {
+            'quicklatex': self._try_quicklatex,
+            'latex_online': self._try_latex_online
+        }
+        if service not in services:
+            raise ValueError(f"Unknown online LaTeX service: {service}")
+        return services[service](latex_content, filename, output_dir, timeout)
+    
+    def _try_quicklatex(self, latex_content: str, filename: str, output_dir: Path,
+                        timeout: Optional[float] = None) -> Optional[Path]:
         """Try QuickLaTeX API"""
         try:
             logger.debug("Trying QuickLaTeX API...")
@@ -68,7 +83,7 @@ class OverleafAutomation:
                 'user_id': '0'
             }
             
-            response = requests.post(url, data=payload, timeout=30)
+            response = requests.post(url, data=payload, timeout=min(30, timeout or 30))
             
             if response.status_code == 200:
                 pdf_path = output_dir / f"{filename}.pdf"
@@ -81,7 +96,8 @@ class OverleafAutomation:
             logger.debug(f"QuickLaTeX failed: {str(e)}")
             return None
     
-    def _try_latex_online(self, latex_content: str, filename: str, output_dir: Path) -> Optional[Path]:
+    def _try_latex_online(self, latex_content: str, filename: str, output_dir: Path,
+                          timeout: Optional[float] = None) -> Optional[Path]:
         """Try LaTeX Online service"""
         try:
             logger.debug("Trying LaTeX Online API...")
@@ -99,7 +115,7 @@ class OverleafAutomation:
                 ]
             }
             
-            response = requests.post(url, json=payload, timeout=60)
+            response = requests.post(url, json=payload, timeout=min(60, timeout or 60))
             
             if response.status_code == 200:
                 result = response.json()
@@ -0,0 +1,129 @@
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PageCache:
+    """
+    Disk-backed cache of extracted page text, keyed by document hash, extraction backend
+    and page number
+    Page text is zlib-compressed in SQLite; each document row also holds its metadata so
+    a cached document never has to be reopened. Pages without text are not stored, so a
+    page that came out empty is extracted again next time. SQLite locking makes it safe
+    to share between worker threads and processes.
+    """
+
+    def __init__(self, db_path: Path, max_documents: int = 500):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_documents = max_documents
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_hash TEXT PRIMARY KEY,
+                    page_count INTEGER NOT NULL,
+                    metadata TEXT NOT NULL,
+                    backend TEXT,
+                    last_access REAL NOT NULL
+                )""")
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(pages)')]
+            if columns and 'backend' not in columns:
+                # Pages cached before they were keyed by backend cannot be attributed to one
+                conn.execute('DROP TABLE pages')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    doc_hash TEXT NOT NULL,
+                    backend TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    text BLOB NOT NULL,
+                    PRIMARY KEY (doc_hash, backend, page_number)
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_document(self, doc_hash: str) -> Optional[dict]:
+        """Cached page count, metadata and backend for a document, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT page_count, metadata, backend FROM documents WHERE doc_hash = ?', (doc_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE documents SET last_access = ? WHERE doc_hash = ?', (time.time(), doc_hash))
+        return {'page_count': row[0], 'metadata': json.loads(row[1]), 'backend': row[2]}
+
+    def put_document(self, doc_hash: str, page_count: int, metadata: dict, backend: Optional[str] = None):
+        """Record a parsed document, keeping any pages already cached for it"""
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO documents (doc_hash, page_count, metadata, backend, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(doc_hash) DO UPDATE SET
+                    page_count = excluded.page_count,
+                    metadata = excluded.metadata,
+                    backend = COALESCE(excluded.backend, documents.backend),
+                    last_access = excluded.last_access
+            """, (doc_hash, page_count, json.dumps(metadata), backend, time.time()))
+            self._evict(conn)
+
+    def get_page(self, doc_hash: str, backend: str, page_number: int) -> Optional[str]:
+        """Cached text of one 1-based page as extracted by backend, or None if there is none"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT text FROM pages WHERE doc_hash = ? AND backend = ? AND page_number = ?',
+                (doc_hash, backend, page_number)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put_pages(self, doc_hash: str, backend: str, pages: Iterable[Tuple[int, str]]):
+        """Store (page_number, text) pairs extracted by backend in one transaction, skipping empty pages"""
+        rows = [(doc_hash, backend, number, zlib.compress(text.encode('utf-8')))
+                for number, text in pages if text.strip()]
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO pages (doc_hash, backend, page_number, text) VALUES (?, ?, ?, ?)', rows
+            )
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            documents = conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+            pages = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        return {
+            'documents': documents,
+            'pages': pages,
+            'page_hits': self.hits,
+            'page_misses': self.misses
+        }
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used documents beyond max_documents"""
+        stale = conn.execute(
+            'SELECT doc_hash FROM documents ORDER BY last_access DESC LIMIT -1 OFFSET ?', (self.max_documents,)
+        ).fetchall()
+        for (doc_hash,) in stale:
+            logger.info(f"Page cache evicting document {doc_hash[:12]}")
+            conn.execute('DELETE FROM pages WHERE doc_hash = ?', (doc_hash,))
+            conn.execute('DELETE FROM documents WHERE doc_hash = ?', (doc_hash,))
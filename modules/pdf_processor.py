@@ -1,23 +1,72 @@
-import PyPDF2
-from typing import Optional, Tuple
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import atexit
 import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from modules.extraction_backends import AVAILABLE_BACKENDS, extract_page_slice, safe_extract_page
+from modules.page_cache import PageCache
+from utils.helpers import hash_file
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+
+class PageText(NamedTuple):
+    """Text extracted from a single PDF page"""
+    page_number: int  # 1-based
+    total_pages: int
+    text: str
+
+    @property
+    def has_text(self) -> bool:
+        return bool(self.text and not self.text.isspace())
+
+    def formatted(self) -> str:
+        """Page text with the marker used when joining pages into one document"""
+        return f"--- Page {self.page_number} ---\n{self.text}\n\n"
+
+
 class PDFProcessor:
     """Handles PDF text extraction"""
     
-    def __init__(self):
-        self.text_extractors = {
-            'pypdf2': self._extract_with_pypdf2,
-            # Add more extractors here if needed
-        }
+    def __init__(self, parallel_workers: Optional[int] = None, parallel_min_pages: int = 64,
+                 pages_per_task: int = 16, backend: str = 'auto', calibration_pages: int = 3,
+                 min_text_ratio: float = 0.8, page_cache: Optional[PageCache] = None):
+        # Installed extraction backends, in default preference order
+        self.text_extractors = dict(AVAILABLE_BACKENDS)
+        if not self.text_extractors:
+            raise RuntimeError("No PDF extraction library installed. Install with: pip install PyPDF2")
+        
+        # 'auto' benchmarks the installed backends on each document; otherwise a fixed backend name
+        if backend != 'auto' and backend not in self.text_extractors:
+            logger.warning(f"Extraction backend '{backend}' not available. Falling back to auto selection")
+            backend = 'auto'
+        self.backend = backend
+        self.calibration_pages = calibration_pages
+        self.min_text_ratio = min_text_ratio
+        logger.info(f"Extraction backends available: {list(self.text_extractors)} (mode: {backend})")
+        
+        # Documents with at least parallel_min_pages pages are split across a process pool
+        self.parallel_workers = parallel_workers if parallel_workers is not None else (os.cpu_count() or 1)
+        self.parallel_min_pages = parallel_min_pages
+        self.pages_per_task = pages_per_task
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        atexit.register(self.close)
+        
+        # Optional persistent cache of per-page text and metadata
+        self.page_cache = page_cache
+        self._hash_memo = {}
     
-    def extract_text(self, pdf_path: str) -> str:
+    def extract_text(self, pdf_path: str, progress_callback: Optional[Callable] = None) -> str:
         """
         Extract text from PDF file
+        progress_callback(stage, **details) is called as each page is processed
         Returns: Extracted text as string
         """
         logger.info(f"Starting text extraction from PDF: {pdf_path}")
@@ -32,24 +81,25 @@ class PDFProcessor:
         
         try:
             # Try primary extractor
-            logger.debug("Attempting extraction with PyPDF2...")
-            text, success = self._extract_with_pypdf2(pdf_path)
+            primary = self.select_backend(pdf_path)
+            logger.debug(f"Attempting extraction with {primary}...")
+            text, success = self._extract_with_backend(primary, pdf_path, progress_callback)
             text_length = len(text.strip()) if text else 0
             
-            logger.info(f"PyPDF2 extraction result - Success: {success}, Length: {text_length} chars")
+            logger.info(f"{primary} extraction result - Success: {success}, Length: {text_length} chars")
             
             if success and text_length > 50:
-                logger.info(f"Extraction successful with PyPDF2. Returning {text_length} characters")
+                logger.info(f"Extraction successful with {primary}. Returning {text_length} characters")
                 return text
             
             # Try alternative extractors if primary fails
-            logger.warning(f"PyPDF2 extraction produced insufficient text ({text_length} chars). Trying alternatives...")
-            for extractor_name, extractor_func in self.text_extractors.items():
-                if extractor_name == 'pypdf2':
+            logger.warning(f"{primary} extraction produced insufficient text ({text_length} chars). Trying alternatives...")
+            for extractor_name in self.text_extractors:
+                if extractor_name == primary:
                     continue  # Already tried
                 
                 logger.debug(f"Trying alternative extractor: {extractor_name}")
-                text, success = extractor_func(pdf_path)
+                text, success = self._extract_with_backend(extractor_name, pdf_path, progress_callback)
                 if success:
                     logger.info(f"Extraction successful with {extractor_name}")
                     return text
@@ -61,61 +111,336 @@ class PDFProcessor:
             logger.error(f"PDF extraction failed with error: {str(e)}", exc_info=True)
             raise Exception(f"Failed to extract text from PDF: {str(e)}")
     
-    def _extract_with_pypdf2(self, pdf_path: str) -> Tuple[str, bool]:
-        """Extract text using PyPDF2"""
-        text = ""
+    def select_backend(self, pdf_path: str) -> str:
+        """Backend to use for this document: the configured one, or the calibration winner"""
+        if self.backend != 'auto':
+            return self.backend
+        if len(self.text_extractors) == 1:
+            return next(iter(self.text_extractors))
+        if self.page_cache:
+            cached = self.page_cache.get_document(self._document_hash(pdf_path))
+            if cached and cached['backend'] in self.text_extractors:
+                return cached['backend']
+        return self.calibrate(pdf_path)['selected']
+    
+    def calibrate(self, pdf_path: str) -> dict:
+        """
+        Time every installed backend on a sample of pages from this document
+        Picks the fastest backend that recovers at least min_text_ratio of the best text yield
+        Returns: {'selected': name, 'timings': {name: seconds}, 'characters': {name: count}}
+        """
+        timings: Dict[str, float] = {}
+        characters: Dict[str, int] = {}
+        sample = None
+        
+        for name, backend_class in self.text_extractors.items():
+            started = time.perf_counter()
+            try:
+                with backend_class(pdf_path) as document:
+                    if document.is_encrypted:
+                        continue
+                    if sample is None:
+                        sample = self._sample_pages(document.page_count)
+                    characters[name] = sum(len(safe_extract_page(document, n).strip()) for n in sample)
+            except Exception as e:
+                logger.warning(f"Calibration: backend {name} failed to open document: {str(e)}")
+                continue
+            timings[name] = time.perf_counter() - started
+        
+        if not timings:
+            # Nothing could read the sample; let the default backend report the real error
+            selected = next(iter(self.text_extractors))
+        else:
+            best_yield = max(characters.values())
+            adequate = [name for name in timings if characters[name] >= best_yield * self.min_text_ratio]
+            selected = min(adequate, key=lambda name: timings[name])
+        
+        result = {
+            'selected': selected,
+            'sample_pages': sample or [],
+            'timings': {name: round(seconds, 4) for name, seconds in timings.items()},
+            'characters': characters
+        }
+        logger.info(f"Extraction backend calibration: selected '{selected}'. "
+                    f"Timings: {result['timings']}, characters: {characters}")
+        return result
+    
+    def _sample_pages(self, page_count: int) -> List[int]:
+        """Up to calibration_pages page numbers spread across the document"""
+        if page_count <= self.calibration_pages:
+            return list(range(1, page_count + 1))
+        step = page_count / self.calibration_pages
+        return sorted({int(i * step) + 1 for i in range(self.calibration_pages)})
+    
+    def iter_pages(self, pdf_path: str, progress_callback: Optional[Callable] = None,
+                   page_range: Optional[Tuple[int, int]] = None,
+                   backend: Optional[str] = None) -> Iterator[PageText]:
+        """
+        Lazily extract text one page at a time
+        Only the current page's text is held, so callers can stream through large documents
+        and stop parsing early simply by not asking for more pages
+        page_range: Optional 1-based inclusive (first, last) pages to read
+        backend: Extraction backend name (default: select_backend)
+        Yields: PageText for every page (empty text for pages without text or that failed)
+        """
+        doc_hash = self._document_hash(pdf_path) if self.page_cache else None
+        cached = self.page_cache.get_document(doc_hash) if doc_hash else None
+        if cached:
+            yield from self._iter_cached_pages(doc_hash, cached, pdf_path, progress_callback, page_range, backend)
+            return
+        
+        backend = backend or self.select_backend(pdf_path)
+        logger.debug(f"Opening PDF file with {backend}: {pdf_path}")
+        with self.text_extractors[backend](pdf_path) as document:
+            page_count = document.page_count
+            logger.info(f"PDF loaded. Total pages: {page_count}")
+            
+            # Record metadata from this parse so get_metadata never has to reopen the file
+            if doc_hash:
+                self.page_cache.put_document(doc_hash, page_count, {
+                    **document.metadata,
+                    'pages': page_count,
+                    'encrypted': document.is_encrypted
+                }, backend)
+            
+            # Check if PDF is encrypted
+            if document.is_encrypted:
+                logger.error("PDF is encrypted and cannot be read")
+                raise ValueError("PDF is encrypted and cannot be read")
+            
+            first, last = self._resolve_page_range(page_range, page_count)
+            logger.info(f"Extracting text from pages {first}-{last} of {page_count}...")
+            if self.parallel_workers > 1 and last - first + 1 >= self.parallel_min_pages:
+                pages = self._iter_pages_parallel(backend, pdf_path, page_count, first, last, progress_callback)
+            else:
+                pages = self._iter_document_pages(document, page_count, first, last, progress_callback)
+            
+            if doc_hash:
+                pages = self._store_pages(doc_hash, backend, pages)
+            yield from pages
+    
+    def _iter_document_pages(self, document, page_count: int, first: int, last: int,
+                             progress_callback: Optional[Callable] = None) -> Iterator[PageText]:
+        """Extract pages first..last from an open document in the current process"""
+        for page_num in range(first, last + 1):
+            page_text = safe_extract_page(document, page_num)
+            
+            if progress_callback:
+                progress_callback('page_extracted', page=page_num, total_pages=page_count)
+            
+            yield PageText(page_num, page_count, page_text)
+    
+    def _iter_cached_pages(self, doc_hash: str, cached: dict, pdf_path: str,
+                           progress_callback: Optional[Callable] = None,
+                           page_range: Optional[Tuple[int, int]] = None,
+                           backend: Optional[str] = None) -> Iterator[PageText]:
+        """
+        Serve pages of a previously parsed document from the page cache
+        The PDF is only opened if a requested page was never extracted
+        """
+        if cached['metadata'].get('encrypted'):
+            logger.error("PDF is encrypted and cannot be read (cached)")
+            raise ValueError("PDF is encrypted and cannot be read")
+        
+        page_count = cached['page_count']
+        first, last = self._resolve_page_range(page_range, page_count)
+        logger.info(f"Page cache: document {doc_hash[:12]} known ({page_count} pages). Reading pages {first}-{last}")
+        
+        backend = backend or cached['backend'] or self.select_backend(pdf_path)
+        if backend not in self.text_extractors:
+            backend = self.select_backend(pdf_path)
+        document = None
         try:
-            logger.debug(f"Opening PDF file: {pdf_path}")
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                page_count = len(reader.pages)
-                logger.info(f"PDF loaded. Total pages: {page_count}")
+            for page_num in range(first, last + 1):
+                page_text = self.page_cache.get_page(doc_hash, backend, page_num)
+                if page_text is None:
+                    if document is None:
+                        logger.debug(f"Page {page_num} not cached for {backend}. Opening PDF")
+                        document = self.text_extractors[backend](pdf_path)
+                    page_text = safe_extract_page(document, page_num)
+                    self.page_cache.put_pages(doc_hash, backend, [(page_num, page_text)])
                 
-                # Check if PDF is encrypted
-                if reader.is_encrypted:
-                    logger.error("PDF is encrypted and cannot be read")
-                    return "PDF is encrypted and cannot be read", False
+                if progress_callback:
+                    progress_callback('page_extracted', page=page_num, total_pages=page_count)
                 
-                # Extract text from each page
-                logger.info(f"Extracting text from {page_count} pages...")
-                extracted_pages = 0
-                
-                for page_num, page in enumerate(reader.pages, 1):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text and len(page_text.strip()) > 0:
-                            text += f"--- Page {page_num} ---\n{page_text}\n\n"
-                            extracted_pages += 1
-                            logger.debug(f"Page {page_num}: Extracted {len(page_text)} characters")
-                        else:
-                            logger.debug(f"Page {page_num}: No text found")
-                    except Exception as page_error:
-                        logger.warning(f"Error extracting from page {page_num}: {page_error}")
-                
-                total_length = len(text.strip())
-                logger.info(f"Extraction complete. Pages with text: {extracted_pages}/{page_count}. Total length: {total_length} characters")
+                yield PageText(page_num, page_count, page_text)
+        finally:
+            if document is not None:
+                document.close()
+    
+    def _store_pages(self, doc_hash: str, backend: str, pages: Iterator[PageText],
+                     batch_size: int = 16) -> Iterator[PageText]:
+        """Pass pages through while writing them to the page cache in batches"""
+        batch = []
+        try:
+            for page in pages:
+                batch.append((page.page_number, page.text))
+                if len(batch) >= batch_size:
+                    self.page_cache.put_pages(doc_hash, backend, batch)
+                    batch = []
+                yield page
+        finally:
+            # Also runs when the consumer stops early, so every extracted page is kept
+            self.page_cache.put_pages(doc_hash, backend, batch)
+            pages.close()
+    
+    def _document_hash(self, pdf_path: str) -> str:
+        """Content hash of a PDF, memoized by path, size and modification time"""
+        stat = Path(pdf_path).stat()
+        key = (str(pdf_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hash_memo:
+            if len(self._hash_memo) >= 64:
+                self._hash_memo.clear()
+            self._hash_memo[key] = hash_file(Path(pdf_path))
+        return self._hash_memo[key]
+    
+    def _iter_pages_parallel(self, backend: str, pdf_path: str, page_count: int, first: int, last: int,
+                             progress_callback: Optional[Callable] = None) -> Iterator[PageText]:
+        """
+        Extract page slices on the process pool and yield pages back in document order
+        At most one slice per worker is in flight, so a consumer that stops early
+        (e.g. once a character budget is met) leaves little wasted work behind
+        """
+        slices = [
+            (start, min(start + self.pages_per_task - 1, last))
+            for start in range(first, last + 1, self.pages_per_task)
+        ]
+        logger.info(f"Parallel extraction: {len(slices)} slices of up to {self.pages_per_task} pages "
+                    f"on {self.parallel_workers} workers")
+        
+        pool = self._get_pool()
+        pending = deque()
+        next_slice = 0
+        try:
+            while next_slice < len(slices) or pending:
+                while next_slice < len(slices) and len(pending) < self.parallel_workers:
+                    start, end = slices[next_slice]
+                    pending.append((start, pool.submit(extract_page_slice, backend, str(pdf_path), start, end)))
+                    next_slice += 1
                 
-                return text, total_length > 0
+                start, future = pending.popleft()
+                for offset, page_text in enumerate(future.result()):
+                    page_num = start + offset
+                    if progress_callback:
+                        progress_callback('page_extracted', page=page_num, total_pages=page_count)
+                    yield PageText(page_num, page_count, page_text)
+        finally:
+            for _, future in pending:
+                future.cancel()
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Process pool for parallel extraction, created on first use"""
+        with self._pool_lock:
+            if self._pool is None:
+                # Forking this multithreaded server could hand a worker a lock held by another thread
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    # Imported once in the fork server, so new workers start with the extractors loaded
+                    context.set_forkserver_preload(['modules.extraction_backends'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.parallel_workers, mp_context=context)
+            return self._pool
+    
+    def close(self):
+        """Shut down the extraction worker processes (called at exit; the pool restarts if used again)"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def extract_text_with_stats(self, pdf_path: str, max_chars: Optional[int] = None,
+                                page_range: Optional[Tuple[int, int]] = None,
+                                progress_callback: Optional[Callable] = None,
+                                backend: Optional[str] = None) -> Tuple[str, dict]:
+        """
+        Extract text, stopping as soon as max_chars of page text has been collected
+        Pages after the budget is met are never parsed
+        Returns: (text, stats) where stats reports pages processed and whether the budget cut extraction short
+        """
+        # Collect page chunks and join once - repeated string += is quadratic on large books
+        parts = []
+        collected = 0
+        stats = {
+            'total_pages': 0,
+            'pages_processed': 0,
+            'pages_with_text': 0,
+            'first_page': None,
+            'last_page': None,
+            'budget_reached': False
+        }
+        
+        backend = backend or self.select_backend(pdf_path)
+        stats['backend'] = backend
+        for page in self.iter_pages(pdf_path, progress_callback, page_range, backend):
+            stats['total_pages'] = page.total_pages
+            stats['pages_processed'] += 1
+            stats['first_page'] = stats['first_page'] or page.page_number
+            stats['last_page'] = page.page_number
+            
+            if page.has_text:
+                chunk = page.formatted()
+                parts.append(chunk)
+                collected += len(chunk)
+                stats['pages_with_text'] += 1
+            
+            if max_chars and collected >= max_chars:
+                range_last = min(page_range[1] or page.total_pages, page.total_pages) if page_range else page.total_pages
+                stats['budget_reached'] = page.page_number < range_last
+                logger.info(f"Character budget of {max_chars} met after page {page.page_number}. Stopping extraction")
+                break
+        
+        text = ''.join(parts)
+        stats['characters'] = len(text)
+        logger.info(f"Extraction complete. Pages with text: {stats['pages_with_text']}/{stats['pages_processed']} processed "
+                    f"({stats['total_pages']} total). Total length: {stats['characters']} characters")
+        return text, stats
+    
+    def _extract_with_backend(self, backend: str, pdf_path: str,
+                              progress_callback: Optional[Callable] = None) -> Tuple[str, bool]:
+        """Extract the whole document with one named backend"""
+        try:
+            text, stats = self.extract_text_with_stats(pdf_path, progress_callback=progress_callback, backend=backend)
+            return text, len(text.strip()) > 0
                 
         except Exception as e:
-            logger.error(f"PyPDF2 extraction error: {str(e)}", exc_info=True)
+            logger.error(f"{backend} extraction error: {str(e)}", exc_info=True)
             return f"Extraction error: {str(e)}", False
     
+    @staticmethod
+    def _resolve_page_range(page_range: Optional[Tuple[int, int]], page_count: int) -> Tuple[int, int]:
+        """Clamp a requested 1-based inclusive page range to the document"""
+        if not page_range:
+            return 1, page_count
+        first, last = page_range
+        first = max(1, first or 1)
+        last = min(page_count, last or page_count)
+        if first > last:
+            raise ValueError(f"Page range {page_range} is outside the document (1-{page_count})")
+        return first, last
+    
     def get_metadata(self, pdf_path: str) -> dict:
-        """Extract PDF metadata"""
+        """Extract PDF metadata, served from the page cache when the document was already parsed"""
         logger.info(f"Extracting metadata from: {pdf_path}")
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                metadata = reader.metadata
+            doc_hash = self._document_hash(pdf_path) if self.page_cache else None
+            cached = self.page_cache.get_document(doc_hash) if doc_hash else None
+            if cached:
+                logger.info(f"Metadata served from page cache: {cached['metadata']}")
+                return dict(cached['metadata'])
+            
+            backend = self.backend if self.backend != 'auto' else next(iter(self.text_extractors))
+            with self.text_extractors[backend](pdf_path) as document:
                 result = {
-                    'title': metadata.get('/Title', 'Unknown') if metadata else 'Unknown',
-                    'author': metadata.get('/Author', 'Unknown') if metadata else 'Unknown',
-                    'pages': len(reader.pages),
-                    'encrypted': reader.is_encrypted
+                    **document.metadata,
+                    'pages': document.page_count,
+                    'encrypted': document.is_encrypted
                 }
-                logger.info(f"Metadata extracted: {result}")
-                return result
+            
+            if doc_hash:
+                self.page_cache.put_document(doc_hash, result['pages'], result)
+            logger.info(f"Metadata extracted: {result}")
+            return result
         except Exception as e:
             logger.error(f"Error extracting metadata: {str(e)}", exc_info=True)
-            return {}
\ No newline at end of file
+            return {}
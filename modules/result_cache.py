@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Persistent cache of finished pipeline artifacts (.tex/.pdf)
+    Keyed by the SHA-256 of the uploaded PDF plus the generation options and the model
+    that produced them, bounded in size with least-recently-used eviction. The index
+    lives in SQLite so several worker processes can share the cache without losing
+    each other's entries.
+    """
+
+    INDEX_NAME = 'index.db'
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 500 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / self.INDEX_NAME
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    files TEXT NOT NULL,
+                    preview TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+            entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        logger.info(f"Result cache ready at {self.cache_dir}: {entries} entries, "
+                    f"{total} bytes (limit {self.max_bytes})")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(pdf_hash: str, note_type: str, include_questions: bool, page_range=None,
+                 structured: bool = False, backend: str = '', model: str = '',
+                 chunked: bool = False) -> str:
+        """Cache key for an uploaded document, the options it was generated with and the model used"""
+        raw = f"{pdf_hash}:{note_type}:{int(bool(include_questions))}"
+        if page_range:
+            raw += f":pages={page_range[0] or ''}-{page_range[1] or ''}"
+        if structured:
+            raw += ":structured"
+        if backend or model:
+            raw += f":model={backend}/{model}"
+        if chunked:
+            raw += ":chunked"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up cached artifacts and mark them recently used
+        Returns: Cache entry or None on a miss
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT files, preview, size, created FROM results WHERE key = ?',
+                               (key,)).fetchone()
+            entry = None
+            if row:
+                files = json.loads(row[0])
+                if all((self.cache_dir / name).exists() for name in files.values()):
+                    entry = {'files': files, 'preview': row[1], 'size': row[2], 'created': row[3]}
+                    conn.execute('UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key))
+                else:
+                    logger.warning(f"Result cache entry {key[:12]} is missing files. Dropping it")
+                    self._remove(conn, key, files)
+
+        if entry is None:
+            self.misses += 1
+            logger.info(f"Result cache MISS: {key[:12]}")
+            return None
+        self.hits += 1
+        logger.info(f"Result cache HIT: {key[:12]}")
+        return entry
+
+    def put(self, key: str, artifacts: Dict[str, Path], preview: str = ''):
+        """Copy finished artifacts (keyed by extension, e.g. {'tex': path}) into the cache"""
+        files = {}
+        size = 0
+        for ext, path in artifacts.items():
+            if not path or not Path(path).exists():
+                continue
+            name = f"{key}.{ext}"
+            shutil.copyfile(path, self.cache_dir / name)
+            files[ext] = name
+            size += (self.cache_dir / name).stat().st_size
+
+        if 'tex' not in files:
+            logger.warning("Not caching result without a .tex artifact")
+            return
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO results (key, files, preview, size, created, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, json.dumps(files), preview, size, now, now))
+            self._evict(conn)
+        logger.info(f"Result cache stored {key[:12]} ({size} bytes)")
+
+    def restore(self, entry: dict, output_dir: Path, base_name: str) -> Dict[str, Path]:
+        """Copy cached artifacts into output_dir under a new base name"""
+        restored = {}
+        for ext, name in entry['files'].items():
+            target = Path(output_dir) / f"{base_name}.{ext}"
+            shutil.copyfile(self.cache_dir / name, target)
+            restored[ext] = target
+        return restored
+
+    def total_bytes(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def stats(self) -> dict:
+        """Hit/miss counters (this process) and occupancy (shared)"""
+        with self._connect() as conn:
+            entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until the cache fits its size limit"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, files, size in conn.execute(
+                'SELECT key, files, size FROM results ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            logger.info(f"Result cache evicting {key[:12]}")
+            self._remove(conn, key, json.loads(files))
+            total -= size
+            self.evictions += 1
+
+    def _remove(self, conn: sqlite3.Connection, key: str, files: dict):
+        conn.execute('DELETE FROM results WHERE key = ?', (key,))
+        for name in files.values():
+            (self.cache_dir / name).unlink(missing_ok=True)
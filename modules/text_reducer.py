@@ -0,0 +1,260 @@
+import logging
+import math
+import re
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAGE_MARKER = re.compile(r'^--- Page (\d+) ---$', re.MULTILINE)
+
+
+class TextReducer:
+    """
+    Local, CPU-only reduction of extracted text before it is sent to the model
+    1. Strips header/footer lines that repeat across pages
+    2. Drops exact and near-duplicate paragraphs
+    3. If still over budget, keeps the highest-ranked sentences (TF-IDF) in document order
+    Page markers are kept before each page's surviving text, so chunked generation can
+    still split the reduced text on page boundaries.
+    """
+
+    # Rough characters per model token, used to express budgets in tokens
+    CHARS_PER_TOKEN = 4
+    # Longer "sentences" are split on line breaks before ranking
+    MAX_SENTENCE_CHARS = 400
+
+    STOPWORDS = {
+        'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in',
+        'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were',
+        'which', 'with', 'will', 'can', 'not', 'but', 'they', 'their', 'these', 'those', 'we'
+    }
+
+    def __init__(self, edge_lines: int = 2, repeat_fraction: float = 0.5, min_repeat_pages: int = 3,
+                 duplicate_similarity: float = 0.85, shingle_size: int = 3):
+        """
+        edge_lines: Non-empty lines at the top and bottom of each page checked for running headers/footers
+        repeat_fraction: Share of pages a line must appear on to count as a header/footer
+        min_repeat_pages: Fewest pages a header/footer must appear on
+        duplicate_similarity: Word-shingle Jaccard similarity above which paragraphs are duplicates
+        """
+        self.edge_lines = edge_lines
+        self.repeat_fraction = repeat_fraction
+        self.min_repeat_pages = min_repeat_pages
+        self.duplicate_similarity = duplicate_similarity
+        self.shingle_size = shingle_size
+
+    def reduce(self, text: str, max_chars: Optional[int] = None) -> Tuple[str, Dict]:
+        """
+        Reduce text to at most max_chars (None = only strip boilerplate and duplicates)
+        Returns: (reduced text, stats)
+        """
+        start = time.perf_counter()
+        original_chars = len(text)
+
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        # split() alternates page text and the captured page numbers
+        parts = PAGE_MARKER.split(text)
+        numbered = [(None, parts[0])] + [(int(parts[i]), parts[i + 1]) for i in range(1, len(parts), 2)]
+        numbered = [(number, page) for number, page in numbered if page.strip()]
+        pages, boilerplate_lines = self._strip_repeated_lines([page for _, page in numbered])
+
+        paragraphs = [(number, p) for (number, _), page in zip(numbered, pages) for p in self._paragraphs(page)]
+        paragraphs, duplicates = self._dedupe_paragraphs(paragraphs)
+
+        reduced = self._join(paragraphs)
+        sentences_dropped = 0
+        if max_chars and len(reduced) > max_chars:
+            # Leave room for the page markers of every page that still has text
+            marker_chars = sum(len(f'--- Page {number} ---\n') for number in {n for n, _ in paragraphs if n})
+            selected, sentences_dropped = self._select_sentences(
+                [p for _, p in paragraphs], max(0, max_chars - marker_chars)
+            )
+            reduced = self._join([(paragraphs[index][0], text) for index, text in selected])
+
+        seconds = time.perf_counter() - start
+        stats = {
+            'original_chars': original_chars,
+            'reduced_chars': len(reduced),
+            'original_tokens': original_chars // self.CHARS_PER_TOKEN,
+            'reduced_tokens': len(reduced) // self.CHARS_PER_TOKEN,
+            'compression_ratio': round(len(reduced) / original_chars, 3) if original_chars else 1.0,
+            'boilerplate_lines_removed': boilerplate_lines,
+            'duplicate_paragraphs_removed': duplicates,
+            'sentences_dropped': sentences_dropped,
+            'seconds': round(seconds, 3)
+        }
+        logger.info(f"Text reduced {original_chars} -> {len(reduced)} chars "
+                    f"(ratio {stats['compression_ratio']}) in {stats['seconds']}s")
+        return reduced, stats
+
+    def _strip_repeated_lines(self, pages: List[str]) -> Tuple[List[str], int]:
+        """Remove lines near page edges that recur (ignoring digits) on many pages"""
+        if len(pages) < self.min_repeat_pages:
+            return pages, 0
+
+        page_lines = [page.strip('\n').split('\n') for page in pages]
+        counts = Counter()
+        for lines in page_lines:
+            counts.update({self._line_key(line) for line in self._edges(lines)})
+
+        threshold = max(self.min_repeat_pages, math.ceil(len(pages) * self.repeat_fraction))
+        repeated = {key for key, count in counts.items() if count >= threshold}
+
+        removed = 0
+        cleaned = []
+        for lines in page_lines:
+            filled = [index for index, line in enumerate(lines) if line.strip()]
+            edge_indexes = set(filled[:self.edge_lines] + filled[-self.edge_lines:])
+            kept = []
+            for index, line in enumerate(lines):
+                if index in edge_indexes and line.strip() and \
+                        (self._line_key(line) in repeated or self._is_page_number(line)):
+                    removed += 1
+                    continue
+                kept.append(line)
+            cleaned.append('\n'.join(kept))
+        return cleaned, removed
+
+    def _edges(self, lines: List[str]) -> List[str]:
+        filled = [line for line in lines if line.strip()]
+        if len(filled) <= 2 * self.edge_lines:
+            return filled
+        return filled[:self.edge_lines] + filled[-self.edge_lines:]
+
+    @staticmethod
+    def _line_key(line: str) -> str:
+        """Normalised line, so 'Page 3 of 40' and 'Page 4 of 40' match"""
+        return re.sub(r'\s+', ' ', re.sub(r'\d+', '#', line.strip().lower()))
+
+    @staticmethod
+    def _is_page_number(line: str) -> bool:
+        return bool(re.fullmatch(r'\s*(page\s*)?\d+(\s*(of|/)\s*\d+)?\s*', line, re.IGNORECASE))
+
+    @staticmethod
+    def _join(paragraphs: List[Tuple[Optional[int], str]]) -> str:
+        """Paragraphs separated by blank lines, with a page marker before each page's first one"""
+        out = []
+        current_page = None
+        for number, paragraph in paragraphs:
+            if number is not None and number != current_page:
+                paragraph = f'--- Page {number} ---\n{paragraph}'
+                current_page = number
+            out.append(paragraph)
+        return '\n\n'.join(out)
+
+    @staticmethod
+    def _paragraphs(page: str) -> List[str]:
+        return [p.strip() for p in re.split(r'\n\s*\n', page) if p.strip()]
+
+    def _dedupe_paragraphs(self, paragraphs: List[Tuple[Optional[int], str]]
+                           ) -> Tuple[List[Tuple[Optional[int], str]], int]:
+        """
+        Drop (page number, paragraph) pairs whose paragraph repeats an earlier one exactly or nearly
+        Candidates are found through a bottom-k sketch of each paragraph's shingles,
+        so only paragraphs sharing a sketch shingle are compared in full
+        """
+        kept = []
+        kept_shingles = []
+        seen_exact = set()
+        sketch_index = defaultdict(list)
+        duplicates = 0
+
+        for number, paragraph in paragraphs:
+            words = re.findall(r'\w+', paragraph.lower())
+            exact = ' '.join(words)
+            if exact in seen_exact:
+                duplicates += 1
+                continue
+
+            shingles = self._shingles(words)
+            sketch = sorted(shingles)[:4]
+            candidates = {index for shingle in sketch for index in sketch_index[shingle]}
+            if any(self._jaccard(shingles, kept_shingles[index]) >= self.duplicate_similarity
+                   for index in candidates):
+                duplicates += 1
+                continue
+
+            seen_exact.add(exact)
+            for shingle in sketch:
+                sketch_index[shingle].append(len(kept))
+            kept.append((number, paragraph))
+            kept_shingles.append(shingles)
+        return kept, duplicates
+
+    def _shingles(self, words: List[str]) -> set:
+        if len(words) < self.shingle_size:
+            return {zlib.crc32(' '.join(words).encode())}
+        return {
+            zlib.crc32(' '.join(words[i:i + self.shingle_size]).encode())
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    @staticmethod
+    def _jaccard(a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def _select_sentences(self, paragraphs: List[str], max_chars: int) -> Tuple[List[Tuple[int, str]], int]:
+        """
+        Keep the best sentences that fit in max_chars, in their original order
+        Returns: ([(paragraph index, its kept sentences)], sentences dropped)
+        Sentences are scored by mean TF-IDF weight of their terms (paragraphs are the
+        documents for IDF), with a small bonus for opening a paragraph
+        """
+        sentences = []  # (paragraph index, sentence)
+        for index, paragraph in enumerate(paragraphs):
+            for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+                # Unpunctuated text (slides, lists) would otherwise be one huge sentence
+                parts = sentence.split('\n') if len(sentence) > self.MAX_SENTENCE_CHARS else [sentence]
+                sentences.extend((index, part.strip()) for part in parts if part.strip())
+
+        paragraph_terms = [set(self._terms(p)) for p in paragraphs]
+        document_frequency = Counter(term for terms in paragraph_terms for term in terms)
+        paragraph_count = len(paragraphs)
+
+        scores = []
+        for position, (index, sentence) in enumerate(sentences):
+            terms = self._terms(sentence)
+            if not terms:
+                scores.append(0.0)
+                continue
+            frequency = Counter(terms)
+            weight = sum(
+                (1 + math.log(count)) * math.log(1 + paragraph_count / document_frequency[term])
+                for term, count in frequency.items()
+            )
+            score = weight / math.sqrt(len(terms))
+            if position == 0 or sentences[position - 1][0] != index:
+                score *= 1.2
+            scores.append(score)
+
+        chosen = set()
+        used = 0
+        for position in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+            cost = len(sentences[position][1]) + 1
+            if used + cost > max_chars:
+                continue
+            chosen.add(position)
+            used += cost
+
+        output = []
+        current_index = None
+        current = []
+        for position in sorted(chosen):
+            index, sentence = sentences[position]
+            if index != current_index and current:
+                output.append((current_index, ' '.join(current)))
+                current = []
+            current_index = index
+            current.append(sentence)
+        if current:
+            output.append((current_index, ' '.join(current)))
+
+        return output, len(sentences) - len(chosen)
+
+    def _terms(self, text: str) -> List[str]:
+        return [w for w in re.findall(r'[a-z][a-z0-9\-]+', text.lower()) if w not in self.STOPWORDS]
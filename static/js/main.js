@@ -2,6 +2,7 @@ class StudyNoteApp {
     constructor() {
         this.currentFile = null;
         this.currentJobId = null;
+        this.currentFilename = null;
         this.apiBaseUrl = window.location.origin;
         
         this.initElements();
@@ -20,6 +21,7 @@ class StudyNoteApp {
             previewContent: document.getElementById('previewContent'),
             downloadLatexBtn: document.getElementById('downloadLatexBtn'),
             downloadPdfBtn: document.getElementById('downloadPdfBtn'),
+            downloadHtmlBtn: document.getElementById('downloadHtmlBtn'),
             compileBtn: document.getElementById('compileBtn'),
             noteType: document.getElementById('noteType'),
             includeQuestions: document.getElementById('includeQuestions'),
@@ -128,15 +130,23 @@ class StudyNoteApp {
                 body: formData
             });
             
-            this.updateProgress(70);
+            const queued = await response.json();
             
-            const result = await response.json();
+            if (!response.ok || !queued.job_id) {
+                this.showStatus(`Error: ${queued.error || 'Unknown error'}`, 'danger');
+                return;
+            }
             
-            if (response.ok && result.success) {
+            this.currentJobId = queued.job_id;
+            this.updateProgress(40);
+            
+            const job = await this.watchJob(queued.job_id);
+            
+            if (job.status === 'completed' && job.result && job.result.success) {
                 this.updateProgress(100);
-                this.handleSuccess(result);
+                this.handleSuccess(job.result);
             } else {
-                this.showStatus(`Error: ${result.error || 'Unknown error'}`, 'danger');
+                this.showStatus(`Error: ${job.error || 'Unknown error'}`, 'danger');
             }
         } catch (error) {
             this.showStatus(`Network error: ${error.message}`, 'danger');
@@ -146,6 +156,127 @@ class StudyNoteApp {
         }
     }
     
+    watchJob(jobId) {
+        // Follow real pipeline stages over server-sent events, polling if the stream is unavailable
+        if (!window.EventSource) {
+            return this.waitForJob(jobId);
+        }
+        
+        const stageProgress = {
+            queued: 15,
+            started: 20,
+            upload_saved: 25,
+            text_extracted: 45,
+            text_reduced: 48,
+            llm_request_sent: 50,
+            llm_streaming: 55,
+            llm_chunk_completed: 60,
+            llm_response_received: 75,
+            latex_written: 80,
+            compile_attempt: 85,
+            compile_succeeded: 95
+        };
+        const stageMessages = {
+            queued: 'Waiting for a free worker...',
+            upload_saved: 'Upload saved',
+            text_extracted: 'Text extracted',
+            text_reduced: 'Text condensed for the AI',
+            degraded: 'Server busy: generating faster, shorter notes',
+            llm_request_sent: 'Generating notes with AI...',
+            llm_response_received: 'AI response received',
+            latex_written: 'LaTeX document written',
+            compile_attempt: 'Compiling PDF...',
+            compile_succeeded: 'PDF compiled'
+        };
+        
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`${this.apiBaseUrl}/api/jobs/${jobId}/events`);
+            let finished = false;
+            
+            const onStage = (event) => {
+                const data = JSON.parse(event.data);
+                
+                if (data.stage === 'page_extracted') {
+                    // Extraction spans 25-45% of the bar
+                    this.updateProgress(25 + Math.round(20 * data.page / data.total_pages));
+                    this.showStatus(`Extracting page ${data.page} of ${data.total_pages}...`, 'info');
+                    return;
+                }
+                
+                if (data.stage === 'llm_chunk_completed') {
+                    // Generation spans 50-75% of the bar in chunked mode
+                    this.updateProgress(50 + Math.round(25 * data.completed / data.chunks));
+                    this.showStatus(`Generated notes for ${data.completed} of ${data.chunks} parts...`, 'info');
+                    return;
+                }
+                
+                if (stageProgress[data.stage]) {
+                    this.updateProgress(stageProgress[data.stage]);
+                }
+                if (stageMessages[data.stage]) {
+                    const backend = data.backend ? ` (${data.backend})` : '';
+                    this.showStatus(`${stageMessages[data.stage]}${backend}`, 'info');
+                }
+            };
+            
+            Object.keys(stageProgress).concat(['page_extracted', 'compile_failed', 'degraded']).forEach(stage => {
+                source.addEventListener(stage, onStage);
+            });
+            
+            // Render the LaTeX preview progressively while the model is still writing
+            source.addEventListener('llm_streaming', () => {
+                this.elements.previewContent.textContent = '';
+                this.showResults();
+                this.showStatus('Receiving notes from AI...', 'info');
+            });
+            
+            source.addEventListener('llm_delta', (event) => {
+                this.elements.previewContent.textContent += JSON.parse(event.data).text;
+            });
+            
+            source.addEventListener('completed', (event) => {
+                finished = true;
+                source.close();
+                resolve({ status: 'completed', result: JSON.parse(event.data).result });
+            });
+            
+            source.addEventListener('failed', (event) => {
+                finished = true;
+                source.close();
+                resolve({ status: 'failed', error: JSON.parse(event.data).error });
+            });
+            
+            source.onerror = () => {
+                if (finished) return;
+                // Stream dropped (proxy, network) - fall back to polling
+                source.close();
+                this.waitForJob(jobId).then(resolve, reject);
+            };
+        });
+    }
+    
+    async waitForJob(jobId, intervalMs = 1500) {
+        // Poll the job status endpoint until the pipeline finishes
+        while (true) {
+            const response = await fetch(`${this.apiBaseUrl}/api/jobs/${jobId}`);
+            const job = await response.json();
+            
+            if (!response.ok) {
+                throw new Error(job.error || `Job lookup failed (${response.status})`);
+            }
+            
+            if (job.status === 'completed' || job.status === 'failed') {
+                return job;
+            }
+            
+            if (job.status === 'running') {
+                this.updateProgress(70);
+            }
+            
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+    
     handleSuccess(result) {
         // Update preview
         this.elements.previewContent.textContent = result.preview;
@@ -164,11 +295,32 @@ class StudyNoteApp {
             this.elements.compileBtn.classList.remove('d-none');
         }
         
+        // Structured generation also renders an HTML version
+        if (result.html_url) {
+            this.elements.downloadHtmlBtn.href = result.html_url;
+            this.elements.downloadHtmlBtn.classList.remove('d-none');
+        } else {
+            this.elements.downloadHtmlBtn.classList.add('d-none');
+        }
+        
         // Show results section
         this.showResults();
         
-        // Show success message
-        this.showStatus('Study notes generated successfully!', 'success');
+        // Show success message, noting when only part of a long document was used
+        const extraction = result.extraction;
+        if (extraction && extraction.budget_reached) {
+            this.showStatus(
+                `Study notes generated from pages ${extraction.first_page}-${extraction.last_page} of ${extraction.total_pages}`,
+                'success'
+            );
+        } else if (result.degraded) {
+            this.showStatus(
+                `Server busy: ${result.degraded.note_type} notes generated with ${result.degraded.model}. Try again later for full detail`,
+                'success'
+            );
+        } else {
+            this.showStatus('Study notes generated successfully!', 'success');
+        }
         
         // Display helpful tips if provided
         if (result.tips) {
@@ -176,7 +328,7 @@ class StudyNoteApp {
         }
         
         // Store current filename for later compilation
-        this.currentJobId = result.filename;
+        this.currentFilename = result.filename;
     }
     
     showTips(tips) {
@@ -230,13 +382,13 @@ class StudyNoteApp {
     }
     
     async compileExisting() {
-        if (!this.currentJobId) return;
+        if (!this.currentFilename) return;
         
         this.showStatus('Compiling LaTeX to PDF...', 'info');
         
         try {
             const response = await fetch(
-                `${this.apiBaseUrl}/api/compile/${this.currentJobId}.tex`
+                `${this.apiBaseUrl}/api/compile/${this.currentFilename}.tex`
             );
             
             const result = await response.json();
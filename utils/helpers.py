@@ -11,11 +11,22 @@ def allowed_file(filename: str) -> bool:
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 def generate_filename(original_name: str) -> str:
-    """Generate unique filename with timestamp"""
+    """
+    Generate unique filename with timestamp
+    The random suffix keeps queued jobs for the same upload name in the same second apart
+    """
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    name_hash = hashlib.md5(original_name.encode()).hexdigest()[:8]
+    token = uuid.uuid4().hex[:8]
     base_name = Path(original_name).stem[:50]  # Limit length
-    return f"{base_name}_{timestamp}_{name_hash}"
+    return f"{base_name}_{timestamp}_{token}"
+
+def hash_file(filepath: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 def safe_delete(filepath: Path) -> bool:
     """Safely delete a file if it exists"""